@@ -0,0 +1,266 @@
+"""Admission control and per-client rate limiting for the LLM endpoints.
+
+Requests to the LLM endpoints take one of `ADMISSION_MAX_CONCURRENCY` slots
+while they run. When every slot is taken they wait in a FIFO queue of at
+most `ADMISSION_MAX_QUEUE` requests for up to `ADMISSION_QUEUE_TIMEOUT`
+seconds; a full queue or an expired wait is answered right away with a 503
+instead of piling more calls onto the upstream. Each client also has a token
+bucket of `RATE_LIMIT_PER_MINUTE` requests with bursts of up to
+`RATE_LIMIT_BURST`, answered with a 429 when empty. Both responses carry a
+Retry-After header.
+
+Limits apply per worker process; divide them by the number of workers for
+host-wide limits.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Iterable, Optional
+
+from metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED
+
+class AdmissionRejected(Exception):
+    """A request was not admitted; `retry_after` is a hint in seconds."""
+
+    status_code = 503
+    reason = "rejected"
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Request not admitted, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class QueueFullError(AdmissionRejected):
+    reason = "queue_full"
+
+class QueueTimeoutError(AdmissionRejected):
+    reason = "queue_timeout"
+
+class RateLimitedError(AdmissionRejected):
+    status_code = 429
+    reason = "rate_limited"
+
+class AdmissionController:
+    """Concurrency limit with a bounded FIFO wait queue.
+
+    Meant to be used from a single event loop, so its state needs no lock.
+    A released slot is handed directly to the oldest waiter, so requests
+    can't jump the queue.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._clock = clock
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        # Moving average of how long a request holds a slot, for Retry-After
+        self._hold_seconds = 1.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64")),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "128")),
+            queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        """Estimated time until the requests queued now have been served."""
+        return self._hold_seconds * (len(self._waiters) + 1) / max(self.max_concurrency, 1)
+
+    def _update_gauges(self) -> None:
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+    async def acquire(self) -> float:
+        """Take a slot, waiting in the queue if needed; returns the time waited.
+
+        Raises QueueFullError when the queue is full and QueueTimeoutError
+        when no slot frees up within `queue_timeout`.
+        """
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            self._update_gauges()
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            raise QueueFullError(self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        start = self._clock()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                self._update_gauges()
+            if isinstance(e, asyncio.TimeoutError):
+                raise QueueTimeoutError(self.retry_after()) from None
+            raise
+        return self._clock() - start
+
+    def release(self, held_seconds: Optional[float] = None) -> None:
+        """Free a slot, handing it to the oldest waiter if there is one."""
+        if held_seconds is not None:
+            self._hold_seconds += 0.1 * (held_seconds - self._hold_seconds)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "hold_seconds_avg": self._hold_seconds,
+        }
+
+class _TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class ClientRateLimiter:
+    """Token bucket per client, keeping at most `max_clients` buckets.
+
+    The least recently seen clients are dropped first; a dropped client
+    starts again with a full bucket.
+    """
+
+    def __init__(self, per_minute: float, burst: int, max_clients: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.per_minute = per_minute
+        self.burst = burst
+        self.max_clients = max_clients
+        self._clock = clock
+        self._buckets: "OrderedDict[str, _TokenBucket]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "ClientRateLimiter":
+        return cls(
+            per_minute=float(os.getenv("RATE_LIMIT_PER_MINUTE", "0")),
+            burst=int(os.getenv("RATE_LIMIT_BURST", "20")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+    def check(self, client: str) -> float:
+        """Take a token for `client`; returns 0 if allowed, else the seconds until the next token."""
+        now = self._clock()
+        rate = self.per_minute / 60
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = _TokenBucket(self.burst, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / rate
+
+    def reset(self) -> None:
+        self._buckets.clear()
+
+controller = AdmissionController.from_env()
+rate_limiter = ClientRateLimiter.from_env()
+
+# Trust the first X-Forwarded-For address as the client, when running
+# behind a proxy or load balancer that sets it
+TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "0").lower() in ("1", "true", "yes")
+
+def client_id(scope) -> str:
+    """Identify the client of a request for rate limiting."""
+    if TRUST_FORWARDED_FOR:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+async def _reject(send, error: AdmissionRejected) -> None:
+    ADMISSION_REJECTED.inc(reason=error.reason)
+    detail = "Too many requests" if error.status_code == 429 else "Service overloaded, try again later"
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": error.status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(math.ceil(error.retry_after), 1)).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the rate limit and the admission queue to `paths`.
+
+    The slot is held until the response, streamed ones included, has been sent.
+    """
+
+    def __init__(self, app, paths: Iterable[str], admission: AdmissionController = controller,
+                 limiter: ClientRateLimiter = rate_limiter):
+        self.app = app
+        self.paths = set(paths)
+        self.admission = admission
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        if self.limiter.enabled:
+            wait = self.limiter.check(client_id(scope))
+            if wait:
+                await _reject(send, RateLimitedError(wait))
+                return
+        if not self.admission.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            waited = await self.admission.acquire()
+        except AdmissionRejected as e:
+            await _reject(send, e)
+            return
+        ADMISSION_QUEUE_WAIT.observe(waited)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(time.perf_counter() - start)
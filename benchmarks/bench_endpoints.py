@@ -0,0 +1,427 @@
+"""Throughput and latency benchmark for every API endpoint.
+
+Drives the app at several concurrency levels against a mocked upstream with
+a configurable delay, either in-process (httpx ASGI transport, stub LLM
+client) or over HTTP (uvicorn or gunicorn workers talking to
+fake_llm_server.py), and reports p50/p95/p99 latency, requests per second
+and memory per request. Over HTTP, the time to the first item of the
+streaming endpoint is reported too, since that is what a streaming client
+waits for (the in-process transport only returns whole responses). With
+several worker counts, throughput is also reported relative to the smallest
+count. Results are written as JSON so runs
+can be compared across commits.
+
+Usage:
+    python benchmarks/bench_endpoints.py --mode inprocess --concurrency 1,8,32 --requests 200
+    python benchmarks/bench_endpoints.py --mode uvicorn --upstream-delay 0.5
+    python benchmarks/bench_endpoints.py --mode uvicorn --endpoints recommendations_stream --upstream-tokens-per-second 300
+    python benchmarks/bench_endpoints.py --mode gunicorn --workers 1,2,4 --concurrency 64 --upstream-delay 0
+    python benchmarks/bench_endpoints.py --compare benchmarks/results/OLD.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+sys.path.insert(0, ROOT)
+
+import httpx
+
+# Request builders per endpoint. `i` makes inputs unique, so caches and
+# request coalescing don't hide the upstream unless --repeat-inputs is set.
+ENDPOINTS: Dict[str, Callable[[int], dict]] = {
+    "health": lambda i: {"method": "GET", "url": "/health"},
+    "recommendations": lambda i: {
+        "method": "POST", "url": "/recommendations",
+        "json": {"products": ["fideos", "ajo", f"producto {i}"]},
+    },
+    "recommendations_stream": lambda i: {
+        "method": "POST", "url": "/recommendations/stream",
+        "json": {"products": ["carne", "carbón", f"producto {i}"]},
+    },
+    "recommendations_prefetch": lambda i: {
+        "method": "POST", "url": "/recommendations/prefetch",
+        "json": {"products": ["leche", "pan", f"producto {i}"], "list_id": f"00000000-0000-4000-8000-{i % 8:012d}"},
+    },
+    "dish_ingredients": lambda i: {
+        "method": "GET", "url": "/dishes/ingredients",
+        "params": {"dish_name": f"plato {i}"},
+    },
+    "dish_ingredients_batch": lambda i: {
+        "method": "POST", "url": "/dishes/ingredients/batch",
+        "json": {"dish_names": [f"plato {i}-{j}" for j in range(5)], "include_shopping_list": True},
+    },
+    "categorize_products": lambda i: {
+        "method": "POST", "url": "/categorize-products",
+        "json": {
+            "categorized_products": {"Lacteos": ["leche", "queso"], "Panaderia": ["pan"]},
+            "uncategorized_products": [f"producto {i}", f"otro producto {i}"],
+        },
+    },
+    "categorize_products_bulk": lambda i: {
+        "method": "POST", "url": "/categorize-products/bulk",
+        "json": {
+            "categorized_products": {"Lacteos": ["leche", "queso"]},
+            "uncategorized_products": [f"producto {i}-{j}" for j in range(60)],
+        },
+    },
+}
+
+# Unique input ids across every run in this process, so a later run doesn't
+# hit entries cached by an earlier one (uvicorn workers keep their caches)
+_input_ids = itertools.count()
+
+class StubLLMClient:
+    """In-process stand-in for the async instructor client.
+
+    Sleeps for the configured delay and returns a response generated from
+    the response model's schema, like fake_llm_server.py does over HTTP.
+    """
+
+    def __init__(self, delay: float):
+        import random
+        self.delay = delay
+        self._rng = random.Random(0)
+        self.chat = self
+        self.completions = self
+
+    def _build(self, response_model):
+        from fake_llm_server import generate_value
+        return response_model(**generate_value(response_model.model_json_schema(), self._rng))
+
+    async def create(self, response_model, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self._build(response_model)
+
+    async def create_partial(self, response_model, **kwargs):
+        await asyncio.sleep(self.delay)
+        yield self._build(response_model)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+async def run_load(client: httpx.AsyncClient, endpoint: str, concurrency: int, requests: int,
+                   repeat_inputs: bool, time_first_item: bool = False) -> dict:
+    """Send `requests` requests with `concurrency` workers and collect latencies.
+
+    With `time_first_item`, responses are read as they arrive and the time to
+    the first streamed item is reported as well.
+    """
+    build = ENDPOINTS[endpoint]
+    latencies: List[float] = []
+    first_items: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < requests:
+            next_index += 1
+            spec = dict(build(0 if repeat_inputs else next(_input_ids)))
+            method, url = spec.pop("method"), spec.pop("url")
+            start = time.perf_counter()
+            try:
+                first_item = None
+                async with client.stream(method, url, **spec) as response:
+                    async for line in response.aiter_lines():
+                        if time_first_item and first_item is None and line == "event: item":
+                            first_item = time.perf_counter() - start
+                if first_item is not None:
+                    first_items.append(first_item)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    result = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies_ms), 3) if latencies_ms else 0.0,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    if first_items:
+        first_items_ms = sorted(latency * 1000 for latency in first_items)
+        result["first_item_p50_ms"] = round(percentile(first_items_ms, 50), 3)
+        result["first_item_p95_ms"] = round(percentile(first_items_ms, 95), 3)
+    return result
+
+async def run_in_process(endpoints: List[str], levels: List[int], requests: int, upstream_delay: float,
+                         repeat_inputs: bool = False) -> List[dict]:
+    """Benchmark the ASGI app in this process with a stub upstream."""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import admission
+    import main
+    import services
+
+    previous_client = services.__dict__.get("async_client")
+    services.__dict__["async_client"] = StubLLMClient(upstream_delay)
+    # Every benchmark request comes from the same client
+    previous_rate = admission.rate_limiter.per_minute
+    admission.rate_limiter.per_minute = 0
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for endpoint in endpoints:
+                for concurrency in levels:
+                    services.reset_caches()
+                    result = await run_load(client, endpoint, concurrency, requests, repeat_inputs)
+
+                    # Memory is measured in a separate, shorter pass because
+                    # tracemalloc slows everything down
+                    services.reset_caches()
+                    tracemalloc.start()
+                    baseline, _ = tracemalloc.get_traced_memory()
+                    tracemalloc.reset_peak()
+                    memory_requests = max(concurrency, min(requests, 50))
+                    await run_load(client, endpoint, concurrency, memory_requests, repeat_inputs)
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    result["mem_kib_per_request"] = round((peak - baseline) / 1024 / concurrency, 2)
+
+                    result["mode"] = "inprocess"
+                    results.append(result)
+                    print_result(result)
+    finally:
+        admission.rate_limiter.per_minute = previous_rate
+        if previous_client is None:
+            services.__dict__.pop("async_client", None)
+        else:
+            services.__dict__["async_client"] = previous_client
+    return results
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _rss_kib(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def _tree_rss_kib(pid: int) -> Optional[int]:
+    """RSS of a server process and its worker processes."""
+    total = _rss_kib(pid)
+    if total is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", encoding="utf-8") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    for child in children:
+        total += _rss_kib(child) or 0
+    return total
+
+async def _wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def server_command(server: str, port: int, workers: int) -> List[str]:
+    """Command line serving the app with `workers` processes."""
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py",
+                "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--log-level", "warning"]
+    return [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+            "--log-level", "warning", "--no-access-log"]
+
+async def run_uvicorn(endpoints: List[str], levels: List[int], requests: int, upstream_delay: float,
+                      repeat_inputs: bool = False, workers: int = 1, server_name: str = "uvicorn",
+                      tokens_per_second: float = 0.0) -> List[dict]:
+    """Benchmark the app served by uvicorn (or gunicorn) against fake_llm_server.py."""
+    fake_port, app_port = _free_port(), _free_port()
+    env = dict(os.environ, LOG_LEVEL="WARNING", PYTHONUNBUFFERED="1", RATE_LIMIT_PER_MINUTE="0")
+    fake = subprocess.Popen(
+        [sys.executable, "fake_llm_server.py", "--port", str(fake_port),
+         "--latency", f"fixed:{upstream_delay}", "--tokens-per-second", str(tokens_per_second)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    app_env = dict(env, LLM_BACKEND="openai", LLM_BASE_URL=f"http://127.0.0.1:{fake_port}/v1")
+    server = subprocess.Popen(
+        server_command(server_name, app_port, workers),
+        cwd=ROOT, env=app_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    results = []
+    try:
+        await _wait_until_up(f"http://127.0.0.1:{fake_port}/stats")
+        await _wait_until_up(f"http://127.0.0.1:{app_port}/health")
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", limits=limits, timeout=120) as client:
+            for endpoint in endpoints:
+                for concurrency in levels:
+                    rss_before = _tree_rss_kib(server.pid)
+                    result = await run_load(client, endpoint, concurrency, requests, repeat_inputs,
+                                            time_first_item=True)
+                    rss_after = _tree_rss_kib(server.pid)
+                    if rss_before is not None and rss_after is not None:
+                        result["rss_delta_kib"] = rss_after - rss_before
+                    result["mode"] = server_name
+                    result["workers"] = workers
+                    results.append(result)
+                    print_result(result)
+    finally:
+        for process in (server, fake):
+            process.terminate()
+            process.wait(timeout=10)
+    return results
+
+def print_result(result: dict) -> None:
+    memory = result.get("mem_kib_per_request", result.get("rss_delta_kib", ""))
+    print(f"{result['mode']:<9} {result['endpoint']:<26} c={result['concurrency']:<4} "
+          f"p50={result['p50_ms']:>9.2f}ms p95={result['p95_ms']:>9.2f}ms p99={result['p99_ms']:>9.2f}ms "
+          f"rps={result['rps']:>9.2f} errors={result['errors']} mem={memory}"
+          + (f" first_item_p50={result['first_item_p50_ms']:.2f}ms" if "first_item_p50_ms" in result else ""))
+
+def scaling(results: List[dict]) -> List[dict]:
+    """Throughput of each worker count relative to the smallest one, per endpoint and concurrency."""
+    groups: Dict[tuple, List[dict]] = {}
+    for result in results:
+        if "workers" in result:
+            groups.setdefault((result["mode"], result["endpoint"], result["concurrency"]), []).append(result)
+    rows = []
+    for (mode, endpoint, concurrency), runs in groups.items():
+        runs.sort(key=lambda r: r["workers"])
+        base = runs[0]
+        for run in runs:
+            speedup = run["rps"] / base["rps"] if base["rps"] else 0.0
+            rows.append({
+                "mode": mode, "endpoint": endpoint, "concurrency": concurrency, "workers": run["workers"],
+                "rps": run["rps"], "speedup": round(speedup, 2),
+                # 1.0 means throughput grew in proportion to the worker count
+                "efficiency": round(speedup * base["workers"] / run["workers"], 2),
+            })
+    return rows
+
+def print_scaling(rows: List[dict]) -> None:
+    print("\nScaling by worker count:")
+    for row in rows:
+        print(f"  {row['mode']:<9} {row['endpoint']:<26} c={row['concurrency']:<4} workers={row['workers']:<3} "
+              f"rps={row['rps']:>9.2f} speedup={row['speedup']:>5.2f}x efficiency={row['efficiency']:.2f}")
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(old_path: str, new: dict) -> None:
+    """Print p95 latency and throughput changes against a previous result file."""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    key = lambda r: (r["mode"], r["endpoint"], r["concurrency"], r.get("workers", 1))
+    previous = {key(r): r for r in old["results"]}
+    print(f"\nComparison against {old.get('commit', old_path)}:")
+    for result in new["results"]:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        p95_change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        rps_change = (result["rps"] - before["rps"]) / before["rps"] * 100 if before["rps"] else 0.0
+        print(f"  {result['mode']:<9} {result['endpoint']:<26} c={result['concurrency']:<4} "
+              f"p95 {p95_change:+7.1f}%  rps {rps_change:+7.1f}%")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every API endpoint under concurrency")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "gunicorn", "both"], default="inprocess")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated endpoints to run")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--upstream-delay", type=float, default=0.2, help="Mocked upstream latency in seconds")
+    parser.add_argument("--upstream-tokens-per-second", type=float, default=0.0,
+                        help="Completion token throughput of fake_llm_server.py in the uvicorn and gunicorn modes, 0 for unlimited")
+    parser.add_argument("--workers", default="1", help="Comma-separated worker process counts for the uvicorn and gunicorn modes")
+    parser.add_argument("--repeat-inputs", action="store_true", help="Send the same input every time to measure cached paths")
+    parser.add_argument("--output", help="Result file (defaults to benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Previous result file to compare against")
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    worker_counts = [int(count) for count in args.workers.split(",")]
+
+    results = []
+    if args.mode in ("inprocess", "both"):
+        results += asyncio.run(run_in_process(endpoints, levels, args.requests, args.upstream_delay, args.repeat_inputs))
+    servers = {"uvicorn": ["uvicorn"], "gunicorn": ["gunicorn"], "both": ["uvicorn"]}.get(args.mode, [])
+    for server_name in servers:
+        for workers in worker_counts:
+            results += asyncio.run(run_uvicorn(endpoints, levels, args.requests, args.upstream_delay,
+                                               args.repeat_inputs, workers, server_name,
+                                               args.upstream_tokens_per_second))
+    scaling_rows = scaling(results) if len(worker_counts) > 1 else []
+    if scaling_rows:
+        print_scaling(scaling_rows)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "upstream_delay": args.upstream_delay,
+            "requests": args.requests,
+            "concurrency": levels,
+            "repeat_inputs": args.repeat_inputs,
+            "workers": worker_counts,
+        },
+        "results": results,
+        "scaling": scaling_rows,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Token and latency savings of deduplicating products before building prompts.
+
+Runs realistic shopping lists, with the repeated spellings, plurals and
+typos users actually type, through the deduplication stage and reports for
+each one the products sent to the model, the estimated prompt tokens of the
+categorization and recommendations prompts before and after, the estimated
+answer tokens the model no longer has to write, and the time deduplication
+takes. Answer tokens dominate completion latency, so the saved latency is
+estimated from them at --ms-per-output-token. Typos are only merged with
+INPUT_FUZZY_DEDUPE=1, as in the app.
+
+Usage:
+    python benchmarks/bench_normalization.py [--ms-per-output-token 4] [--json PATH]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from normalization import deduplicate
+from prompts import estimate_tokens
+
+# Lists as they arrive from the app: pasted, dictated or added twice
+LISTS: Dict[str, List[str]] = {
+    "weekly": [
+        "Leche", "leche ", "Pan", "pan lactal", "Huevos", "huevo", "Yerba", "yerba mate", "Azúcar", "azucar",
+        "Fideos", "fideos", "Tomates", "tomate", "Cebolla", "cebollas", "papas", "Papa", "manzanas", "Manzana",
+        "Queso cremoso", "queso  cremoso", "Detergente", "detergente ", "Papel higiénico", "papel higienico",
+        "Arroz", "arroz", "Aceite", "aceite", "Lehce", "Mayonesa", "mayonessa", "Galletitas", "galletitas",
+    ],
+    "asado": [
+        "Carne", "carne", "Chorizos", "chorizo", "Morcillas", "morcilla", "Carbón", "carbon", "Sal gruesa",
+        "sal  gruesa", "Pan", "panes", "Chimichurri", "chimichuri", "Lechuga", "lechugas", "Tomate", "Fernet",
+        "fernet", "Coca Cola", "coca cola", "Hielo", "hielo",
+    ],
+    "baking": [
+        "Harina 0000", "harina 0000", "harina 000", "Azúcar", "azúcar", "Manteca", "manteca", "Huevos", "huevos",
+        "Leche", "Esencia de vainilla", "esencia de vainila", "Polvo para hornear", "polvo para hornear",
+        "Dulce de leche", "dulce de leche ",
+    ],
+    "clean": ["Leche", "Pan", "Huevos", "Yerba", "Azúcar", "Fideos", "Tomate", "Cebolla", "Queso", "Arroz"],
+}
+
+# Already categorized products sent as context with every categorization
+CONTEXT = {"Lacteos": ["yogur", "crema"], "Almacen": ["sal", "vinagre"], "Panaderia": ["facturas"]}
+
+def measure(products: List[str], ms_per_output_token: float, repeat: int = 200) -> dict:
+    """Deduplicate one list and estimate what it saves."""
+    # Imported here so the module loads without an API key or network
+    import services
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        groups = deduplicate(products, services.INPUT_FUZZY_DEDUPE)
+    dedupe_us = (time.perf_counter() - start) / repeat * 1e6
+    unique = list(groups)
+
+    categorization_before = estimate_tokens(services.build_categorization_prompt(CONTEXT, products).text)
+    categorization_after = estimate_tokens(services.build_categorization_prompt(CONTEXT, unique).text)
+    recommendations_before = estimate_tokens(services.build_recommendations_prompt(products).text)
+    recommendations_after = estimate_tokens(services.build_recommendations_prompt(unique).text)
+    # A categorization answer lists every product it was sent
+    answer_saved = estimate_tokens(json.dumps(products, ensure_ascii=False)) - estimate_tokens(json.dumps(unique, ensure_ascii=False))
+    return {
+        "products": len(products),
+        "unique": len(unique),
+        "categorization_prompt_tokens": [categorization_before, categorization_after],
+        "recommendations_prompt_tokens": [recommendations_before, recommendations_after],
+        "answer_tokens_saved": answer_saved,
+        "est_latency_saved_ms": round(answer_saved * ms_per_output_token, 1),
+        "dedupe_us": round(dedupe_us, 1),
+    }
+
+def run(ms_per_output_token: float = 4.0) -> Dict[str, dict]:
+    return {name: measure(products, ms_per_output_token) for name, products in LISTS.items()}
+
+def _saving(pair: List[int]) -> str:
+    before, after = pair
+    return f"{before:>4} -> {after:<4} ({(before - after) / before * 100:4.1f}%)"
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure what deduplicating products saves in prompts")
+    parser.add_argument("--ms-per-output-token", type=float, default=4.0, help="Generation time per answer token")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.ms_per_output_token)
+    print(f"{'list':<8} {'products':>9} {'categorization tokens':>24} {'recommendations tokens':>24} "
+          f"{'answer saved':>13} {'est. saved':>11} {'dedupe':>9}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['products']:>4} -> {result['unique']:<3} "
+              f"{_saving(result['categorization_prompt_tokens']):>24} {_saving(result['recommendations_prompt_tokens']):>24} "
+              f"{result['answer_tokens_saved']:>9} tok {result['est_latency_saved_ms']:>8} ms {result['dedupe_us']:>6} us")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
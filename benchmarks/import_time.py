@@ -0,0 +1,81 @@
+"""Startup benchmark based on `python -X importtime`.
+
+Imports the app in fresh interpreters, reports the median cumulative import
+time and the slowest modules, and exits with status 1 when the import time
+exceeds the budget in import_budget.json or when a module that should be
+imported lazily is loaded at startup.
+
+Usage:
+    python benchmarks/import_time.py [--runs N] [--top N] [--json PATH]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_budget.json")
+
+def measure_import(module: str) -> dict:
+    """Import `module` in a fresh interpreter and return per-module cumulative times in ms."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("PREWARM_ON_INIT", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        timings[name] = max(timings.get(name, 0.0), int(cumulative_us) / 1000)
+    return timings
+
+def main() -> int:
+    with open(BUDGET_PATH, encoding="utf-8") as f:
+        budget = json.load(f)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=budget["runs"], help="Number of fresh interpreters to measure")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest modules to report")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    module = budget["module"]
+    runs = [measure_import(module) for _ in range(args.runs)]
+    median_ms = statistics.median(run[module] for run in runs)
+    last_run = runs[-1]
+    slowest = sorted(((ms, name) for name, ms in last_run.items() if name != module), reverse=True)[:args.top]
+    forbidden = sorted(name for name in last_run if name.split(".")[0] in budget["forbidden_modules"])
+
+    print(f"{module}: median cumulative import time {median_ms:.1f} ms over {args.runs} runs "
+          f"(budget {budget['max_cumulative_ms']} ms)")
+    print("Slowest modules:")
+    for ms, name in slowest:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "module": module,
+                "runs": args.runs,
+                "median_cumulative_ms": median_ms,
+                "budget_ms": budget["max_cumulative_ms"],
+                "slowest": [{"module": name, "cumulative_ms": ms} for ms, name in slowest],
+                "forbidden_imported": forbidden,
+            }, f, indent=2)
+
+    failed = False
+    if median_ms > budget["max_cumulative_ms"]:
+        print(f"FAIL: import time {median_ms:.1f} ms exceeds the {budget['max_cumulative_ms']} ms budget")
+        failed = True
+    if forbidden:
+        print(f"FAIL: modules that should load lazily were imported at startup: {', '.join(forbidden)}")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Build the precomputed catalog snapshot served before calling the model.
+
+Asks the configured upstream for the ingredients of popular dishes and the
+categories of common products, and writes them to a versioned snapshot (see
+catalog.py) that the service memory-maps when CATALOG_PATH points to it.
+
+Run it with:
+    GROQ_API_KEY=... python build_catalog.py --output catalog.bin
+
+Seed lists default to the ones below; pass --dishes/--products with a file
+holding one name per line to use your own.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import services
+from catalog import CatalogSnapshot, write_snapshot
+from category_index import OTHER_CATEGORY, canonical_category
+
+DEFAULT_DISHES = [
+    "milanesa", "milanesa napolitana", "empanadas de carne", "empanadas de jamón y queso", "asado",
+    "choripán", "locro", "carbonada", "guiso de lentejas", "guiso de arroz", "pastel de papa",
+    "tarta de jamón y queso", "tarta de verdura", "tortilla de papas", "ñoquis", "ravioles",
+    "canelones", "lasagna", "fideos con tuco", "pizza", "fugazzeta", "polenta", "humita",
+    "tamales", "puchero", "matambre a la pizza", "vitel toné", "ensalada rusa", "arroz con pollo",
+    "pollo al horno con papas", "bife a la criolla", "hamburguesas caseras", "sopa de verduras",
+    "revuelto gramajo", "provoleta", "chipá", "alfajores de maicena", "flan casero",
+    "arroz con leche", "pastafrola", "panqueques con dulce de leche", "budín de pan", "medialunas",
+]
+
+DEFAULT_PRODUCTS = [
+    "leche", "yogur", "queso cremoso", "queso rallado", "manteca", "crema de leche", "dulce de leche",
+    "huevos", "pan", "pan lactal", "pan rallado", "facturas", "galletitas", "tapas de empanadas",
+    "tapas de tarta", "harina", "azúcar", "sal", "aceite", "aceite de oliva", "vinagre", "arroz",
+    "fideos", "polenta", "lentejas", "garbanzos", "puré de tomate", "atún", "arvejas en lata",
+    "choclo en lata", "mayonesa", "mostaza", "ketchup", "yerba", "café", "té", "mermelada",
+    "cacao", "carne picada", "bife de chorizo", "asado", "vacío", "pollo", "chorizo", "morcilla",
+    "jamón cocido", "salame", "merluza", "papa", "batata", "cebolla", "ajo", "tomate", "lechuga",
+    "zanahoria", "zapallo", "morrón", "espinaca", "acelga", "manzana", "banana", "naranja", "limón",
+    "agua mineral", "gaseosa", "soda", "jugo en polvo", "cerveza", "vino tinto", "fernet",
+    "papel higiénico", "detergente", "lavandina", "jabón en polvo", "suavizante", "esponja",
+    "shampoo", "jabón de tocador", "pasta dental", "desodorante", "pañales", "alimento para perros",
+]
+
+def read_seed(path: Optional[str], default: List[str]) -> List[str]:
+    """Read one name per line from `path`, or return the default seed list."""
+    if not path:
+        return list(default)
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+async def build(dishes: List[str], products: List[str], concurrency: int) -> tuple:
+    """Fetch ingredients for every dish and a category for every product."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_dish(dish: str):
+        async with semaphore:
+            return dish, await services.get_dish_ingredients_async(dish)
+
+    dish_ingredients: Dict[str, List[str]] = dict(await asyncio.gather(*(fetch_dish(dish) for dish in dishes)))
+
+    categories, _ = await services.categorize_products_bulk_async({}, products, max_concurrency=concurrency)
+    product_categories: Dict[str, str] = {}
+    for name, items in categories.items():
+        category = canonical_category(name)
+        # Products the model couldn't place are left to it at request time
+        if category is None or category == OTHER_CATEGORY:
+            continue
+        for product in items:
+            product_categories.setdefault(product, category)
+    return dish_ingredients, product_categories
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the precomputed dish and product catalog snapshot")
+    parser.add_argument("--output", default="catalog.bin", help="Snapshot file to write")
+    parser.add_argument("--dishes", help="File with one dish name per line")
+    parser.add_argument("--products", help="File with one product name per line")
+    parser.add_argument("--version", help="Snapshot version, defaults to the build time")
+    parser.add_argument("--concurrency", type=int, default=4, help="Upstream calls in flight at once")
+    parser.add_argument("--allow-mock", action="store_true", help="Build from mock data when no upstream is configured")
+    args = parser.parse_args()
+
+    if services.LLM_BACKEND == "mock" and not args.allow_mock:
+        print("No upstream configured (set GROQ_API_KEY or LLM_BACKEND), refusing to build a catalog from mock data", file=sys.stderr)
+        return 1
+    # Answer everything from the model, not from a previous snapshot
+    services.catalog = None
+
+    dishes = read_seed(args.dishes, DEFAULT_DISHES)
+    products = read_seed(args.products, DEFAULT_PRODUCTS)
+    start = time.perf_counter()
+    dish_ingredients, product_categories = asyncio.run(build(dishes, products, args.concurrency))
+    version = args.version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    write_snapshot(
+        args.output, dish_ingredients, product_categories, version,
+        metadata={"model": services.GROQ_MODEL, "backend": services.LLM_BACKEND},
+    )
+
+    load_start = time.perf_counter()
+    snapshot = CatalogSnapshot(args.output)
+    load_ms = (time.perf_counter() - load_start) * 1000
+    print(
+        f"Wrote catalog {version} to {args.output}: {snapshot.metadata['dishes']} dishes, "
+        f"{snapshot.metadata['products']} products, {os.path.getsize(args.output)} bytes "
+        f"in {time.perf_counter() - start:.1f}s (loads in {load_ms:.2f} ms)"
+    )
+    snapshot.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
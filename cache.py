@@ -0,0 +1,282 @@
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+def estimate_size(value: Any) -> int:
+    """Roughly estimate the memory used by a cached value, in bytes."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+class TTLCache:
+    """Thread-safe in-memory cache with per-entry TTL and LRU eviction.
+
+    Entries are evicted least recently used first once either `max_entries`
+    or `max_bytes` is exceeded. Expired entries are dropped lazily on lookup.
+    Instances are meant to live at module level, so they persist across
+    requests on a uvicorn worker and across warm Lambda invocations.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for `key`, or `default` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self._bytes -= size
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store `value` under `key`, evicting old entries if needed."""
+        size = estimate_size(key) + estimate_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = self._clock() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current usage."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+class SQLiteCache:
+    """TTL cache stored in a local SQLite file, shared by every worker process.
+
+    Has the same interface as TTLCache, so it can replace it when several
+    workers run on one host: an answer cached by one worker is a hit for all
+    of them. Several caches can share a file under different `namespace`s.
+    Values are stored as JSON, so tuples come back as lists.
+
+    Each thread of each process opens its own connection; the file uses WAL
+    journaling, so readers don't block the writer. Lookups and writes run on
+    the caller's thread, the event loop included, so they wait at most
+    `busy_timeout` seconds for another process's write lock; a lock that is
+    held longer is an error, and errors are counted and treated as misses
+    (or dropped writes), so the cache never fails or stalls a request.
+    Expired entries are ignored on lookup, and every `prune_interval` writes
+    a background thread deletes them and evicts the oldest entries once
+    `max_entries` or `max_bytes` is exceeded. Hit and miss counters are per
+    process.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl_seconds: float, max_entries: int = 1024,
+                 max_bytes: int = 16 * 1024 * 1024, prune_interval: int = 64, busy_timeout: float = 0.05,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        self.busy_timeout = busy_timeout
+        # Wall clock time, since expiry times are shared between processes
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._prune_thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        # Workers starting together may wait for each other here, off the request path
+        connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections can't be shared across threads or forked processes
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _encode_key(key: Hashable) -> str:
+        return json.dumps(key, ensure_ascii=False, separators=(",", ":"))
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for `key`, or `default` on a miss."""
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, self._encode_key(key), self._clock()),
+            ).fetchone()
+        except sqlite3.Error:
+            self._count("errors")
+            row = None
+        if row is None:
+            self._count("misses")
+            return default
+        self._count("hits")
+        return json.loads(row[0])
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store `value` under `key`, evicting old entries if needed."""
+        encoded = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        if len(encoded) > self.max_bytes:
+            return
+        expires_at = self._clock() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_interval == 0
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, self._encode_key(key), encoded, expires_at),
+            )
+        except sqlite3.Error:
+            self._count("errors")
+        if prune:
+            self._start_prune()
+
+    def _start_prune(self) -> None:
+        """Prune on a background thread, unless a prune is already running."""
+        with self._lock:
+            if self._prune_thread is not None and self._prune_thread.is_alive():
+                return
+            self._prune_thread = threading.Thread(target=self._prune_in_background, name="sqlite-cache-prune", daemon=True)
+            self._prune_thread.start()
+
+    def _prune_in_background(self) -> None:
+        try:
+            # Off the request path, so it can wait longer for the write lock
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            try:
+                self._prune(connection)
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            self._count("errors")
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        connection.execute("DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, self._clock()))
+        count, size = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(key) + LENGTH(value)), 0) FROM cache WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()
+        excess = max(count - self.max_entries, 0)
+        if size > self.max_bytes:
+            excess = max(excess, math.ceil(count * (1 - self.max_bytes / size)))
+        if excess:
+            # Entries expiring first are the oldest ones
+            connection.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN "
+                "(SELECT key FROM cache WHERE namespace = ? ORDER BY expires_at LIMIT ?)",
+                (self.namespace, self.namespace, excess),
+            )
+            with self._lock:
+                self.evictions += excess
+
+    def clear(self) -> None:
+        """Drop every entry of this namespace and reset the counters."""
+        try:
+            self._connect().execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+        except sqlite3.Error:
+            self._count("errors")
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.errors = 0
+
+    def __len__(self) -> int:
+        try:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ? AND expires_at > ?", (self.namespace, self._clock())
+            ).fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def stats(self) -> dict:
+        """Return this process's hit/miss counters and the shared usage."""
+        try:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(key) + LENGTH(value)), 0) FROM cache WHERE namespace = ?",
+                (self.namespace,),
+            ).fetchone()
+        except sqlite3.Error:
+            entries, size = 0, 0
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
@@ -0,0 +1,198 @@
+"""Read-only catalog of precomputed dish ingredients and product categories.
+
+The catalog is built offline by `build_catalog.py` and stored as a compact
+binary snapshot that is memory-mapped at startup instead of parsed: opening
+it only reads the header, and lookups binary-search the mapped file. The
+mapping is read-only and backed by the page cache, so every uvicorn worker
+(and warm Lambda invocation) shares the same pages without its own copy.
+
+Layout (little-endian):
+    header    magic, format version, metadata offset/length, section offsets
+    metadata  JSON with the snapshot version, model and entry counts
+    sections  one per kind (dishes, products): entry count, then a table of
+              (key offset, key length, value offset, value length) sorted
+              by key, pointing into the string data that follows
+
+Keys are `normalize_key` strings. Dish values are the ingredients joined by
+newlines, product values the category name.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from normalization import normalize_key
+
+MAGIC = b"TOTECAT\x00"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<8sHH4I")  # magic, format, reserved, meta offset/length, dishes/products section offsets
+_COUNT = struct.Struct("<I")
+_ENTRY = struct.Struct("<4I")  # key offset, key length, value offset, value length
+
+class CatalogFormatError(ValueError):
+    """The file is not a catalog snapshot this version can read."""
+
+def _encode_section(entries: Dict[str, str], data_offset: int) -> Tuple[bytes, bytes]:
+    """Encode one section's table and string data, placed at `data_offset` in the file."""
+    table = [_COUNT.pack(len(entries))]
+    data = bytearray()
+    table_size = _COUNT.size + _ENTRY.size * len(entries)
+    base = data_offset + table_size
+    for key, value in sorted((key.encode("utf-8"), value.encode("utf-8")) for key, value in entries.items()):
+        key_offset = base + len(data)
+        data += key
+        value_offset = base + len(data)
+        data += value
+        table.append(_ENTRY.pack(key_offset, len(key), value_offset, len(value)))
+    return b"".join(table), bytes(data)
+
+def write_snapshot(path: str, dishes: Dict[str, List[str]], products: Dict[str, str], version: str,
+                   metadata: Optional[dict] = None) -> None:
+    """Atomically write a catalog snapshot.
+
+    `dishes` maps dish names to ingredients and `products` product names to
+    categories; names are normalized, the first spelling of a key wins.
+    """
+    dish_entries: Dict[str, str] = {}
+    for name, ingredients in dishes.items():
+        key = normalize_key(name)
+        items = [" ".join(item.split()) for item in ingredients]
+        if key and key not in dish_entries and any(items):
+            dish_entries[key] = "\n".join(item for item in items if item)
+    product_entries: Dict[str, str] = {}
+    for name, category in products.items():
+        key = normalize_key(name)
+        if key and key not in product_entries:
+            product_entries[key] = category
+
+    meta = json.dumps({
+        **(metadata or {}),
+        "version": version,
+        "dishes": len(dish_entries),
+        "products": len(product_entries),
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    meta_offset = _HEADER.size
+    dishes_offset = meta_offset + len(meta)
+    dish_table, dish_data = _encode_section(dish_entries, dishes_offset)
+    products_offset = dishes_offset + len(dish_table) + len(dish_data)
+    product_table, product_data = _encode_section(product_entries, products_offset)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, meta_offset, len(meta), dishes_offset, products_offset)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"".join((header, meta, dish_table, dish_data, product_table, product_data)))
+    os.replace(tmp_path, path)
+
+class _Section:
+    """Sorted key -> value table inside the mapped snapshot."""
+
+    def __init__(self, buffer: mmap.mmap, offset: int):
+        self._buffer = buffer
+        self._table = offset + _COUNT.size
+        (self.count,) = _COUNT.unpack_from(buffer, offset)
+        if self._table + self.count * _ENTRY.size > len(buffer):
+            raise CatalogFormatError("section table runs past the end of the file")
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        buffer = self._buffer
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, key_length, value_offset, value_length = _ENTRY.unpack_from(
+                buffer, self._table + middle * _ENTRY.size
+            )
+            candidate = buffer[key_offset:key_offset + key_length]
+            if candidate == key:
+                return buffer[value_offset:value_offset + value_length]
+            if candidate < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+class CatalogSnapshot:
+    """Memory-mapped, read-only catalog snapshot."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._buffer) < _HEADER.size:
+                raise CatalogFormatError("file is too short")
+            magic, format_version, _, meta_offset, meta_length, dishes_offset, products_offset = _HEADER.unpack_from(self._buffer)
+            if magic != MAGIC:
+                raise CatalogFormatError("not a catalog snapshot")
+            if format_version != FORMAT_VERSION:
+                raise CatalogFormatError(f"unsupported format version {format_version}")
+            self.metadata = json.loads(self._buffer[meta_offset:meta_offset + meta_length])
+            self._dishes = _Section(self._buffer, dishes_offset)
+            self._products = _Section(self._buffer, products_offset)
+        except Exception:
+            self._buffer.close()
+            raise
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> str:
+        return self.metadata.get("version", "")
+
+    def _count(self, found: bool) -> None:
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def dish_ingredients(self, dish_name: str) -> Optional[List[str]]:
+        """Return the precomputed ingredients of a dish, or None."""
+        value = self._dishes.get(normalize_key(dish_name).encode("utf-8"))
+        self._count(value is not None)
+        return value.decode("utf-8").split("\n") if value is not None else None
+
+    def product_category(self, product: str) -> Optional[str]:
+        """Return the precomputed category of a product, or None."""
+        value = self._products.get(normalize_key(product).encode("utf-8"))
+        self._count(value is not None)
+        return value.decode("utf-8") if value is not None else None
+
+    def split_products(self, products: List[str]) -> Tuple[Dict[str, List[str]], List[str]]:
+        """Split products into categories found in the catalog and unknown products."""
+        resolved: Dict[str, List[str]] = {}
+        unknown: List[str] = []
+        for product in products:
+            category = self.product_category(product)
+            if category is None:
+                unknown.append(product)
+            else:
+                resolved.setdefault(category, []).append(product)
+        return resolved, unknown
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return lookup counters and snapshot size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": self._dishes.count + self._products.count,
+        }
+
+    def close(self) -> None:
+        self._buffer.close()
+
+def open_snapshot(path: Optional[str]) -> Optional[CatalogSnapshot]:
+    """Open the snapshot at `path`, or return None when it is unset or missing."""
+    if not path or not os.path.exists(path):
+        return None
+    return CatalogSnapshot(path)
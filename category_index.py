@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from normalization import normalize_key
+from schemas import PRODUCT_CATEGORIES
+
+# Fallback category; products the model couldn't place are not learned
+OTHER_CATEGORY = "Otros"
+
+_CANONICAL_CATEGORIES = {normalize_key(category): category for category in PRODUCT_CATEGORIES}
+
+def canonical_category(name: str) -> Optional[str]:
+    """Map a category name to one of the fixed categories, if it matches one."""
+    return _CANONICAL_CATEGORIES.get(normalize_key(name))
+
+def category_map(categories: Dict[str, List[str]]) -> Dict[str, str]:
+    """Map normalized product names to fixed categories, skipping "Otros" and unknown categories."""
+    products: Dict[str, str] = {}
+    for name, items in categories.items():
+        category = canonical_category(name)
+        if category is None or category == OTHER_CATEGORY:
+            continue
+        for product in items:
+            key = normalize_key(product)
+            if key:
+                products.setdefault(key, category)
+    return products
+
+class CategoryIndex:
+    """Lookup index from normalized product names to fixed categories.
+
+    The index learns from model categorization results, so common products
+    can be resolved without calling the model. It is shared by every client,
+    so the categories a client assigned are only used for its own requests
+    (see `split`). When `path` is set it is loaded from and saved to a
+    JSON file; saves are throttled to at most one every `save_interval`
+    seconds to keep disk writes off the hot path.
+    """
+
+    def __init__(self, path: Optional[str] = None, save_interval: float = 30.0):
+        self.path = path
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._products: Dict[str, str] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    def lookup(self, product: str) -> Optional[str]:
+        """Return the known category for a product, or None."""
+        category = self._products.get(normalize_key(product))
+        if category is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return category
+
+    def learn(self, categories: Dict[str, List[str]], overwrite: bool = True) -> int:
+        """Record products from a category -> products mapping.
+
+        Only fixed categories other than "Otros" are learned. With
+        `overwrite=False`, products already in the index keep their category.
+        Returns the number of entries added or changed.
+        """
+        changed = 0
+        with self._lock:
+            for name, products in categories.items():
+                category = canonical_category(name)
+                if category is None or category == OTHER_CATEGORY:
+                    continue
+                for product in products:
+                    key = normalize_key(product)
+                    if not key:
+                        continue
+                    current = self._products.get(key)
+                    if current == category or (current is not None and not overwrite):
+                        continue
+                    self._products[key] = category
+                    changed += 1
+            if changed:
+                self._dirty = True
+        return changed
+
+    def split(self, products: List[str], overlay: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, List[str]], List[str]]:
+        """Split products into locally resolved categories and unknown products.
+
+        `overlay`, from `category_map`, is checked before the index and never
+        learned, so a client's own categories only apply to its request.
+        """
+        resolved: Dict[str, List[str]] = {}
+        unknown: List[str] = []
+        for product in products:
+            category = overlay.get(normalize_key(product)) if overlay else None
+            if category is None:
+                category = self.lookup(product)
+            if category is None:
+                unknown.append(product)
+            else:
+                resolved.setdefault(category, []).append(product)
+        return resolved, unknown
+
+    def load(self) -> None:
+        """Load the index from `path`."""
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            self._products = dict(data.get("products", {}))
+            self._dirty = False
+
+    def save(self) -> None:
+        """Atomically write the index to `path`."""
+        if not self.path:
+            return
+        with self._lock:
+            data = {"version": 1, "products": dict(self._products)}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def maybe_save(self) -> None:
+        """Save if there are unsaved changes and the save interval elapsed."""
+        if self.path and self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._products.clear()
+            self._dirty = False
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def stats(self) -> dict:
+        """Return lookup counters and index size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._products),
+        }
+
+def select_products(categories: Dict[str, List[str]], products: List[str]) -> Dict[str, List[str]]:
+    """Keep only `products` in a category -> products mapping, matched by normalized name.
+
+    Used before learning from model answers, which may repeat products from
+    the prompt's context that weren't asked about.
+    """
+    wanted = {normalize_key(product) for product in products}
+    selected: Dict[str, List[str]] = {}
+    for category, items in categories.items():
+        kept = [item for item in items if normalize_key(item) in wanted]
+        if kept:
+            selected[category] = kept
+    return selected
+
+def merge_categories(*mappings: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Merge category -> products mappings, dropping duplicate products per category."""
+    merged: Dict[str, List[str]] = {}
+    for mapping in mappings:
+        for category, products in mapping.items():
+            target = merged.setdefault(category, [])
+            for product in products:
+                if product not in target:
+                    target.append(product)
+    return merged
@@ -0,0 +1,281 @@
+"""Deterministic stand-in for an OpenAI-compatible chat completions API.
+
+Used to load-test the app offline with realistic upstream timing. It answers
+`/v1/chat/completions` (and Groq's `/openai/v1/chat/completions`) with
+structured tool calls generated from the request's JSON schema, after a
+configurable time to first token and a token throughput limit. A share of
+requests can fail with 500 or 429 responses. Output is derived from the
+prompt and the seed, so the same request always gets the same answer.
+
+Run it with:
+    python fake_llm_server.py --port 9000 --latency lognormal:0.8:0.4 --error-rate 0.02
+
+and point the app at it with LLM_BACKEND=openai LLM_BASE_URL=http://127.0.0.1:9000/v1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from prompts import estimate_tokens
+from schemas import PRODUCT_CATEGORIES
+
+# Words used to fill generated string fields
+VOCABULARY = [
+    "aceite de oliva", "arroz", "azúcar", "cebolla", "chimichurri", "chorizo", "crema",
+    "dulce de leche", "fernet", "fideos", "harina", "huevos", "leche", "limón", "manteca",
+    "mermelada", "morrones", "pan", "papas", "queso rallado", "salsa de tomate", "vinagre",
+    "yerba mate", "zanahoria",
+]
+
+class LatencyDistribution:
+    """Time to first token, parsed from a spec such as "lognormal:0.8:0.4".
+
+    Supported specs (values in seconds):
+        fixed:SECONDS
+        uniform:LOW:HIGH
+        exponential:MEAN
+        lognormal:MEDIAN:SIGMA
+    """
+
+    def __init__(self, spec: str):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(param) for param in params]
+        expected = {"fixed": 1, "uniform": 2, "exponential": 1, "lognormal": 2}
+        if expected.get(kind) != len(self.params):
+            raise ValueError(f"Invalid latency spec {spec!r}")
+        self.spec = spec
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "exponential":
+            return rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+@dataclass
+class FakeLLMConfig:
+    latency: str = "fixed:0.5"  # Time to first token
+    tokens_per_second: float = 300.0  # Completion token throughput, 0 for unlimited
+    error_rate: float = 0.0  # Share of requests answered with a 500
+    rate_limit_rate: float = 0.0  # Share of requests answered with a 429
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeLLMConfig":
+        return cls(
+            latency=os.getenv("FAKE_LLM_LATENCY", cls.latency),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", cls.tokens_per_second)),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", cls.error_rate)),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", cls.rate_limit_rate)),
+            seed=int(os.getenv("FAKE_LLM_SEED", cls.seed)),
+        )
+
+@dataclass
+class FakeLLMStats:
+    requests: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    models: Dict[str, int] = field(default_factory=dict)
+
+def _resolve(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    ref = schema.get("$ref")
+    if ref and ref.startswith("#/$defs/"):
+        return root.get("$defs", {}).get(ref.split("/")[-1], {})
+    return schema
+
+def generate_value(schema: Dict[str, Any], rng: random.Random, root: Optional[Dict[str, Any]] = None) -> Any:
+    """Generate a value matching a (pydantic-generated) JSON schema."""
+    root = root or schema
+    schema = _resolve(schema, root)
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return generate_value(options[0] if options else {}, rng, root)
+    kind = schema.get("type")
+    if kind == "object":
+        if "properties" in schema:
+            return {name: generate_value(prop, rng, root) for name, prop in schema["properties"].items()}
+        if isinstance(schema.get("additionalProperties"), dict):
+            keys = rng.sample(PRODUCT_CATEGORIES, 3)
+            return {key: generate_value(schema["additionalProperties"], rng, root) for key in keys}
+        return {}
+    if kind == "array":
+        items = _resolve(schema.get("items", {}), root)
+        count = rng.randint(4, 6)
+        if items.get("type", "string") == "string":
+            return rng.sample(VOCABULARY, count)
+        return [generate_value(items, rng, root) for _ in range(count)]
+    if kind == "integer":
+        return rng.randint(0, 10)
+    if kind == "number":
+        return round(rng.random(), 3)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return rng.choice(VOCABULARY)
+
+def create_app(config: Optional[FakeLLMConfig] = None) -> FastAPI:
+    """Build the fake server app."""
+    config = config or FakeLLMConfig.from_env()
+    latency = LatencyDistribution(config.latency)
+    # Timing and failures are drawn from a seeded stream, so a run with the
+    # same seed and request order sees the same upstream behavior
+    timing_rng = random.Random(config.seed)
+    stats = FakeLLMStats()
+
+    app = FastAPI(title="Fake LLM server")
+    app.state.config = config
+    app.state.stats = stats
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats.__dict__
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake-model")
+        stats.requests += 1
+        stats.models[model] = stats.models.get(model, 0) + 1
+
+        roll = timing_rng.random()
+        time_to_first_token = latency.sample(timing_rng)
+        if roll < config.error_rate:
+            stats.errors += 1
+            await asyncio.sleep(time_to_first_token)
+            return JSONResponse({"error": {"message": "Fake upstream error", "type": "server_error"}}, status_code=500)
+        if roll < config.error_rate + config.rate_limit_rate:
+            stats.rate_limited += 1
+            return JSONResponse(
+                {"error": {"message": "Fake rate limit", "type": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": "1"},
+            )
+
+        prompt = "\n".join(str(message.get("content") or "") for message in body.get("messages", []))
+        digest = hashlib.sha256(f"{config.seed}:{model}:{prompt}".encode()).digest()
+        content_rng = random.Random(int.from_bytes(digest[:8], "big"))
+
+        tools = body.get("tools") or []
+        if tools:
+            function = tools[0]["function"]
+            name = function["name"]
+            output = json.dumps(generate_value(function.get("parameters", {}), content_rng), ensure_ascii=False)
+        else:
+            name = None
+            output = json.dumps({"items": generate_value({"type": "array"}, content_rng)}, ensure_ascii=False)
+
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = max(estimate_tokens(output), 1)
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        generation_time = completion_tokens / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        completion_id = f"chatcmpl-fake-{digest[:6].hex()}"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream_chunks(completion_id, model, name, output, time_to_first_token, generation_time, usage),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(time_to_first_token + generation_time)
+        if name:
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{"id": "call_0", "type": "function", "function": {"name": name, "arguments": output}}],
+            }
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": output}
+            finish_reason = "stop"
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/openai/v1/chat/completions", chat_completions, methods=["POST"])
+    return app
+
+async def _stream_chunks(completion_id: str, model: str, name: Optional[str], output: str,
+                         time_to_first_token: float, generation_time: float, usage: Dict[str, int]):
+    """Yield SSE chunks for a completion, spreading the output over the generation time."""
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    await asyncio.sleep(time_to_first_token)
+    if name:
+        yield chunk({"role": "assistant", "tool_calls": [
+            {"index": 0, "id": "call_0", "type": "function", "function": {"name": name, "arguments": ""}}
+        ]})
+    else:
+        yield chunk({"role": "assistant", "content": ""})
+
+    pieces: List[str] = [output[i:i + 8] for i in range(0, len(output), 8)]
+    delay = generation_time / len(pieces) if pieces else 0.0
+    for piece in pieces:
+        await asyncio.sleep(delay)
+        if name:
+            yield chunk({"tool_calls": [{"index": 0, "function": {"arguments": piece}}]})
+        else:
+            yield chunk({"content": piece})
+    yield chunk({}, "tool_calls" if name else "stop", usage=usage)
+    yield "data: [DONE]\n\n"
+
+app = create_app()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible LLM server for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default=FakeLLMConfig.latency, help="Time to first token distribution, e.g. fixed:0.5, uniform:0.2:1.5, exponential:0.6, lognormal:0.8:0.4")
+    parser.add_argument("--tokens-per-second", type=float, default=FakeLLMConfig.tokens_per_second, help="Completion token throughput, 0 for unlimited")
+    parser.add_argument("--error-rate", type=float, default=FakeLLMConfig.error_rate, help="Share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=FakeLLMConfig.rate_limit_rate, help="Share of requests answered with a 429")
+    parser.add_argument("--seed", type=int, default=FakeLLMConfig.seed)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = FakeLLMConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
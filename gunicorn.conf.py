@@ -0,0 +1,44 @@
+"""Gunicorn settings for serving the API with several worker processes.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Every worker is a uvicorn event loop. The app is imported once in the
+master and the workers are forked from it, so modules (and the catalog
+snapshot mapping) are loaded once and shared copy-on-write. The upstream
+clients and the log thread are recreated in each worker after fork.
+
+Signals to the master:
+    TERM      graceful shutdown: stop accepting, let requests finish for up to GRACEFUL_TIMEOUT
+    HUP       graceful restart of every worker (with the preloaded app, code isn't reloaded)
+    USR2      start a new master with the new code next to the old one, then
+              send TERM to the old master once the new one is up
+    TTIN/TTOU add or remove a worker
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# One worker unless WEB_CONCURRENCY says otherwise: in a container
+# os.cpu_count() is the host's cores, not the CPU quota, and every worker
+# holds its own caches, recommender, connection pools and Sentry threads
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the app in the master before forking the workers
+preload_app = os.getenv("PRELOAD_APP", "1").lower() in ("1", "true", "yes")
+
+# Time in-flight requests get to finish on shutdown or restart
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Workers that stop answering the master for this long are killed and
+# replaced; longer than UPSTREAM_TOTAL_TIMEOUT so slow completions don't count
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE_TIMEOUT", "5"))
+
+# Optionally recycle workers after a number of requests, spread out by the
+# jitter so they don't all restart at once
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", str(max_requests // 10)))
+
+# Application logs are JSON lines on stdout; gunicorn only logs its own events
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
@@ -0,0 +1,76 @@
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# A backend builds a (sync client, async client) pair of instructor clients.
+# (None, None) makes the service functions return mock data.
+# The async clients don't retry on their own: the service layer retries
+# their calls within a retry budget (see resilience.py).
+ClientPair = Tuple[Optional[Any], Optional[Any]]
+
+def groq_backend() -> ClientPair:
+    """Groq API, optionally through GROQ_BASE_URL."""
+    from groq import Groq, AsyncGroq
+    import instructor
+    import upstream_transport
+
+    api_key = os.getenv("GROQ_API_KEY")
+    base_url = os.getenv("GROQ_BASE_URL") or None
+    timeout = upstream_transport.settings.timeout
+    return (
+        instructor.from_groq(Groq(
+            api_key=api_key, base_url=base_url, timeout=timeout,
+            http_client=upstream_transport.build_http_client(),
+        )),
+        instructor.from_groq(AsyncGroq(
+            api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0,
+            http_client=upstream_transport.build_async_http_client(),
+        )),
+    )
+
+def openai_compatible_backend() -> ClientPair:
+    """Any OpenAI-compatible server at LLM_BASE_URL, such as fake_llm_server.py."""
+    from openai import OpenAI, AsyncOpenAI
+    import instructor
+    import upstream_transport
+
+    base_url = os.getenv("LLM_BASE_URL", "http://127.0.0.1:9000/v1")
+    api_key = os.getenv("LLM_API_KEY", "not-needed")
+    timeout = upstream_transport.settings.timeout
+    return (
+        instructor.from_openai(OpenAI(
+            base_url=base_url, api_key=api_key, timeout=timeout,
+            http_client=upstream_transport.build_http_client(),
+        )),
+        instructor.from_openai(AsyncOpenAI(
+            base_url=base_url, api_key=api_key, timeout=timeout, max_retries=0,
+            http_client=upstream_transport.build_async_http_client(),
+        )),
+    )
+
+def mock_backend() -> ClientPair:
+    """No upstream; the service functions return canned responses."""
+    return None, None
+
+BACKENDS: Dict[str, Callable[[], ClientPair]] = {
+    "groq": groq_backend,
+    "openai": openai_compatible_backend,
+    "mock": mock_backend,
+}
+
+def default_backend_name() -> str:
+    """Pick the backend from LLM_BACKEND, defaulting to Groq when an API key is set."""
+    name = os.getenv("LLM_BACKEND")
+    if name:
+        return name.lower()
+    api_key = os.getenv("GROQ_API_KEY")
+    # Only use Groq if API key is available. This helps with testing environments
+    return "groq" if api_key and api_key != "test_api_key" else "mock"
+
+def build_clients(name: Optional[str] = None) -> ClientPair:
+    """Build the instructor clients for a backend."""
+    name = name or default_backend_name()
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM backend {name!r}, expected one of: {', '.join(BACKENDS)}") from None
+    return backend()
@@ -0,0 +1,227 @@
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from normalization import normalize_key
+
+Row = Dict[str, float]
+
+class LocalRecommender:
+    """Co-occurrence recommender answering without calling the model.
+
+    Keeps, for each product, how often every other product was recommended
+    after it was added to a list. The rows come from fixed seed examples
+    (the recommendations prompt's few-shot examples) and from learning the
+    model's past answers. A list is scored by adding up the rows of its
+    recent products, so items that go with several of them rank first.
+
+    Products are matched by normalized name, or by the known products sharing
+    the most words (e.g. "fideos tirabuzón" uses the row of "fideos"). Words
+    found in more than `max_word_products` products say little and are
+    skipped, which also keeps lookups fast. Ties are broken by name, so the
+    same list always gets the same answer.
+
+    Learned rows can be persisted to a JSON file at `path`, with saves
+    throttled like the category index.
+    """
+
+    def __init__(self, path: Optional[str] = None, save_interval: float = 30.0, min_similarity: float = 0.3,
+                 max_products: int = 20000, max_row_size: int = 64, max_word_products: int = 100,
+                 max_matches: int = 3):
+        self.path = path
+        self.save_interval = save_interval
+        self.min_similarity = min_similarity
+        self.max_products = max_products
+        self.max_row_size = max_row_size
+        self.max_word_products = max_word_products
+        self.max_matches = max_matches
+        self._lock = threading.Lock()
+        self._seed: Dict[str, Row] = {}
+        self._learned: Dict[str, Row] = {}
+        self._names: Dict[str, str] = {}  # Normalized item -> first spelling seen
+        self._words: Dict[str, Set[str]] = {}  # Word -> known products containing it
+        self._totals: Row = {}  # Item -> total weight, for filling in popular items
+        self._popular: Optional[List[Tuple[str, float]]] = None
+        self._dirty = False
+        self._last_save = 0.0
+        self.answers = 0
+        self.learned_answers = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    def _add(self, rows: Dict[str, Row], recent: Iterable[str], recommended: Iterable[str], weight: float) -> None:
+        items = []
+        for item in recommended:
+            key = normalize_key(item)
+            if key:
+                self._names.setdefault(key, item)
+                items.append(key)
+        for product in recent:
+            product_key = normalize_key(product)
+            if not product_key:
+                continue
+            row = rows.get(product_key)
+            if row is None:
+                if len(self._learned) + len(self._seed) >= self.max_products:
+                    continue
+                row = rows[product_key] = {}
+                for word in product_key.split():
+                    self._words.setdefault(word, set()).add(product_key)
+            for key in items:
+                if key != product_key:
+                    row[key] = row.get(key, 0.0) + weight
+                    self._totals[key] = self._totals.get(key, 0.0) + weight
+            if len(row) > self.max_row_size:
+                # Keep the strongest pairs
+                kept = sorted(row.items(), key=lambda pair: (-pair[1], pair[0]))[:self.max_row_size]
+                rows[product_key] = dict(kept)
+
+    def _popular_items(self) -> List[Tuple[str, float]]:
+        # Recomputed only after learning something
+        popular = self._popular
+        if popular is None:
+            popular = heapq.nsmallest(self.max_row_size, self._totals.items(), key=lambda pair: (-pair[1], pair[0]))
+            self._popular = popular
+        return popular
+
+    def seed(self, examples: Iterable[Tuple[Sequence[str], Sequence[str]]]) -> None:
+        """Add fixed (recent products, recommendations) examples, kept across `clear`."""
+        with self._lock:
+            for recent, recommended in examples:
+                self._add(self._seed, recent, recommended, 1.0)
+            self._popular = None
+
+    def learn(self, recent: Sequence[str], recommended: Sequence[str]) -> None:
+        """Record a model answer for a list whose recent products were `recent`."""
+        with self._lock:
+            self._add(self._learned, recent, recommended, 1.0)
+            self._popular = None
+            self.learned_answers += 1
+            self._dirty = True
+
+    def _resolve(self, product_key: str) -> List[Tuple[str, float]]:
+        """Known products matching a normalized product, with their similarity."""
+        if product_key in self._seed or product_key in self._learned:
+            return [(product_key, 1.0)]
+        # Otherwise the known products sharing the most words (Jaccard similarity)
+        words = set(product_key.split())
+        candidates: Set[str] = set()
+        for word in words:
+            known = self._words.get(word, ())
+            if len(known) <= self.max_word_products:
+                candidates.update(known)
+        best: List[Tuple[str, float]] = []
+        best_similarity = self.min_similarity
+        for candidate in sorted(candidates):
+            candidate_words = set(candidate.split())
+            similarity = len(words & candidate_words) / len(words | candidate_words)
+            if similarity > best_similarity or (similarity == best_similarity and not best):
+                best, best_similarity = [(candidate, similarity)], similarity
+            elif similarity == best_similarity:
+                best.append((candidate, similarity))
+        return best[:self.max_matches]
+
+    def rank(self, products: Sequence[str], window: int = 3) -> Tuple[List[Tuple[str, float]], int]:
+        """Score candidates for a list from its `window` most recent products.
+
+        Returns (item, score) pairs, best first, excluding products already
+        in the list, and how many of the recent products were matched.
+        """
+        excluded = {normalize_key(product) for product in products}
+        scores: Row = {}
+        matched = 0
+        for product in products[:window]:
+            matches = self._resolve(normalize_key(product))
+            if matches:
+                matched += 1
+            for known, similarity in matches:
+                for rows in (self._seed, self._learned):
+                    for key, weight in rows.get(known, {}).items():
+                        if key not in excluded:
+                            scores[key] = scores.get(key, 0.0) + weight * similarity
+        ranked = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+        return [(self._names[key], score) for key, score in ranked], matched
+
+    def recommend(self, products: Sequence[str], limit: int = 5, window: int = 3) -> List[str]:
+        """Recommend up to `limit` items, filling in with popular items when few match."""
+        ranked, _ = self.rank(products, window)
+        recommended = [name for name, _ in ranked[:limit]]
+        if len(recommended) < limit:
+            excluded = {normalize_key(product) for product in products}
+            excluded.update(normalize_key(name) for name in recommended)
+            for key, _ in self._popular_items():
+                if len(recommended) >= limit:
+                    break
+                if key not in excluded:
+                    recommended.append(self._names[key])
+        self.answers += 1
+        return recommended
+
+    def load(self) -> None:
+        """Load learned rows from `path`."""
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            self._learned = {}
+            names = data.get("names", {})
+            for product_key, row in data.get("rows", {}).items():
+                self._learned[product_key] = dict(row)
+                for key, weight in row.items():
+                    self._totals[key] = self._totals.get(key, 0.0) + weight
+                for word in product_key.split():
+                    self._words.setdefault(word, set()).add(product_key)
+            for key, name in names.items():
+                self._names.setdefault(key, name)
+            self._popular = None
+            self._dirty = False
+
+    def save(self) -> None:
+        """Atomically write the learned rows to `path`."""
+        if not self.path:
+            return
+        with self._lock:
+            rows = {product_key: dict(row) for product_key, row in self._learned.items()}
+            names = {key: self._names[key] for row in rows.values() for key in row}
+            data = {"version": 1, "rows": rows, "names": names}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def maybe_save(self) -> None:
+        """Save if there are unsaved changes and the save interval elapsed."""
+        if self.path and self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def clear(self) -> None:
+        """Forget learned answers and reset the counters; seed examples are kept."""
+        with self._lock:
+            self._learned.clear()
+            self._totals = {}
+            for row in self._seed.values():
+                for key, weight in row.items():
+                    self._totals[key] = self._totals.get(key, 0.0) + weight
+            self._words = {}
+            for product_key in self._seed:
+                for word in product_key.split():
+                    self._words.setdefault(word, set()).add(product_key)
+            self._popular = None
+            self._dirty = False
+            self.answers = 0
+            self.learned_answers = 0
+
+    def __len__(self) -> int:
+        return len(self._seed.keys() | self._learned.keys())
+
+    def stats(self) -> dict:
+        """Return answer counters and the number of known products."""
+        return {
+            "answers": self.answers,
+            "learned_answers": self.learned_answers,
+            "products": len(self),
+        }
@@ -1,95 +1,245 @@
 import os
+import json
+import math
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from mangum import Mangum
 from schemas import (
     RecommendationRequest,
     RecommendationResponse,
+    RecommendationPrefetchRequest,
+    RecommendationPrefetchResponse,
     DishIngredientsResponse,
+    DishIngredientsBatchRequest,
+    DishIngredientsBatchResponse,
     CategorizationRequest,
     CategorizationResponse,
+    BulkCategorizationResponse,
 )
 import services
 import sentry_sdk
-from sentry_sdk import logger as sentry_logger
+from sentry_sdk.integrations.fastapi import FastApiIntegration
+from sentry_sdk.integrations.starlette import StarletteIntegration
+from resilience import CircuitOpenError
+import admission
+import metrics
+import tracing
+from structured_logging import configure_logging, get_logger, sentry_logging_integration
 sentry_sdk.init(
-    dsn="https://45d96cc649186cfbb6feb39753ff005c@o4509340585099264.ingest.us.sentry.io/4509340587720704",
+    dsn=os.getenv(
+        "SENTRY_DSN",
+        "https://45d96cc649186cfbb6feb39753ff005c@o4509340585099264.ingest.us.sentry.io/4509340587720704",
+    ) or None,
+    environment=os.getenv("SENTRY_ENVIRONMENT") or None,
     # Add data like request headers and IP for users,
     # see https://docs.sentry.io/platforms/python/data-management/data-collected/ for more info
-    send_default_pii=True,
+    send_default_pii=os.getenv("SENTRY_SEND_DEFAULT_PII", "true").lower() in ("1", "true", "yes"),
+    # Traces are sampled per route, and more often right after errors (see
+    # tracing.py); profiles are taken for a share of the sampled traces
+    traces_sampler=tracing.sampler,
+    profiles_sample_rate=float(os.getenv("SENTRY_PROFILES_SAMPLE_RATE", "0")),
+    # Auto-enabled integrations import every supported library that is
+    # installed (openai alone adds ~0.5s to cold starts), so only enable
+    # the ones this app uses. Logs reach Sentry through structured_logging.
+    auto_enabling_integrations=False,
+    integrations=[StarletteIntegration(), FastApiIntegration(), sentry_logging_integration()],
     _experiments={
         "enable_logs": True,
     }
 )
 
+# Application logs go through a queue to stdout and Sentry
+configure_logging()
+logger = get_logger("api")
+
 app = FastAPI(
     title="Tote Backend API",
     description="A FastAPI backend for recommendations, dish ingredients, and product categorization using Groq's LLaMa 3.3 70B.",
     version="1.0.0",
 )
 
-# Enable CORS for public endpoints
+# Routes answering with server errors get their traces sampled more often
+app.add_middleware(tracing.ErrorSamplingMiddleware)
+
+# Requests to the endpoints calling the model are rate limited per client
+# and wait for one of a limited number of slots, so a spike is queued or shed
+# here instead of piling onto the upstream
+LLM_ENDPOINT_PATHS = (
+    "/recommendations",
+    "/recommendations/stream",
+    "/recommendations/prefetch",
+    "/dishes/ingredients",
+    "/dishes/ingredients/batch",
+    "/categorize-products",
+    "/categorize-products/bulk",
+)
+app.add_middleware(admission.AdmissionMiddleware, paths=LLM_ENDPOINT_PATHS)
+
+# Per-route latency histograms and in-flight requests, served on /metrics
+app.add_middleware(metrics.PrometheusMiddleware)
+
+# Enable CORS for public endpoints. Added last so it is the outermost layer
+# and the 429 and 503 answers of admission control carry CORS headers too;
+# Retry-After is exposed so browsers can read it.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
+def _upstream_unavailable(error: CircuitOpenError, detail: str) -> HTTPException:
+    """503 telling the client when the upstream will be tried again."""
+    logger.warning('Upstream unavailable: {error}', error=str(error))
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(max(math.ceil(error.retry_after), 1))},
+    )
+
 @app.get("/health")
 async def health_check():
-    sentry_logger.debug('Health check endpoint called')
+    logger.debug('Health check endpoint called')
     return {"status": "ok"}
 
 @app.post("/recommendations", response_model=RecommendationResponse)
 async def recommendations_endpoint(request: RecommendationRequest):
     try:
-        sentry_logger.info('Processing recommendations request for {count} products', count=len(request.products))
-        recommended_items = services.get_recommendations(request.products)
-        sentry_logger.info('Successfully generated {count} recommendations', count=len(recommended_items))
+        logger.info('Processing recommendations request for {count} products', count=len(request.products))
+        recommended_items = await services.get_recommendations_async(request.products)
+        logger.info('Successfully generated {count} recommendations', count=len(recommended_items))
         return RecommendationResponse(recommended_items=recommended_items)
+    except CircuitOpenError as e:
+        raise _upstream_unavailable(e, "Failed to get recommendations")
     except Exception as e:
-        sentry_logger.error('Failed to get recommendations: {error}', error=str(e))
-        print("Error in recommendations_endpoint:", e)
+        logger.error('Failed to get recommendations: {error}', error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get recommendations")
 
+@app.post("/recommendations/prefetch", response_model=RecommendationPrefetchResponse, status_code=202)
+async def recommendations_prefetch_endpoint(request: RecommendationPrefetchRequest):
+    # Many users share one client address behind a proxy, so lists are only
+    # told apart by their globally unique ids. Without one a prefetch never
+    # cancels another.
+    status = services.prefetch_recommendations(request.list_id, request.products)
+    logger.debug('Recommendations prefetch for {count} products: {status}', count=len(request.products), status=status)
+    return RecommendationPrefetchResponse(status=status)
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/recommendations/stream")
+async def recommendations_stream_endpoint(request: RecommendationRequest):
+    logger.info('Streaming recommendations for {count} products', count=len(request.products))
+
+    async def event_stream():
+        count = 0
+        try:
+            async for item in services.stream_recommendations_async(request.products):
+                count += 1
+                yield _sse_event("item", {"item": item})
+            logger.info('Successfully streamed {count} recommendations', count=count)
+            yield _sse_event("done", {"count": count})
+        except Exception as e:
+            logger.error('Failed to stream recommendations: {error}', error=str(e))
+            yield _sse_event("error", {"detail": "Failed to get recommendations"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/dishes/ingredients", response_model=DishIngredientsResponse)
 async def dish_ingredients_endpoint(dish_name: str = Query(..., description="Name of the dish to get ingredients for")):
     try:
-        sentry_logger.info('Fetching ingredients for dish: {dish}', dish=dish_name)
-        ingredients = services.get_dish_ingredients(dish_name)
-        sentry_logger.info('Found {count} ingredients for {dish}', count=len(ingredients), dish=dish_name)
+        logger.info('Fetching ingredients for dish: {dish}', dish=dish_name)
+        ingredients = await services.get_dish_ingredients_async(dish_name)
+        logger.info('Found {count} ingredients for {dish}', count=len(ingredients), dish=dish_name)
         return DishIngredientsResponse(ingredients=ingredients)
+    except CircuitOpenError as e:
+        raise _upstream_unavailable(e, "Failed to get dish ingredients")
     except Exception as e:
-        sentry_logger.error('Failed to get ingredients for dish {dish}: {error}', dish=dish_name, error=str(e))
-        print("Error in dish_ingredients_endpoint:", e)
+        logger.error('Failed to get ingredients for dish {dish}: {error}', dish=dish_name, error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to get dish ingredients")
+
+@app.post("/dishes/ingredients/batch", response_model=DishIngredientsBatchResponse)
+async def dish_ingredients_batch_endpoint(request: DishIngredientsBatchRequest):
+    try:
+        logger.info('Fetching ingredients for {count} dishes', count=len(request.dish_names))
+        ingredients = await services.get_dishes_ingredients_async(request.dish_names)
+        shopping_list = services.merge_shopping_list(*ingredients.values()) if request.include_shopping_list else None
+        logger.info('Found ingredients for {count} dishes', count=len(ingredients))
+        return DishIngredientsBatchResponse(
+            dishes={name: DishIngredientsResponse(ingredients=items) for name, items in ingredients.items()},
+            shopping_list=shopping_list,
+        )
+    except CircuitOpenError as e:
+        raise _upstream_unavailable(e, "Failed to get dish ingredients")
+    except Exception as e:
+        logger.error('Failed to get ingredients for {count} dishes: {error}', count=len(request.dish_names), error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get dish ingredients")
 
 @app.post("/categorize-products", response_model=CategorizationResponse)
 async def categorize_products_endpoint(request: CategorizationRequest):
     try:
-        sentry_logger.info(
+        logger.info(
             'Categorizing {uncategorized_count} products based on {categorized_count} existing categorized products',
             uncategorized_count=len(request.uncategorized_products),
             categorized_count=len(request.categorized_products)
         )
-        categorized = services.categorize_products(request.categorized_products, request.uncategorized_products)
-        sentry_logger.info('Successfully categorized products into {category_count} categories', category_count=len(categorized))
+        categorized = await services.categorize_products_async(request.categorized_products, request.uncategorized_products)
+        logger.info('Successfully categorized products into {category_count} categories', category_count=len(categorized))
         return CategorizationResponse(categories=categorized)
+    except CircuitOpenError as e:
+        raise _upstream_unavailable(e, "Failed to categorize products")
     except Exception as e:
-        sentry_logger.error('Failed to categorize products: {error}', error=str(e))
-        print("Error in categorize_products_endpoint:", e)
+        logger.error('Failed to categorize products: {error}', error=str(e))
         raise HTTPException(status_code=500, detail="Failed to categorize products")
 
+@app.post("/categorize-products/bulk", response_model=BulkCategorizationResponse)
+async def categorize_products_bulk_endpoint(request: CategorizationRequest):
+    try:
+        logger.info(
+            'Bulk categorizing {uncategorized_count} products based on {categorized_count} existing categorized products',
+            uncategorized_count=len(request.uncategorized_products),
+            categorized_count=len(request.categorized_products)
+        )
+        categorized, chunks = await services.categorize_products_bulk_async(
+            request.categorized_products, request.uncategorized_products
+        )
+        logger.info(
+            'Successfully categorized products into {category_count} categories using {chunk_count} chunks',
+            category_count=len(categorized),
+            chunk_count=len(chunks)
+        )
+        return BulkCategorizationResponse(categories=categorized, chunks=chunks)
+    except CircuitOpenError as e:
+        raise _upstream_unavailable(e, "Failed to categorize products")
+    except Exception as e:
+        logger.error('Failed to bulk categorize products: {error}', error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to categorize products")
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/latest-version")
 async def latest_version():
     return {"version": "latest"}
 
 @app.get("/sentry-debug")
 async def trigger_error():
-    sentry_logger.warning('Debug endpoint called - about to trigger an error')
+    logger.warning('Debug endpoint called - about to trigger an error')
     division_by_zero = 1 / 0
 
 # AWS Lambda handler
 handler = Mangum(app)
+
+# Optionally build the Groq clients during the Lambda init phase, so the
+# first invocation doesn't pay for importing groq and instructor
+if os.getenv("PREWARM_ON_INIT", "").lower() in ("1", "true", "yes"):
+    services.warm_up()
@@ -0,0 +1,293 @@
+"""Minimal Prometheus metrics, rendered in the text exposition format.
+
+Request-path metrics are plain counters, gauges and histograms kept in
+process memory; recording one is a dict lookup and an addition. Stats that
+other modules already keep (caches, connection pool, circuit breaker, ...)
+are read only when `/metrics` is scraped, through collectors registered with
+`register_collector`, so they add nothing to the request path.
+
+Every uvicorn worker (and Lambda instance) has its own registry; scrape each
+worker, or aggregate the series, to get service-wide numbers.
+"""
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request and upstream latencies range from milliseconds (cache hits) to
+# tens of seconds (slow completions)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# A sample line: (metric name, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+        self.clear()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+            # Unlabeled counters and gauges are exported as 0 until first used
+            if not self.labelnames and self.kind in ("counter", "gauge"):
+                self._values[()] = 0
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, self._labels(key), value) for key, value in values]
+
+class Gauge(_Metric):
+    """Value that goes up and down."""
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, self._labels(key), value) for key, value in values]
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._values.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = [(key, (list(series[0]), series[1], series[2])) for key, series in self._values.items()]
+        samples: List[Sample] = []
+        for key, (counts, total, count) in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+class CollectedMetric:
+    """Metric family whose samples are produced by a collector at scrape time."""
+
+    def __init__(self, name: str, documentation: str, kind: str, samples: Iterable[Tuple[Dict[str, str], float]]):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self._samples = list(samples)
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, labels, value) for labels, value in self._samples]
+
+class Registry:
+    """Set of metrics and collectors rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[CollectedMetric]]) -> None:
+        """Add a function returning `CollectedMetric`s, called on every scrape."""
+        self._collectors.append(collector)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def clear(self) -> None:
+        """Reset every metric (collectors are kept)."""
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        families = list(self._metrics.values())
+        for collector in self._collectors:
+            families.extend(collector())
+        lines: List[str] = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for name, labels, value in family.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "Time to send the full response, by route.", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "Requests being processed."
+)
+LLM_REQUEST_DURATION = registry.histogram(
+    "llm_request_duration_seconds", "Upstream completion time, including retries, by model.", ("model", "outcome")
+)
+STREAM_FIRST_ITEM_DURATION = registry.histogram(
+    "recommendations_stream_first_item_seconds",
+    "Time from a streamed recommendations request to its first item, by source (cache, local or the model).", ("source",)
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Tokens reported by the upstream, by model and kind (prompt or completion).", ("model", "kind")
+)
+PROMPT_TOKENS = registry.histogram(
+    "llm_prompt_tokens", "Estimated tokens of each prompt, by endpoint and part (static system prefix or dynamic user part).",
+    ("endpoint", "part"), buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096),
+)
+LLM_VALIDATION_ERRORS = registry.counter(
+    "llm_validation_errors_total", "Completions that failed response model validation; instructor retries them while attempts remain."
+)
+
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "admission_in_flight", "LLM endpoint requests holding an admission slot."
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    "admission_queue_depth", "LLM endpoint requests waiting for an admission slot."
+)
+ADMISSION_QUEUE_WAIT = registry.histogram(
+    "admission_queue_wait_seconds", "Time admitted requests waited for a slot.",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+ADMISSION_REJECTED = registry.counter(
+    "admission_rejected_total", "Requests rejected before reaching the service, by reason.", ("reason",)
+)
+
+def observe_llm_call(model: str, seconds: float, ok: bool, response: Optional[object] = None) -> None:
+    """Record an upstream call, with its token usage when the response carries it."""
+    LLM_REQUEST_DURATION.observe(seconds, model=model, outcome="success" if ok else "error")
+    usage = getattr(getattr(response, "_raw_response", None), "usage", None)
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if isinstance(tokens, int):
+            LLM_TOKENS.inc(tokens, model=model, kind=kind)
+
+class PrometheusMiddleware:
+    """ASGI middleware recording request latency per route and in-flight requests.
+
+    Routes are labeled with their path template (e.g. `/dishes/ingredients`),
+    so the number of series stays bounded. Paths in `exclude`, such as
+    `/metrics` itself, are not recorded.
+    """
+
+    def __init__(self, app, exclude: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
@@ -0,0 +1,111 @@
+import os
+import threading
+from typing import Dict, List, Optional
+
+from resilience import LatencyTracker
+
+class TierStats:
+    """Calls, failures, escalations and latency of one model tier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = LatencyTracker()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.failures = 0
+            self.escalations: Dict[str, int] = {}
+            self.latency_seconds_total = 0.0
+        self.latency.clear()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.latency_seconds_total += seconds
+            if not ok:
+                self.failures += 1
+        if ok:
+            self.latency.record(seconds)
+
+    def record_escalation(self, reason: str) -> None:
+        with self._lock:
+            self.escalations[reason] = self.escalations.get(reason, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            escalated = sum(self.escalations.values())
+            return {
+                "calls": self.calls,
+                "failures": self.failures,
+                "escalations": dict(self.escalations),
+                "escalation_rate": escalated / self.calls if self.calls else 0.0,
+                "latency_seconds_total": self.latency_seconds_total,
+                "latency_p50": self.latency.percentile(50),
+                "latency_p95": self.latency.percentile(95),
+            }
+
+class ModelRouter:
+    """Pick the models to try for a request, cheapest first.
+
+    Endpoints listed in `small_endpoints` start on the small model when their
+    input is at most `small_max_input_chars` characters; the caller escalates
+    to the next model when the answer fails validation or isn't confident
+    enough. Everything else goes straight to the large model.
+    """
+
+    def __init__(self, large_model: str, small_model: Optional[str] = None,
+                 small_endpoints: Optional[List[str]] = None, small_max_input_chars: int = 600):
+        self.large_model = large_model
+        self.small_model = small_model
+        self.small_endpoints = set(small_endpoints or [])
+        self.small_max_input_chars = small_max_input_chars
+        self._stats: Dict[str, TierStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, large_model: str) -> "ModelRouter":
+        endpoints = os.getenv("LLM_SMALL_MODEL_ENDPOINTS", "categorization")
+        return cls(
+            large_model=large_model,
+            small_model=os.getenv("LLM_SMALL_MODEL", "llama-3.1-8b-instant") or None,
+            small_endpoints=[endpoint.strip() for endpoint in endpoints.split(",") if endpoint.strip()],
+            small_max_input_chars=int(os.getenv("LLM_SMALL_MODEL_MAX_INPUT_CHARS", "600")),
+        )
+
+    def models_for(self, endpoint: str, input_chars: int) -> List[str]:
+        """Models to try for a request, in escalation order."""
+        if (
+            self.small_model
+            and self.small_model != self.large_model
+            and endpoint in self.small_endpoints
+            and input_chars <= self.small_max_input_chars
+        ):
+            return [self.small_model, self.large_model]
+        return [self.large_model]
+
+    def tier(self, model: str) -> TierStats:
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                stats = self._stats[model] = TierStats()
+            return stats
+
+    def record(self, model: str, seconds: float, ok: bool = True) -> None:
+        """Record a call to `model`."""
+        self.tier(model).record(seconds, ok)
+
+    def record_escalation(self, model: str, reason: str) -> None:
+        """Record that an answer from `model` was escalated to the next tier."""
+        self.tier(model).record_escalation(reason)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-model call, escalation and latency metrics."""
+        with self._lock:
+            tiers = dict(self._stats)
+        return {model: stats.snapshot() for model, stats in tiers.items()}
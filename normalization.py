@@ -0,0 +1,128 @@
+import re
+import unicodedata
+from typing import Dict, Iterable, List
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Spanish words ending in one of these consonants take "-es" in the plural
+# (pan -> panes, alfajor -> alfajores, flan -> flanes)
+_ES_PLURAL_STEMS = ("l", "n", "r", "d", "j", "y")
+
+def fold_accents(text: str) -> str:
+    """Remove diacritics, keeping the base letters (ñ is folded to n)."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def singularize(word: str) -> str:
+    """Best-effort Spanish singular for an accent-folded, lowercase word.
+
+    The result is meant to be used as a lookup key, so it only needs to map
+    singular and plural forms of a word to the same string.
+    """
+    if len(word) <= 3 or not word.endswith("s"):
+        return word
+    if word.endswith("ces"):
+        return word[:-3] + "z"
+    if word.endswith("es") and word[-3] in _ES_PLURAL_STEMS:
+        return word[:-2]
+    if word.endswith("ss"):
+        return word
+    return word[:-1]
+
+def normalize_key(text: str) -> str:
+    """Normalize free text into a cache key.
+
+    Folds case and accents, collapses whitespace and singularizes each word,
+    so "Empanadas  Salteñas" and "empanada salteña" share a key.
+    """
+    folded = fold_accents(text).lower()
+    words = _WHITESPACE_RE.split(folded.strip())
+    return " ".join(singularize(word) for word in words if word)
+
+# Typos are only merged for keys at least this long, so short names stay apart
+FUZZY_MIN_LENGTH = 5
+
+def is_typo(a: str, b: str) -> bool:
+    """Whether `a` and `b` only differ by two swapped adjacent letters or a doubled letter.
+
+    Other single edits often turn one product into another ("cerveza" and
+    "cereza", "pimienta" and "pimiento"), so they are not typos here.
+    """
+    if a == b:
+        return True
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        # The extra letter repeats the one before it ("mayonessa" / "mayonesa")
+        return i > 0 and b[i] == b[i - 1] and a[i:] == b[i + 1:]
+    # Adjacent letters swapped ("lehce" / "leche")
+    return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+
+def _deletions(key: str) -> List[str]:
+    return [key[:i] + key[i + 1:] for i in range(len(key))]
+
+def deduplicate(texts: Iterable[str], fuzzy: bool = False) -> Dict[str, List[str]]:
+    """Group texts naming the same product, in order of first appearance.
+
+    Texts with the same normalized key are the same product ("Leche",
+    "leche " and "leches"). With `fuzzy`, typos (see `is_typo`) are too
+    ("lehce"), unless they are short or contain digits ("harina 000" and
+    "harina 0000" are different products). Returns each group's first
+    spelling, with whitespace collapsed, mapped to the distinct original
+    spellings in the group; blank texts are dropped.
+    """
+    groups: Dict[str, List[str]] = {}
+    by_key: Dict[str, str] = {}  # Normalized key -> group
+    by_deletion: Dict[str, List[str]] = {}  # Key with one letter deleted -> keys
+    for text in texts:
+        key = normalize_key(text)
+        if not key:
+            continue
+        group = by_key.get(key)
+        if group is None and fuzzy and len(key) >= FUZZY_MIN_LENGTH and not any(ch.isdigit() for ch in key):
+            # Typos share a deletion or one is a deletion of the other
+            variants = _deletions(key)
+            for variant in [key] + variants:
+                for known in by_deletion.get(variant, ()):
+                    if is_typo(key, known):
+                        group = by_key[known]
+                        break
+                if group is not None:
+                    break
+            if group is None:
+                for variant in [key] + variants:
+                    by_deletion.setdefault(variant, []).append(key)
+        if group is None:
+            group = " ".join(text.split())
+            groups[group] = []
+        by_key.setdefault(key, group)
+        if text not in groups[group]:
+            groups[group].append(text)
+    return groups
+
+def restore_spellings(categories: Dict[str, List[str]], groups: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Replace each group's spelling in `categories` with its original spellings.
+
+    Products are matched by normalized key, so the answer still uses the
+    caller's spelling when the model changes the case or accents. Products
+    that match no group are kept as they are.
+    """
+    originals = {normalize_key(group): spellings for group, spellings in groups.items()}
+    restored: Dict[str, List[str]] = {}
+    placed = set()
+    for category, products in categories.items():
+        items = []
+        for product in products:
+            key = normalize_key(product)
+            if key in placed:
+                continue
+            placed.add(key)
+            items.extend(originals.get(key, [product]))
+        if items or not products:
+            restored[category] = items
+    return restored
@@ -0,0 +1,177 @@
+"""Speculative background work started before a client asks for it.
+
+Clients report list changes, and the recommendations for the new recent
+products are computed in the background so the following request is a
+cache hit. At most `max_concurrency` prefetches call the upstream at once
+and at most `max_pending` are scheduled; past that new ones are dropped,
+since a prefetch is only a guess. Each identified list has at most one
+prefetch: when it changes again before the previous one finished, the
+previous one is cancelled unless a request is already waiting for it.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from singleflight import SingleFlight
+
+class _Prefetch:
+    __slots__ = ("key", "task", "call", "owns_call", "claimed")
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.task: Optional[asyncio.Task] = None
+        self.call: Optional[asyncio.Task] = None  # The upstream call, once started
+        self.owns_call = False
+        self.claimed = False
+
+class Prefetcher:
+    """Bounded background prefetches, one per owner, tracking which ones get used.
+
+    The calls are started through `flights`, so a request for a key that is
+    being prefetched waits for the prefetch instead of making its own call.
+    Meant to be used from a single event loop.
+    """
+
+    def __init__(self, flights: SingleFlight, max_concurrency: int, max_pending: int, max_ready: int = 4096):
+        self.flights = flights
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_ready = max_ready
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._by_owner: Dict[Hashable, _Prefetch] = {}
+        self._by_key: Dict[Hashable, _Prefetch] = {}
+        # Keys prefetched successfully and not requested yet, oldest first
+        self._ready: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._reset_counters()
+
+    @classmethod
+    def from_env(cls, flights: SingleFlight) -> "Prefetcher":
+        return cls(
+            flights,
+            max_concurrency=int(os.getenv("PREFETCH_MAX_CONCURRENCY", "4")),
+            max_pending=int(os.getenv("PREFETCH_MAX_PENDING", "256")),
+        )
+
+    def _reset_counters(self) -> None:
+        self.outcomes = {"scheduled": 0, "in_flight": 0, "rejected": 0, "cached": 0}
+        self.cancelled = 0
+        self.completed = 0
+        self.failed = 0
+        self.used = {"ready": 0, "in_flight": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    def schedule(self, owner: Hashable, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> str:
+        """Prefetch `key` for `owner` with `fn`, replacing the owner's previous prefetch.
+
+        Prefetches without an owner (None) are never replaced, only dropped
+        when too many are pending.
+        Returns "scheduled", "in_flight" when `key` is already being
+        prefetched, or "rejected" when too many prefetches are pending.
+        """
+        previous = self._by_owner.get(owner) if owner is not None else None
+        if previous is not None and previous.key != key:
+            del self._by_owner[owner]
+            # Stale, unless another list is waiting for the same products
+            if previous not in self._by_owner.values():
+                self._cancel(previous)
+        existing = self._by_key.get(key)
+        if existing is not None:
+            if owner is not None:
+                self._by_owner[owner] = existing
+            outcome = "in_flight"
+        elif len(self._by_key) >= self.max_pending:
+            outcome = "rejected"
+        else:
+            entry = _Prefetch(key)
+            entry.task = asyncio.ensure_future(self._run(entry, fn))
+            self._by_key[key] = entry
+            if owner is not None:
+                self._by_owner[owner] = entry
+            outcome = "scheduled"
+        self.outcomes[outcome] += 1
+        return outcome
+
+    def skip(self) -> None:
+        """Record a prefetch that wasn't needed because the answer is already cached."""
+        self.outcomes["cached"] += 1
+
+    async def _run(self, entry: _Prefetch, fn: Callable[[], Awaitable[Any]]) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            async with self._semaphore:
+                entry.owns_call = self.flights.running(entry.key) is None
+                entry.call = self.flights.start(entry.key, fn)
+                await asyncio.shield(entry.call)
+        except Exception:
+            self.failed += 1
+        else:
+            self.completed += 1
+            # Only count it as used later if the prefetch made the call and
+            # no request was already waiting for it
+            if entry.owns_call and not entry.claimed:
+                self._ready[entry.key] = None
+                if len(self._ready) > self.max_ready:
+                    self._ready.popitem(last=False)
+        finally:
+            self._forget(entry)
+
+    def _forget(self, entry: _Prefetch) -> None:
+        if self._by_key.get(entry.key) is entry:
+            del self._by_key[entry.key]
+        for owner in [owner for owner, owned in self._by_owner.items() if owned is entry]:
+            del self._by_owner[owner]
+
+    def _cancel(self, entry: _Prefetch) -> None:
+        # Once a request waits for it, it's no longer stale
+        if entry.claimed or entry.task.done():
+            return
+        entry.task.cancel()
+        if entry.call is not None and entry.owns_call:
+            entry.call.cancel()
+        self.cancelled += 1
+        self._forget(entry)
+
+    def claim(self, key: Hashable) -> Optional[str]:
+        """Record that a request needs `key`.
+
+        Returns "ready" if a finished prefetch cached it, "in_flight" if a
+        running prefetch will answer it (it is then never cancelled), or
+        None when it wasn't prefetched.
+        """
+        if key in self._ready:
+            del self._ready[key]
+            self.used["ready"] += 1
+            return "ready"
+        entry = self._by_key.get(key)
+        if entry is not None and entry.call is not None:
+            entry.claimed = True
+            self.used["in_flight"] += 1
+            return "in_flight"
+        return None
+
+    def reset(self) -> None:
+        """Cancel pending prefetches and reset the counters."""
+        for entry in list(self._by_key.values()):
+            if not entry.task.done() and not entry.task.get_loop().is_closed():
+                entry.task.cancel()
+        self._by_owner.clear()
+        self._by_key.clear()
+        self._ready.clear()
+        self._semaphore = None
+        self._reset_counters()
+
+    def stats(self) -> dict:
+        return {
+            **self.outcomes,
+            "cancelled": self.cancelled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "pending": len(self._by_key),
+            "used_ready": self.used["ready"],
+            "used_in_flight": self.used["in_flight"],
+        }
@@ -0,0 +1,110 @@
+import json
+import re
+import textwrap
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from metrics import PROMPT_TOKENS
+from normalization import normalize_key
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]|\n\s*", re.UNICODE)
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a prompt.
+
+    Counts words, punctuation marks and line breaks with their indentation,
+    which tracks LLaMa tokenizer counts closely enough to compare prompt
+    sizes without shipping a tokenizer.
+    """
+    return len(_TOKEN_RE.findall(text))
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {normalize_key(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def rank_examples(examples: List[str], targets: List[str]) -> List[str]:
+    """Order examples by how similar they are to the target products.
+
+    Similarity is the share of an example's character trigrams that appear
+    in any target, so "leche descremada" ranks high when "leche" is being
+    categorized. Ties keep their original order.
+    """
+    target_trigrams: Set[str] = set()
+    for target in targets:
+        target_trigrams |= _trigrams(target)
+
+    def score(example: str) -> float:
+        trigrams = _trigrams(example)
+        return len(trigrams & target_trigrams) / len(trigrams) if trigrams else 0.0
+
+    return sorted(examples, key=score, reverse=True)
+
+def compact_categorized_products(
+    categorized_products: Dict[str, List[str]],
+    uncategorized_products: List[str],
+    max_examples_per_category: int,
+) -> Dict[str, List[str]]:
+    """Keep only the most relevant examples of each category.
+
+    Empty categories and duplicate examples are dropped, and each category
+    keeps at most `max_examples_per_category` examples ranked by relevance
+    to the products being categorized.
+    """
+    compacted: Dict[str, List[str]] = {}
+    for category, products in categorized_products.items():
+        examples = list(dict.fromkeys(products))
+        if not examples:
+            continue
+        compacted[category] = rank_examples(examples, uncategorized_products)[:max_examples_per_category]
+    return compacted
+
+def compact_categorization_context(
+    categorized_products: Dict[str, List[str]],
+    uncategorized_products: List[str],
+    max_examples_per_category: int,
+) -> Tuple[str, int, int]:
+    """Serialize the categorized products for the categorization prompt.
+
+    Returns the compact JSON context along with the estimated token count of
+    the previous indented, uncapped context and of the compact one.
+    """
+    tokens_before = estimate_tokens(json.dumps(categorized_products, indent=2))
+    compacted = compact_categorized_products(categorized_products, uncategorized_products, max_examples_per_category)
+    context = json.dumps(compacted, ensure_ascii=False, separators=(",", ":"))
+    return context, tokens_before, estimate_tokens(context)
+
+class Prompt(NamedTuple):
+    """A rendered prompt: the template's static system prefix and the request's user part."""
+
+    system: str
+    user: str
+
+    @property
+    def text(self) -> str:
+        return f"{self.system}\n\n{self.user}"
+
+    def messages(self) -> List[dict]:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user},
+        ]
+
+class PromptTemplate:
+    """Prompt split into a static system prefix and a small dynamic user part.
+
+    The system prefix (instructions, examples, category lists) is built once
+    and sent unchanged with every request, so upstream prompt caching can
+    reuse it; only the user part is formatted per request. The estimated
+    tokens of both parts are recorded per endpoint in `llm_prompt_tokens`.
+    """
+
+    def __init__(self, endpoint: str, system: str, user: str):
+        self.endpoint = endpoint
+        self.system = textwrap.dedent(system).strip()
+        self.user = textwrap.dedent(user).strip()
+        self.static_tokens = estimate_tokens(self.system)
+
+    def render(self, **values) -> Prompt:
+        user = self.user.format(**values)
+        PROMPT_TOKENS.observe(self.static_tokens, endpoint=self.endpoint, part="static")
+        PROMPT_TOKENS.observe(estimate_tokens(user), endpoint=self.endpoint, part="dynamic")
+        return Prompt(self.system, user)
@@ -0,0 +1,372 @@
+"""Retries, hedging and circuit breaking for upstream model calls.
+
+`ResiliencePolicy.call` wraps one logical upstream call:
+
+- Failed attempts are retried with exponential backoff and jitter, as long as
+  the retry budget allows it. The budget grows with the number of calls, so
+  retries can never multiply the load on a struggling upstream.
+- When hedging is enabled, a second attempt is started if the first one is
+  slower than the recent p95 latency; the first answer wins and the other
+  attempt is cancelled. Hedges are paid from the same retry budget.
+- A circuit breaker opens after consecutive failures and rejects calls with
+  `CircuitOpenError` until a probe call succeeds, so callers can fail fast or
+  fall back to local answers while the upstream is down.
+"""
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+# HTTP status codes worth retrying: timeouts, conflicts, rate limits
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Upstream circuit breaker is open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether a failed upstream call is worth retrying.
+
+    Client errors (4xx other than timeouts, conflicts and rate limits) will
+    fail the same way again. Everything else, including server errors,
+    connection errors, timeouts and responses that failed validation, may not.
+    """
+    if isinstance(exc, CircuitOpenError):
+        return False
+    status_code = getattr(exc, "status_code", None)
+    if isinstance(status_code, int) and 400 <= status_code < 500:
+        return status_code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, Exception)
+
+class RetryBudget:
+    """Token bucket bounding retries (and hedges) to a share of the calls.
+
+    Every call deposits `ratio` tokens and every retry spends one, so with the
+    default ratio at most one call in five is retried. `min_per_second` tokens
+    are added over time so a low-traffic worker can still retry.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tokens = self.max_tokens
+            self._updated = self._clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self) -> None:
+        """Record a call."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take a token for a retry, or return False when the budget is exhausted."""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile of the window (q in 0..100), None when empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(math.ceil(q / 100 * len(samples)), 1)
+        return samples[rank - 1]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker.
+
+    Opens after `failure_threshold` consecutive failures. After
+    `reset_timeout` seconds one probe call is let through (half-open); it
+    closes the breaker on success and reopens it on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = 0.0
+            self._probe_in_flight = False
+            self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the upstream now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe call through."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(self.reset_timeout - (self._clock() - self._opened_at), 0.0)
+
+    def release_probe(self) -> None:
+        """Give up a probe slot without an outcome, e.g. when the call was cancelled."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+class ResiliencePolicy:
+    """Retry budget, hedging and circuit breaker around async upstream calls."""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_min_delay: float = 0.05,
+        hedge_min_samples: int = 20,
+        budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        latency: Optional[LatencyTracker] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+        self._reset_counters()
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        return cls(
+            max_attempts=int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.1")),
+            max_delay=float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "2")),
+            hedge=os.getenv("UPSTREAM_HEDGE", "").lower() in ("1", "true", "yes"),
+            hedge_percentile=float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "95")),
+            hedge_min_delay=float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.05")),
+            budget=RetryBudget(
+                ratio=float(os.getenv("UPSTREAM_RETRY_BUDGET_RATIO", "0.2")),
+                min_per_second=float(os.getenv("UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND", "1")),
+            ),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("UPSTREAM_BREAKER_FAILURE_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "30")),
+            ),
+        )
+
+    def _reset_counters(self) -> None:
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+
+    def reset(self) -> None:
+        """Close the breaker, refill the budget and reset the counters."""
+        self.budget.reset()
+        self.breaker.reset()
+        self.latency.clear()
+        self._reset_counters()
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (1-based): full jitter exponential backoff."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait before hedging, or None when hedging is off or there is no latency data yet."""
+        if not self.hedge or len(self.latency) < self.hedge_min_samples:
+            return None
+        return max(self.latency.percentile(self.hedge_percentile), self.hedge_min_delay)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]],
+                   retryable: Callable[[BaseException], bool] = is_retryable,
+                   upstream_failure: Callable[[BaseException], bool] = is_retryable) -> Any:
+        """Run `fn` with retries, hedging and the circuit breaker.
+
+        `retryable` decides which failures are retried and `upstream_failure`
+        which ones count toward opening the breaker; both default to
+        `is_retryable`. Failures that aren't upstream failures, like answers
+        that failed validation, mean the upstream is up.
+        """
+        self.calls += 1
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(self.breaker.retry_after())
+        self.budget.deposit()
+        attempt = 1
+        while True:
+            try:
+                return await self._attempt(fn, upstream_failure)
+            except Exception as exc:
+                if not retryable(exc) or attempt >= self.max_attempts:
+                    self.failures += 1
+                    raise
+                if not self.budget.try_spend():
+                    self.failures += 1
+                    self.budget_exhausted += 1
+                    raise
+                if not self.breaker.allow():
+                    self.failures += 1
+                    raise CircuitOpenError(self.breaker.retry_after()) from exc
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt))
+                attempt += 1
+
+    async def _timed(self, fn: Callable[[], Awaitable[Any]],
+                     upstream_failure: Callable[[BaseException], bool] = is_retryable) -> Any:
+        """Run a single attempt, feeding the latency window and the breaker."""
+        start = time.perf_counter()
+        try:
+            result = await fn()
+        except Exception as exc:
+            # Client errors and invalid answers still mean the upstream is up
+            if upstream_failure(exc):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        self.latency.record(time.perf_counter() - start)
+        self.breaker.record_success()
+        return result
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]],
+                       upstream_failure: Callable[[BaseException], bool] = is_retryable) -> Any:
+        """Run an attempt, hedged with a second one if it is slower than usual."""
+        primary = asyncio.ensure_future(self._timed(fn, upstream_failure))
+        delay = self.hedge_delay()
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.budget.try_spend():
+            return await primary
+
+        self.hedges += 1
+        hedge = asyncio.ensure_future(self._timed(fn, upstream_failure))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        """Return the call counters and the breaker state."""
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "retry_budget_exhausted": self.budget_exhausted,
+            "retry_budget_tokens": self.budget.tokens,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "rejected": self.rejected,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "latency_p95": self.latency.percentile(95),
+        }
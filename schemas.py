@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional, Union
 
 class RecommendationRequest(BaseModel):
@@ -7,9 +7,34 @@ class RecommendationRequest(BaseModel):
 class RecommendationResponse(BaseModel):
     recommended_items: List[str]
 
+class RecommendationPrefetchRequest(BaseModel):
+    products: List[str]  # The list after the change
+    # Opaque, globally unique id of the list (e.g. a UUID), so a newer change
+    # cancels the stale prefetch; without it nothing is cancelled
+    list_id: Optional[str] = Field(default=None, min_length=16, max_length=128)
+
+class RecommendationPrefetchResponse(BaseModel):
+    status: str  # scheduled, in_flight, cached, rejected or disabled
+
 class DishIngredientsResponse(BaseModel):
     ingredients: List[str]
 
+class DishIngredientsBatchRequest(BaseModel):
+    dish_names: List[str]
+    include_shopping_list: bool = False  # Also return the ingredients of every dish merged and deduplicated
+
+class DishIngredientsBatchResponse(BaseModel):
+    dishes: Dict[str, DishIngredientsResponse]  # Keyed by the dish names as requested
+    shopping_list: Optional[List[str]] = None
+
+# Structured answer for a prompt listing several dishes
+class DishIngredients(BaseModel):
+    dish_name: str
+    ingredients: List[str]
+
+class MultiDishIngredientsResponse(BaseModel):
+    dishes: List[DishIngredients]
+
 class CategorizationRequest(BaseModel):
     categorized_products: Dict[str, List[str]]  # Category name to list of products
     uncategorized_products: List[str]  # Products that need to be categorized
@@ -17,3 +42,33 @@ class CategorizationRequest(BaseModel):
 # For categorization, we can return any dict mapping category names to lists of strings.
 class CategorizationResponse(BaseModel):
     categories: Dict[str, List[str]]
+
+class CategorizationChunk(BaseModel):
+    index: int  # Position of the chunk in the request
+    size: int  # Number of products in the chunk
+    duration_ms: float  # Time spent categorizing the chunk
+
+class BulkCategorizationResponse(BaseModel):
+    categories: Dict[str, List[str]]
+    chunks: List[CategorizationChunk]
+
+# Fixed supermarket categories products are sorted into
+PRODUCT_CATEGORIES = [
+    "Panaderia",
+    "Lacteos",
+    "Carniceria",
+    "Fiambres y embutidos",
+    "Frutas y verduras",
+    "Almacen",
+    "Bebidas",
+    "Congelados",
+    "Rotiseria",
+    "Limpieza",
+    "Perfumeria e higiene personal",
+    "Mascotas",
+    "Bazar y hogar",
+    "Ferreteria",
+    "Papeleria y libreria",
+    "Textil y vestimenta",
+    "Otros",
+]
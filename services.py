@@ -1,161 +1,1079 @@
-import os
 import json
-from groq import Groq
-import instructor
-from typing import List, Dict
+import os
+import sys
+import time
+import asyncio
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+
+from pydantic import ValidationError
 
 # Import Pydantic models
-from schemas import RecommendationResponse, DishIngredientsResponse, CategorizationResponse
+from schemas import (
+    RecommendationResponse,
+    DishIngredientsResponse,
+    MultiDishIngredientsResponse,
+    CategorizationResponse,
+    PRODUCT_CATEGORIES,
+)
+from cache import SQLiteCache, TTLCache
+from catalog import open_snapshot
+from category_index import CategoryIndex, category_map, merge_categories, select_products
+from local_recommender import LocalRecommender
+from normalization import deduplicate, normalize_key, restore_spellings
+from prompts import Prompt, PromptTemplate, compact_categorization_context
+from singleflight import SingleFlight
+from prefetch import Prefetcher
+from resilience import CircuitOpenError, ResiliencePolicy, is_retryable
+from model_router import ModelRouter
+from metrics import CollectedMetric, LLM_VALIDATION_ERRORS, STREAM_FIRST_ITEM_DURATION, observe_llm_call, registry
+from tracing import span
+from structured_logging import get_logger, log_prompt
+from llm_backends import build_clients, default_backend_name
+
+logger = get_logger("services")
 
 # Groq API configuration
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-# Only initialize the Groq client if API key is available
-# This helps with testing environments
-if GROQ_API_KEY and GROQ_API_KEY != "test_api_key":
-    # Initialize the Groq client
-    client = Groq(api_key=GROQ_API_KEY)
-    # Enable instructor patches for Groq client
-    client = instructor.from_groq(client)
-else:
-    # For testing environments, create a placeholder
-    client = None
+GROQ_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+# Backend behind the service functions: groq, openai (any OpenAI-compatible
+# server) or mock. Resolved at import, the clients themselves are lazy.
+LLM_BACKEND = default_backend_name()
+# Upper bound for a whole upstream call, including instructor's validation
+# retries. Connection pool and per-phase timeouts live in upstream_transport.
+UPSTREAM_TOTAL_TIMEOUT = float(os.getenv("UPSTREAM_TOTAL_TIMEOUT", "90"))
+# Cheap requests (by default, categorizing a few products) try a small model
+# first and only escalate to GROQ_MODEL when its answer isn't good enough
+model_router = ModelRouter.from_env(large_model=GROQ_MODEL)
 
-def get_recommendations(products: List[str]) -> List[str]:
-    """Get shopping recommendations based on a list of products."""
-    prompt = f"""
+# Set while a traced upstream call is running; instructor's completion:response
+# hook stores when the raw answer arrived, which splits the call into the
+# request itself and response validation
+_traced_call: ContextVar[Optional[dict]] = ContextVar("traced_call", default=None)
+
+def _mark_response_received(*args, **kwargs) -> None:
+    traced = _traced_call.get()
+    if traced is not None:
+        traced["response_at"] = datetime.now(timezone.utc)
+
+def _build_clients() -> None:
+    """Create the LLM clients on first use.
+
+    groq and instructor (which pulls in openai) take most of the import
+    time, so they are only imported once a client is actually needed. This
+    keeps cold starts fast; `warm_up` builds them ahead of time instead.
+
+    The sync client backs the plain functions (scripts, Lambda); the async
+    client backs the FastAPI endpoints so a slow completion doesn't block
+    the event loop. The backend is picked by LLM_BACKEND (see llm_backends);
+    without an upstream both are None and mock data is returned.
+    """
+    clients = build_clients(LLM_BACKEND)
+    for built in clients:
+        if built is not None:
+            # Count response model validation failures, which instructor retries
+            built.on("parse:error", lambda *args, **kwargs: LLM_VALIDATION_ERRORS.inc())
+            built.on("completion:response", _mark_response_received)
+    globals()["client"], globals()["async_client"] = clients
+
+def _forget_clients() -> None:
+    # A worker forked from a preloaded app must not reuse the parent's
+    # pooled connections; its clients are rebuilt on first use
+    globals().pop("client", None)
+    globals().pop("async_client", None)
+
+os.register_at_fork(after_in_child=_forget_clients)
+
+def __getattr__(name: str):
+    # `client` and `async_client` are built lazily on first access
+    if name in ("client", "async_client"):
+        _build_clients()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_client():
+    """Return the sync instructor client, or None for the mock backend."""
+    if "client" not in globals():
+        _build_clients()
+    return globals()["client"]
+
+def get_async_client():
+    """Return the async instructor client, or None for the mock backend."""
+    if "async_client" not in globals():
+        _build_clients()
+    return globals()["async_client"]
+
+def warm_up() -> None:
+    """Build the clients ahead of the first request.
+
+    Meant for the AWS Lambda init phase, which runs before the first
+    invocation is billed against request latency.
+    """
+    get_client()
+    get_async_client()
+
+# With several workers on one host, SHARED_CACHE_PATH moves the response
+# caches into a SQLite file every worker reads and writes, instead of one
+# in-memory cache per process
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH")
+# Lookups run on the event loop, so they give up (as a miss) instead of
+# waiting longer than this for another worker's write
+SHARED_CACHE_BUSY_TIMEOUT = float(os.getenv("SHARED_CACHE_BUSY_TIMEOUT", "0.05"))
+
+def _response_cache(namespace: str, ttl_seconds: float, max_entries: int, max_bytes: int):
+    if SHARED_CACHE_PATH:
+        return SQLiteCache(SHARED_CACHE_PATH, namespace, ttl_seconds, max_entries, max_bytes,
+                           busy_timeout=SHARED_CACHE_BUSY_TIMEOUT)
+    return TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries, max_bytes=max_bytes)
+
+# Dish ingredients rarely change, so completions are cached per normalized
+# dish name. The cache lives at module level, so it is shared by every
+# request on a worker and survives warm Lambda invocations.
+dish_ingredients_cache = _response_cache(
+    "dish_ingredients",
+    ttl_seconds=float(os.getenv("DISH_CACHE_TTL_SECONDS", "86400")),
+    max_entries=int(os.getenv("DISH_CACHE_MAX_ENTRIES", "2048")),
+    max_bytes=int(os.getenv("DISH_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+)
+
+# Batch dish ingredients ask for up to DISH_BATCH_MAX_PER_PROMPT uncached
+# dishes in one prompt, running at most DISH_BATCH_MAX_CONCURRENCY prompts at once
+DISH_BATCH_MAX_PER_PROMPT = int(os.getenv("DISH_BATCH_MAX_PER_PROMPT", "8"))
+DISH_BATCH_MAX_CONCURRENCY = int(os.getenv("DISH_BATCH_MAX_CONCURRENCY", "4"))
+
+# The recommendations prompt is driven by the 3 most recent products, so
+# answers are cached per (normalized, unordered) recent set and filtered
+# against the rest of each caller's list. A hit with fewer than
+# RECOMMENDATIONS_CACHE_MIN_ITEMS items left after filtering is a miss.
+RECOMMENDATIONS_RECENT_WINDOW = 3
+recommendations_cache = _response_cache(
+    "recommendations",
+    ttl_seconds=float(os.getenv("RECOMMENDATIONS_CACHE_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("RECOMMENDATIONS_CACHE_MAX_ENTRIES", "4096")),
+    max_bytes=int(os.getenv("RECOMMENDATIONS_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+)
+RECOMMENDATIONS_CACHE_MIN_ITEMS = int(os.getenv("RECOMMENDATIONS_CACHE_MIN_ITEMS", "3"))
+
+# Products whose category is already known are resolved locally, so only
+# new products are sent to the model. Set CATEGORY_INDEX_PATH to persist
+# the index across restarts.
+category_index = CategoryIndex(path=os.getenv("CATEGORY_INDEX_PATH"))
+
+# Co-occurrence recommender seeded with the recommendations prompt's examples
+# and learning from the model's answers. It answers when there is no
+# upstream, and with LOCAL_RECOMMENDER_FIRST_TIER it answers before calling
+# the model when every recent product is known and at least
+# RECOMMENDATIONS_CACHE_MIN_ITEMS items score LOCAL_RECOMMENDER_MIN_SCORE.
+# Set LOCAL_RECOMMENDER_PATH to persist what it learns.
+local_recommender = LocalRecommender(path=os.getenv("LOCAL_RECOMMENDER_PATH"))
+LOCAL_RECOMMENDER_FIRST_TIER = os.getenv("LOCAL_RECOMMENDER_FIRST_TIER", "0").lower() in ("1", "true", "yes")
+LOCAL_RECOMMENDER_MIN_SCORE = float(os.getenv("LOCAL_RECOMMENDER_MIN_SCORE", "2"))
+LOCAL_RECOMMENDER_MAX_ITEMS = int(os.getenv("LOCAL_RECOMMENDER_MAX_ITEMS", "5"))
+
+# Precomputed answers for popular dishes and products, built offline by
+# build_catalog.py and memory-mapped read-only, so every worker shares the
+# same pages. Checked after the caches and before calling the model.
+try:
+    catalog = open_snapshot(os.getenv("CATALOG_PATH"))
+except (OSError, ValueError) as e:
+    logger.error('Failed to open the catalog snapshot: {error}', error=str(e))
+    catalog = None
+if catalog is not None:
+    logger.info(
+        'Loaded catalog {version} with {dishes} dishes and {products} products',
+        version=catalog.version,
+        dishes=catalog.metadata.get("dishes", 0),
+        products=catalog.metadata.get("products", 0)
+    )
+
+# Products are deduplicated before building prompts: spellings of the same
+# product ("Leche", "leche ", "leches") and, with INPUT_FUZZY_DEDUPE, swapped
+# or doubled letters ("lehce", "mayonessa") are sent once. Categorization answers list
+# every original spelling.
+INPUT_FUZZY_DEDUPE = os.getenv("INPUT_FUZZY_DEDUPE", "0").lower() in ("1", "true", "yes")
+dedupe_stats = {"products": 0, "removed": 0}
+
+# Bulk categorization splits large lists into chunks that are categorized
+# concurrently, keeping each prompt small
+CATEGORIZATION_CHUNK_SIZE = int(os.getenv("CATEGORIZATION_CHUNK_SIZE", "25"))
+CATEGORIZATION_CHUNK_MAX_CHARS = int(os.getenv("CATEGORIZATION_CHUNK_MAX_CHARS", "1000"))
+CATEGORIZATION_MAX_CONCURRENCY = int(os.getenv("CATEGORIZATION_MAX_CONCURRENCY", "4"))
+
+# Categorization prompts only include the most relevant examples of each
+# category the client already has
+CATEGORIZATION_MAX_EXAMPLES_PER_CATEGORY = int(os.getenv("CATEGORIZATION_MAX_EXAMPLES_PER_CATEGORY", "5"))
+
+# Running totals of estimated context tokens before and after compaction
+context_token_stats = {"prompts": 0, "tokens_before": 0, "tokens_after": 0}
+
+# Identical requests that arrive while an upstream call for the same
+# normalized input is in flight wait for that call instead of making their own
+single_flight = SingleFlight()
+
+# Recommendations are computed in the background when clients report list
+# changes, so their next request is a cache hit. PREFETCH_MAX_CONCURRENCY
+# bounds the prefetches calling the upstream at once (0 disables them)
+prefetcher = Prefetcher.from_env(single_flight)
+
+# Async upstream calls are retried within a retry budget, optionally hedged,
+# and rejected with CircuitOpenError while the upstream keeps failing
+upstream_policy = ResiliencePolicy.from_env()
+
+# While the breaker is open, categorization answers from the local index
+# (unknown products go to "Otros") and recommendations from the cached
+# answer for the same recent products, even if fewer than
+# RECOMMENDATIONS_CACHE_MIN_ITEMS are left after filtering, or else from the
+# local recommender, instead of failing
+UPSTREAM_FALLBACK = os.getenv("UPSTREAM_FALLBACK", "1").lower() in ("1", "true", "yes")
+fallback_stats = {"categorization": 0, "recommendations": 0}
+
+def reset_caches() -> None:
+    """Clear every service-level cache."""
+    dish_ingredients_cache.clear()
+    recommendations_cache.clear()
+    category_index.clear()
+    local_recommender.clear()
+    single_flight.reset()
+    prefetcher.reset()
+    upstream_policy.reset()
+    model_router.reset()
+    if catalog is not None:
+        catalog.reset_stats()
+    for name in fallback_stats:
+        fallback_stats[name] = 0
+    for name in dedupe_stats:
+        dedupe_stats[name] = 0
+
+# Mock responses returned when no client is configured
+MOCK_RESPONSES = {
+    RecommendationResponse: RecommendationResponse(
+        recommended_items=["salsa de tomate", "queso rallado", "aceite de oliva", "albahaca"]
+    ),
+    DishIngredientsResponse: DishIngredientsResponse(
+        ingredients=["carne picada", "cebolla", "ajo", "tomate", "morrones", "aceite", "sal", "pimienta"]
+    ),
+    # No dish answered, so each one falls back to the single dish mock
+    MultiDishIngredientsResponse: MultiDishIngredientsResponse(dishes=[]),
+    CategorizationResponse: CategorizationResponse(
+        categories={
+            "Lacteos": ["queso", "leche", "yogurt"],
+            "Panaderia": ["pan", "facturas"]
+        }
+    ),
+}
+
+# Few-shot examples of the recommendations prompt: (shopping list, recently
+# added products, recommendations). They also seed the local recommender.
+RECOMMENDATION_EXAMPLES = [
+    (["leche", "pan", "ajo", "cebolla", "fideos"], ["ajo", "cebolla", "fideos"],
+     ["salsa de tomate", "queso rallado", "aceite de oliva", "albahaca", "vino tinto"]),
+    (["manteca", "pan lactal", "azúcar", "café"], ["pan lactal", "azúcar", "café"],
+     ["dulce de leche", "mermelada", "medialunas", "yogur", "frutas para el desayuno"]),
+    (["limón", "carne", "carbón", "sal gruesa"], ["carne", "carbón", "sal gruesa"],
+     ["chimichurri", "chorizo", "morcilla", "ensalada", "pan", "fernet"]),
+    (["arroz", "pollo", "tomate", "cebolla", "lechuga", "zanahoria", "pepino"], ["lechuga", "zanahoria", "pepino"],
+     ["aceite de oliva", "vinagre", "limón", "rúcula", "aderezo para ensalada"]),
+    (["leche", "manteca", "harina", "azúcar", "huevos"], ["harina", "azúcar", "huevos"],
+     ["polvo para hornear", "esencia de vainilla", "chocolate", "dulce de leche", "crema"]),
+]
+
+_RECOMMENDATION_EXAMPLES_PROMPT = "\n\n".join(
+    f"""    #### Example {number}:
+    Current shopping list: {json.dumps(shopping_list, ensure_ascii=False)}
+    Recently added products: {json.dumps(recent, ensure_ascii=False)}
+    Recommendations: {json.dumps(recommended, ensure_ascii=False)}"""
+    for number, (shopping_list, recent, recommended) in enumerate(RECOMMENDATION_EXAMPLES, start=1)
+)
+
+local_recommender.seed((recent, recommended) for _, recent, recommended in RECOMMENDATION_EXAMPLES)
+
+# Prompts are split into a static system prefix, identical for every request
+# so the upstream can cache it, and a short user part with the request's input
+RECOMMENDATIONS_PROMPT = PromptTemplate(
+    "recommendations",
+    system=f"""
     You are an expert assistant who recommends complementary products for shopping lists in Argentina.
     Your task is to suggest products that go well with the most recently added products. Especially for preparing meals.
 
     ### Instructions:
-    1. Analyze each of the last 3 products added: {', '.join(products[:3] if len(products) >= 3 else products)}
+    1. Analyze each of the recently added products given in the context
     2. For each recent product, recommend exactly 4 complementary products typically purchased together in Argentina
-    3. Do not recommend products already in the current list: {', '.join(products)}
+    3. Do not recommend products already in the current shopping list
     4. Consider the complete context of the list to make coherent recommendations
     5. Prioritize products that complement multiple items on the list when possible
 
     ### Examples:
 
-    #### Example 1:
-    Current shopping list: ["leche", "pan", "ajo", "cebolla", "fideos"]
-    Recently added products: ["ajo", "cebolla", "fideos"]
-    Recommendations: ["salsa de tomate", "queso rallado", "aceite de oliva", "albahaca", "vino tinto"]
-
-    #### Example 2:
-    Current shopping list: ["manteca", "pan lactal", "azúcar", "café"]
-    Recently added products: ["pan lactal", "azúcar", "café"]
-    Recommendations: ["dulce de leche", "mermelada", "medialunas", "yogur", "frutas para el desayuno"]
-
-    #### Example 3:
-    Current shopping list: ["limón", "carne", "carbón", "sal gruesa"]
-    Recently added products: ["carne", "carbón", "sal gruesa"]
-    Recommendations: ["chimichurri", "chorizo", "morcilla", "ensalada", "pan", "fernet"]
-
-    #### Example 4:
-    Current shopping list: ["arroz", "pollo", "tomate", "cebolla", "lechuga", "zanahoria", "pepino"]
-    Recently added products: ["lechuga", "zanahoria", "pepino"]
-    Recommendations: ["aceite de oliva", "vinagre", "limón", "rúcula", "aderezo para ensalada"]
-
-    #### Example 5:
-    Current shopping list: ["leche", "manteca", "harina", "azúcar", "huevos"]
-    Recently added products: ["harina", "azúcar", "huevos"]
-    Recommendations: ["polvo para hornear", "esencia de vainilla", "chocolate", "dulce de leche", "crema"]
-    
+{_RECOMMENDATION_EXAMPLES_PROMPT}
+    """,
+    user="""
     ### Context
-    Current shopping list: {', '.join(products)}
-    Recently added products: {', '.join(products[:3] if len(products) >= 3 else products)}
-    """
-    
-    print("Calling Groq API for recommendations with prompt:", prompt)
-    
+    Current shopping list: {products}
+    Recently added products: {recent}
+    """,
+)
+
+DISH_INGREDIENTS_PROMPT = PromptTemplate(
+    "dish_ingredients",
+    system="""
+    List the ingredients needed to make the dish the user names. Answer in spanish. Do not output the name of the dish. The user is from Argentina, so take in consideration that they might not have access to certain products.
+    """,
+    user="Dish: {dish_name}",
+)
+
+MULTI_DISH_INGREDIENTS_PROMPT = PromptTemplate(
+    "dish_ingredients_batch",
+    system="""
+    List the ingredients needed to make each of the dishes the user lists.
+    Return one entry per dish, with the dish name exactly as written by the user and its ingredients. Answer in spanish. The user is from Argentina, so take in consideration that they might not have access to certain products.
+    """,
+    user="""
+    Dishes:
+    {dishes}
+    """,
+)
+
+_CATEGORY_LIST = "\n".join(f"        - {category}" for category in PRODUCT_CATEGORIES)
+
+CATEGORIZATION_PROMPT = PromptTemplate(
+    "categorization",
+    system=f"""
+    You categorize supermarket products. The user sends the products they already categorized and the additional products to categorize into appropriate categories.
+
+    Available categories:
+{_CATEGORY_LIST}
+
+    The categories should be the available categories listed above.
+    If you can't categorize a product, just return it in the "Otros" category.
+    Answer in spanish. The user is from Argentina, so take in consideration that they might not have access to certain products.
+    """,
+    user="""
+    I have the following products already categorized:
+    {context}
+
+    Please categorize these additional products into appropriate categories:
+    {products}
+    """,
+)
+
+def build_recommendations_prompt(products: List[str]) -> Prompt:
+    """Build the recommendations prompt for a shopping list."""
+    return RECOMMENDATIONS_PROMPT.render(
+        products=", ".join(products),
+        recent=", ".join(products[:RECOMMENDATIONS_RECENT_WINDOW]),
+    )
+
+def build_dish_ingredients_prompt(dish_name: str) -> Prompt:
+    """Build the dish ingredients prompt for a dish name."""
+    return DISH_INGREDIENTS_PROMPT.render(dish_name=dish_name)
+
+def build_multi_dish_ingredients_prompt(dish_names: List[str]) -> Prompt:
+    """Build the ingredients prompt for several dishes at once."""
+    return MULTI_DISH_INGREDIENTS_PROMPT.render(dishes="\n".join(f"- {dish_name}" for dish_name in dish_names))
+
+def build_categorization_prompt(categorized_products: Dict[str, List[str]], uncategorized_products: List[str]) -> Prompt:
+    """Build the product categorization prompt with a compacted context."""
+    context, tokens_before, tokens_after = compact_categorization_context(
+        categorized_products, uncategorized_products, CATEGORIZATION_MAX_EXAMPLES_PER_CATEGORY
+    )
+    context_token_stats["prompts"] += 1
+    context_token_stats["tokens_before"] += tokens_before
+    context_token_stats["tokens_after"] += tokens_after
+    logger.debug(
+        'Categorization context compacted from {tokens_before} to {tokens_after} tokens',
+        tokens_before=tokens_before,
+        tokens_after=tokens_after
+    )
+    return CATEGORIZATION_PROMPT.render(context=context, products=", ".join(uncategorized_products))
+
+def _create(response_model, prompt: Prompt):
+    """Run a structured completion on the sync client."""
+    client = get_client()
     # For testing environments, return mock data if no client
     if client is None:
-        print("Using mock data for testing environment")
-        return ["salsa de tomate", "queso rallado", "aceite de oliva", "albahaca"]
-        
+        logger.debug('Using mock data for testing environment')
+        return MOCK_RESPONSES[response_model]
+
     # Use instructor with the Pydantic model to get structured response
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        response_model=RecommendationResponse,
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
+    return client.chat.completions.create(
+        model=GROQ_MODEL,
+        response_model=response_model,
+        messages=prompt.messages()
     )
-    
-    return response.recommended_items
 
-def get_dish_ingredients(dish_name: str) -> List[str]:
-    """Get ingredients needed for a specific dish."""
-    prompt = f"""
-    List the ingredients needed to make {dish_name}. Answer in spanish. Do not output the name of the dish. The user is from Argentina, so take in consideration that they might not have access to certain products.
+def is_validation_error(exc: BaseException) -> bool:
+    """Whether a completion failed because the model's answer didn't validate."""
+    if isinstance(exc, ValidationError):
+        return True
+    # Only raised by instructor, which is already imported if a call failed
+    from instructor.exceptions import InstructorRetryException
+    return isinstance(exc, InstructorRetryException)
+
+def _retryable_unless_invalid(exc: BaseException) -> bool:
+    return is_retryable(exc) and not is_validation_error(exc)
+
+async def _create_async(response_model, prompt: Prompt, model: Optional[str] = None, retry_invalid: bool = True):
+    """Run a structured completion on the async client.
+
+    With `retry_invalid=False` answers that fail validation are not retried,
+    so the caller can escalate to a larger model instead.
     """
-    print("Calling Groq API for dish ingredients with prompt:", prompt)
-    
+    async_client = get_async_client()
     # For testing environments, return mock data if no client
-    if client is None:
-        print("Using mock data for testing environment")
-        return ["carne picada", "cebolla", "ajo", "tomate", "morrones", "aceite", "sal", "pimienta"]
-    
+    if async_client is None:
+        logger.debug('Using mock data for testing environment')
+        return MOCK_RESPONSES[response_model]
+
     # Use instructor with the Pydantic model to get structured response
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        response_model=DishIngredientsResponse,
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
+    async def attempt():
+        return await asyncio.wait_for(
+            async_client.chat.completions.create(
+                model=model or GROQ_MODEL,
+                response_model=response_model,
+                messages=prompt.messages()
+            ),
+            timeout=UPSTREAM_TOTAL_TIMEOUT,
+        )
+
+    # Invalid answers are escalated or retried, but never open the breaker
+    return await upstream_policy.call(
+        attempt, is_retryable if retry_invalid else _retryable_unless_invalid, _retryable_unless_invalid
     )
-    
-    return response.ingredients
 
-def categorize_products(categorized_products: Dict[str, List[str]], uncategorized_products: List[str]) -> Dict[str, List[str]]:
-    """Categorize products into appropriate categories."""
-    prompt = f"""
-    I have the following products already categorized:
-    {json.dumps(categorized_products, indent=2)}
-    
-    Please categorize these additional products into appropriate categories:
-    {', '.join(uncategorized_products)}
-    
-    Available categories:
-        - Panaderia
-        - Lacteos
-        - Carniceria
-        - Fiambres y embutidos
-        - Frutas y verduras
-        - Almacen
-        - Bebidas
-        - Congelados
-        - Rotiseria
-        - Limpieza
-        - Perfumeria e higiene personal
-        - Mascotas
-        - Bazar y hogar
-        - Ferreteria
-        - Papeleria y libreria
-        - Textil y vestimenta
-        - Otros
-    
-    The categories should be the available categories listed above.
-    If you can't categorize a product, just return it in the "Otros" category.
-    Answer in spanish. The user is from Argentina, so take in consideration that they might not have access to certain products.
+async def _create_on_tier(model: str, response_model, prompt: Prompt, last: bool = True):
+    """Run a completion on `model`, recording the call in its tier metrics."""
+    start = time.perf_counter()
+    with span("llm.call", model) as call_span:
+        traced = {} if call_span is not None else None
+        token = _traced_call.set(traced)
+        try:
+            response = await _create_async(response_model, prompt, model, retry_invalid=last)
+        except CircuitOpenError:
+            raise
+        except Exception:
+            elapsed = time.perf_counter() - start
+            model_router.record(model, elapsed, ok=False)
+            observe_llm_call(model, elapsed, ok=False)
+            raise
+        finally:
+            _traced_call.reset(token)
+        if traced and "response_at" in traced:
+            # From the last raw answer to the validated response model
+            call_span.start_child(
+                op="llm.validate", name=response_model.__name__, start_timestamp=traced["response_at"]
+            ).finish()
+    elapsed = time.perf_counter() - start
+    model_router.record(model, elapsed)
+    observe_llm_call(model, elapsed, ok=True, response=response)
+    return response
+
+async def _create_routed(endpoint: str, response_model, prompt: Prompt, input_chars: int, confident):
+    """Run a completion on the cheapest model tier whose answer is `confident`.
+
+    An answer that fails validation or that `confident` rejects is escalated
+    to the next tier; the last tier's answer is returned as is.
     """
-    print("Calling Groq API for product categorization with prompt:", prompt)
-    
-    # For testing environments, return mock data if no client
-    if client is None:
-        print("Using mock data for testing environment")
-        return {
-            "Lacteos": ["queso", "leche", "yogurt"],
-            "Panaderia": ["pan", "facturas"]
-        }
-    
-    # Use instructor with the Pydantic model to get structured response
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        response_model=CategorizationResponse,
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
+    models = model_router.models_for(endpoint, input_chars)
+    for model in models[:-1]:
+        try:
+            response = await _create_on_tier(model, response_model, prompt, last=False)
+        except Exception as e:
+            if not is_validation_error(e):
+                raise
+            model_router.record_escalation(model, "validation")
+            continue
+        if confident(response):
+            return response
+        model_router.record_escalation(model, "low_confidence")
+    return await _create_on_tier(models[-1], response_model, prompt)
+
+async def _categorize_routed(categorized_products: Dict[str, List[str]], products: List[str], endpoint: str) -> Dict[str, List[str]]:
+    """Categorize products, escalating to a larger model only the ones the smaller one couldn't place.
+
+    Products a tier puts in "Otros", or all of them when its answer fails
+    validation, are sent again to the next tier; the last tier's "Otros" is
+    final.
+    """
+    models = model_router.models_for("categorization", sum(len(product) for product in products))
+    answers: List[Dict[str, List[str]]] = []
+    remaining = products
+    for position, model in enumerate(models):
+        last = position == len(models) - 1
+        with span("llm.prompt", endpoint):
+            prompt = build_categorization_prompt(categorized_products, remaining)
+        log_prompt(logger, endpoint, prompt.text)
+        try:
+            response = await _create_on_tier(model, CategorizationResponse, prompt, last)
+        except Exception as e:
+            if last or not is_validation_error(e):
+                raise
+            model_router.record_escalation(model, "validation")
+            continue
+        categories = dict(response.categories)
+        uncertain = categories.pop("Otros", None) if not last else None
+        answers.append(categories)
+        if not uncertain:
+            break
+        model_router.record_escalation(model, "otros")
+        remaining = uncertain
+    return merge_categories(*answers)
+
+def recommendations_cache_key(products: List[str]) -> tuple:
+    """Cache key of a shopping list: its normalized recent products, in any order."""
+    return tuple(sorted({normalize_key(product) for product in products[:RECOMMENDATIONS_RECENT_WINDOW]}))
+
+def filter_recommendations(candidates, products: List[str]) -> List[str]:
+    """Drop candidates already in the shopping list (or repeated), comparing normalized names."""
+    seen = {normalize_key(product) for product in products}
+    recommended = []
+    for item in candidates:
+        key = normalize_key(item)
+        if key not in seen:
+            seen.add(key)
+            recommended.append(item)
+    return recommended
+
+def _cached_recommendations(products: List[str]) -> Tuple[tuple, Optional[List[str]]]:
+    """Return the cache key and the cached recommendations for a list, if enough are left after filtering."""
+    cache_key = recommendations_cache_key(products)
+    cached = recommendations_cache.get(cache_key)
+    if cached is None:
+        return cache_key, None
+    recommended = filter_recommendations(cached, products)
+    if len(recommended) < RECOMMENDATIONS_CACHE_MIN_ITEMS:
+        return cache_key, None
+    return cache_key, recommended
+
+def _deduplicate_products(products: List[str]) -> Dict[str, List[str]]:
+    """Group a request's products by normalized name, counting the duplicates removed."""
+    groups = deduplicate(products, INPUT_FUZZY_DEDUPE)
+    dedupe_stats["products"] += len(products)
+    dedupe_stats["removed"] += len(products) - len(groups)
+    return groups
+
+def _local_recommendations(products: List[str]) -> List[str]:
+    """Recommendations from the local recommender, for when there is no upstream."""
+    return local_recommender.recommend(products, LOCAL_RECOMMENDER_MAX_ITEMS, RECOMMENDATIONS_RECENT_WINDOW)
+
+def _confident_local_recommendations(products: List[str]) -> Optional[List[str]]:
+    """The local recommender's answer, if it knows every recent product and enough items score high."""
+    start = time.perf_counter()
+    ranked, matched = local_recommender.rank(products, RECOMMENDATIONS_RECENT_WINDOW)
+    recommended = [name for name, score in ranked if score >= LOCAL_RECOMMENDER_MIN_SCORE][:LOCAL_RECOMMENDER_MAX_ITEMS]
+    model_router.record("local", time.perf_counter() - start)
+    if matched < min(len(products), RECOMMENDATIONS_RECENT_WINDOW) or len(recommended) < RECOMMENDATIONS_CACHE_MIN_ITEMS:
+        model_router.record_escalation("local", "low_confidence")
+        return None
+    return recommended
+
+def _learn_recommendations(products: List[str], items) -> None:
+    local_recommender.learn(products[:RECOMMENDATIONS_RECENT_WINDOW], items)
+    local_recommender.maybe_save()
+
+def _categorization_flight_key(categorized_products: Dict[str, List[str]], products: List[str]) -> tuple:
+    context = tuple(sorted(
+        (normalize_key(category), tuple(sorted(normalize_key(product) for product in examples)))
+        for category, examples in categorized_products.items()
+    ))
+    return ("categorization", tuple(normalize_key(product) for product in products), context)
+
+async def _fetch_recommendations(products: List[str], cache_key: tuple) -> tuple:
+    """Ask the model for a list's recommendations and cache the answer."""
+    if get_async_client() is None:
+        logger.debug('No client, answering recommendations locally')
+        return tuple(_local_recommendations(products))
+    with span("llm.prompt", "recommendations"):
+        prompt = build_recommendations_prompt(products)
+    log_prompt(logger, "recommendations", prompt.text)
+    response = await _create_routed(
+        "recommendations", RecommendationResponse, prompt, sum(len(product) for product in products),
+        lambda response: len(response.recommended_items) >= 3,
+    )
+    items = tuple(response.recommended_items)
+    recommendations_cache.set(cache_key, items)
+    _learn_recommendations(products, items)
+    return items
+
+async def get_recommendations_async(products: List[str]) -> List[str]:
+    """Get shopping recommendations based on a list of products."""
+    products = list(_deduplicate_products(products))
+    cache_key, cached = _cached_recommendations(products)
+    flight_key = ("recommendations", cache_key)
+    if cached is not None:
+        prefetcher.claim(flight_key)
+        return cached
+    if LOCAL_RECOMMENDER_FIRST_TIER:
+        local = _confident_local_recommendations(products)
+        if local is not None:
+            return local
+
+    # Lists sharing the recent products share the call, and each caller
+    # filters the answer against its own list
+    prefetcher.claim(flight_key)
+    try:
+        items = await single_flight.do(flight_key, lambda: _fetch_recommendations(products, cache_key))
+    except CircuitOpenError:
+        if not UPSTREAM_FALLBACK:
+            raise
+        # A cached answer too short to be used normally is still better than
+        # nothing; otherwise the local recommender answers
+        cached = recommendations_cache.get(cache_key)
+        recommended = filter_recommendations(cached or (), products)
+        source = "cache"
+        if not recommended:
+            recommended, source = _local_recommendations(products), "local recommender"
+        if not recommended:
+            raise
+        fallback_stats["recommendations"] += 1
+        logger.warning('Upstream unavailable, answering recommendations from the {source}', source=source)
+        return recommended
+    return filter_recommendations(items, products)
+
+def prefetch_recommendations(list_id: Optional[str], products: List[str]) -> str:
+    """Start computing a changed list's recommendations in the background.
+
+    `list_id`, globally unique, identifies the list so a newer change cancels
+    the stale prefetch; with None nothing is cancelled. Returns "scheduled",
+    "in_flight" (the same recent products are already being prefetched),
+    "cached", "rejected" (too many pending) or "disabled".
+    """
+    if not prefetcher.enabled:
+        return "disabled"
+    products = list(_deduplicate_products(products))
+    cache_key, cached = _cached_recommendations(products)
+    if cached is not None:
+        prefetcher.skip()
+        return "cached"
+    return prefetcher.schedule(
+        list_id, ("recommendations", cache_key), lambda: _fetch_recommendations(products, cache_key)
+    )
+
+async def stream_recommendations_async(products: List[str]) -> AsyncIterator[str]:
+    """Stream shopping recommendations, yielding each item once it is complete.
+
+    Time to the first item is what a streaming client waits for, so it is
+    recorded by where the answer came from.
+    """
+    start = time.perf_counter()
+    first = True
+    async for source, item in _stream_recommendations(products):
+        if first:
+            STREAM_FIRST_ITEM_DURATION.observe(time.perf_counter() - start, source=source)
+            first = False
+        yield item
+
+async def _stream_recommendations(products: List[str]) -> AsyncIterator[Tuple[str, str]]:
+    """Yield (source, item) pairs, source being "cache", "local" or the model."""
+    products = list(_deduplicate_products(products))
+    cache_key, cached = _cached_recommendations(products)
+    if cached is not None:
+        prefetcher.claim(("recommendations", cache_key))
+        for item in cached:
+            yield "cache", item
+        return
+    local = _confident_local_recommendations(products) if LOCAL_RECOMMENDER_FIRST_TIER else None
+    if local is not None:
+        for item in local:
+            yield "local", item
+        return
+
+    with span("llm.prompt", "recommendations_stream"):
+        prompt = build_recommendations_prompt(products)
+    log_prompt(logger, "recommendations_stream", prompt.text)
+
+    async_client = get_async_client()
+    # For testing environments, stream local recommendations if no client
+    if async_client is None:
+        logger.debug('No client, answering recommendations locally')
+        for item in _local_recommendations(products):
+            yield "local", item
+        return
+
+    # Items already sent can't be taken back, so streams are not retried,
+    # but they still respect and feed the circuit breaker
+    breaker = upstream_policy.breaker
+    if not breaker.allow():
+        raise CircuitOpenError(breaker.retry_after())
+
+    # Partial responses grow as tokens arrive; every item but the last one
+    # in a partial is complete, the last one may still be streaming. Items
+    # already in the list or already sent are skipped, like filter_recommendations
+    items: List[str] = []
+    emitted = 0
+    seen = {normalize_key(product) for product in products}
+    start = time.perf_counter()
+    try:
+        with span("llm.call", GROQ_MODEL):
+            async for partial in async_client.chat.completions.create_partial(
+                model=GROQ_MODEL,
+                response_model=RecommendationResponse,
+                messages=prompt.messages()
+            ):
+                items = [item for item in (partial.recommended_items or []) if item]
+                while emitted < len(items) - 1:
+                    key = normalize_key(items[emitted])
+                    if key not in seen:
+                        seen.add(key)
+                        yield GROQ_MODEL, items[emitted]
+                    emitted += 1
+    except Exception:
+        breaker.record_failure()
+        elapsed = time.perf_counter() - start
+        model_router.record(GROQ_MODEL, elapsed, ok=False)
+        observe_llm_call(GROQ_MODEL, elapsed, ok=False)
+        raise
+    except BaseException:
+        breaker.release_probe()
+        raise
+    breaker.record_success()
+    elapsed = time.perf_counter() - start
+    model_router.record(GROQ_MODEL, elapsed)
+    observe_llm_call(GROQ_MODEL, elapsed, ok=True)
+    while emitted < len(items):
+        key = normalize_key(items[emitted])
+        if key not in seen:
+            seen.add(key)
+            yield GROQ_MODEL, items[emitted]
+        emitted += 1
+    recommendations_cache.set(cache_key, tuple(items))
+    _learn_recommendations(products, items)
+
+def _catalog_dish_ingredients(dish_name: str) -> Optional[List[str]]:
+    return catalog.dish_ingredients(dish_name) if catalog is not None else None
+
+async def get_dish_ingredients_async(dish_name: str) -> List[str]:
+    """Get ingredients needed for a specific dish."""
+    cache_key = normalize_key(dish_name)
+    cached = dish_ingredients_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    precomputed = _catalog_dish_ingredients(dish_name)
+    if precomputed is not None:
+        return precomputed
+
+    async def fetch():
+        with span("llm.prompt", "dish_ingredients"):
+            prompt = build_dish_ingredients_prompt(dish_name)
+        log_prompt(logger, "dish_ingredients", prompt.text)
+        response = await _create_routed(
+            "dish_ingredients", DishIngredientsResponse, prompt, len(dish_name),
+            lambda response: len(response.ingredients) >= 2,
+        )
+        ingredients = tuple(response.ingredients)
+        dish_ingredients_cache.set(cache_key, ingredients)
+        return ingredients
+
+    return list(await single_flight.do(("dish_ingredients", cache_key), fetch))
+
+def merge_shopping_list(*ingredient_lists: List[str]) -> List[str]:
+    """Merge ingredient lists, keeping the first spelling of each normalized ingredient."""
+    seen = set()
+    merged = []
+    for ingredients in ingredient_lists:
+        for ingredient in ingredients:
+            key = normalize_key(ingredient)
+            if key not in seen:
+                seen.add(key)
+                merged.append(ingredient)
+    return merged
+
+async def _fetch_dish_group(dish_names: List[str]) -> Dict[str, List[str]]:
+    """Fetch the ingredients of several uncached dishes with one prompt.
+
+    Dishes missing from the answer (or with no ingredients) are fetched one
+    by one. Returns ingredients by normalized dish name.
+    """
+    results: Dict[str, List[str]] = {}
+    if len(dish_names) > 1:
+        with span("llm.prompt", "dish_ingredients_batch"):
+            prompt = build_multi_dish_ingredients_prompt(dish_names)
+        log_prompt(logger, "dish_ingredients_batch", prompt.text)
+        response = await _create_routed(
+            "dish_ingredients", MultiDishIngredientsResponse, prompt, sum(len(name) for name in dish_names),
+            lambda response: len(response.dishes) >= len(dish_names),
+        )
+        wanted = {normalize_key(name) for name in dish_names}
+        for dish in response.dishes:
+            key = normalize_key(dish.dish_name)
+            if key in wanted and dish.ingredients:
+                results[key] = list(dish.ingredients)
+                dish_ingredients_cache.set(key, tuple(dish.ingredients))
+    missing = [name for name in dish_names if normalize_key(name) not in results]
+    for name, ingredients in zip(missing, await asyncio.gather(*(get_dish_ingredients_async(name) for name in missing))):
+        results[normalize_key(name)] = ingredients
+    return results
+
+async def get_dishes_ingredients_async(dish_names: List[str]) -> Dict[str, List[str]]:
+    """Get the ingredients of several dishes, keyed by dish name as given.
+
+    Cached and catalog dishes are answered right away; the others are grouped into
+    multi-dish prompts of up to DISH_BATCH_MAX_PER_PROMPT dishes, with at most
+    DISH_BATCH_MAX_CONCURRENCY prompts in flight.
+    """
+    found: Dict[str, List[str]] = {}
+    uncached: Dict[str, str] = {}  # Normalized name -> first spelling requested
+    for name in dish_names:
+        key = normalize_key(name)
+        if key in found or key in uncached:
+            continue
+        cached = dish_ingredients_cache.get(key)
+        if cached is None:
+            cached = _catalog_dish_ingredients(name)
+        if cached is not None:
+            found[key] = list(cached)
+        else:
+            uncached[key] = name
+
+    names = list(uncached.values())
+    groups = [names[i:i + DISH_BATCH_MAX_PER_PROMPT] for i in range(0, len(names), DISH_BATCH_MAX_PER_PROMPT)]
+    semaphore = asyncio.Semaphore(DISH_BATCH_MAX_CONCURRENCY)
+
+    async def run_group(group: List[str]) -> Dict[str, List[str]]:
+        async with semaphore:
+            return await _fetch_dish_group(group)
+
+    for results in await asyncio.gather(*(run_group(group) for group in groups)):
+        found.update(results)
+    return {name: found[normalize_key(name)] for name in dish_names}
+
+def _resolve_known_products(categorized_products: Dict[str, List[str]], uncategorized_products: List[str]):
+    """Resolve products the client already categorized or that are already known.
+
+    The client's categories are checked first, then the index learned from
+    model answers and then the catalog. The client's categories are only
+    used for this request, never learned, since the index is shared.
+    """
+    resolved, unknown = category_index.split(uncategorized_products, category_map(categorized_products))
+    if catalog is not None and unknown:
+        precomputed, unknown = catalog.split_products(unknown)
+        resolved = merge_categories(resolved, precomputed)
+    return resolved, unknown
+
+def _learn_categorization(categories: Dict[str, List[str]], resolved: Dict[str, List[str]],
+                          unknown: List[str]) -> Dict[str, List[str]]:
+    """Learn from a model categorization and merge it after the locally resolved products.
+
+    Only the `unknown` products the model was asked about are learned: the
+    answer may repeat the client's categories from the prompt's context,
+    which must not reach the shared index. Locally resolved products come
+    first, so the answer can't move a product the client or index placed.
+    """
+    category_index.learn(select_products(categories, unknown))
+    category_index.maybe_save()
+    return merge_categories(resolved, categories)
+
+def _fallback_categorization(resolved: Dict[str, List[str]], unknown: List[str]) -> Dict[str, List[str]]:
+    """Answer from the local index while the upstream is unavailable."""
+    fallback_stats["categorization"] += 1
+    logger.warning(
+        'Upstream unavailable, categorizing {count} unknown products as Otros',
+        count=len(unknown)
     )
-    
-    return response.categories
\ No newline at end of file
+    return merge_categories(resolved, {"Otros": unknown})
+
+def chunk_products(products: List[str], max_items: int, max_chars: int) -> List[List[str]]:
+    """Split products into chunks bounded by item count and total characters."""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    current_chars = 0
+    for product in products:
+        if current and (len(current) >= max_items or current_chars + len(product) > max_chars):
+            chunks.append(current)
+            current, current_chars = [], 0
+        current.append(product)
+        current_chars += len(product)
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def categorize_products_bulk_async(
+    categorized_products: Dict[str, List[str]],
+    uncategorized_products: List[str],
+    chunk_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+) -> Tuple[Dict[str, List[str]], List[Dict]]:
+    """Categorize a large list of products in concurrent, size-bounded chunks.
+
+    Returns the merged categories and the timing of each chunk.
+    """
+    groups = _deduplicate_products(uncategorized_products)
+    resolved, unknown = _resolve_known_products(categorized_products, list(groups))
+    chunks = chunk_products(unknown, chunk_size or CATEGORIZATION_CHUNK_SIZE, CATEGORIZATION_CHUNK_MAX_CHARS)
+    semaphore = asyncio.Semaphore(max_concurrency or CATEGORIZATION_MAX_CONCURRENCY)
+
+    async def run_chunk(index: int, chunk: List[str]):
+        async with semaphore:
+            start = time.perf_counter()
+            categories = await _categorize_routed(categorized_products, chunk, "categorization_bulk")
+            timing = {"index": index, "size": len(chunk), "duration_ms": (time.perf_counter() - start) * 1000}
+            return categories, timing
+
+    results = await asyncio.gather(*(run_chunk(i, chunk) for i, chunk in enumerate(chunks)), return_exceptions=True)
+    chunk_categories, timings, unavailable = [], [], []
+    for chunk, result in zip(chunks, results):
+        # Chunks rejected by the open breaker fall back to the index
+        if isinstance(result, CircuitOpenError) and UPSTREAM_FALLBACK:
+            unavailable.extend(chunk)
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        categories, timing = result
+        chunk_categories.append(categories)
+        timings.append(timing)
+        # Only the products the chunk asked about, not repeated context
+        category_index.learn(select_products(categories, chunk))
+    category_index.maybe_save()
+    merged = merge_categories(resolved, *chunk_categories)
+    if unavailable:
+        merged = _fallback_categorization(merged, unavailable)
+    return restore_spellings(merged, groups), timings
+
+async def categorize_products_async(categorized_products: Dict[str, List[str]], uncategorized_products: List[str]) -> Dict[str, List[str]]:
+    """Categorize products into appropriate categories."""
+    groups = _deduplicate_products(uncategorized_products)
+    categories = await _categorize_unique_async(categorized_products, list(groups))
+    return restore_spellings(categories, groups)
+
+async def _categorize_unique_async(categorized_products: Dict[str, List[str]], uncategorized_products: List[str]) -> Dict[str, List[str]]:
+    resolved, unknown = _resolve_known_products(categorized_products, uncategorized_products)
+    if not unknown:
+        return resolved
+
+    async def fetch():
+        return await _categorize_routed(categorized_products, unknown, "categorization")
+
+    try:
+        categories = await single_flight.do(_categorization_flight_key(categorized_products, unknown), fetch)
+    except CircuitOpenError:
+        if not UPSTREAM_FALLBACK:
+            raise
+        return _fallback_categorization(resolved, unknown)
+    return _learn_categorization(categories, resolved, unknown)
+
+def collect_metrics() -> List[CollectedMetric]:
+    """Export the service-level stats as Prometheus metrics, read at scrape time."""
+    caches = {
+        "dish_ingredients": dish_ingredients_cache.stats(),
+        "recommendations": recommendations_cache.stats(),
+        "category_index": category_index.stats(),
+    }
+    if catalog is not None:
+        caches["catalog"] = catalog.stats()
+    resilience = upstream_policy.stats()
+    prefetches = prefetcher.stats()
+    tiers = model_router.stats()
+    flights = single_flight.stats()
+    collected = [
+        CollectedMetric("cache_hits_total", "Cache lookups that found an entry.", "counter",
+                        [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        CollectedMetric("cache_misses_total", "Cache lookups that found no entry.", "counter",
+                        [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        CollectedMetric("cache_hit_ratio", "Share of cache lookups that were hits.", "gauge",
+                        [({"cache": name}, stats["hit_ratio"]) for name, stats in caches.items()]),
+        CollectedMetric("cache_entries", "Entries currently cached.", "gauge",
+                        [({"cache": name}, stats["entries"]) for name, stats in caches.items()]),
+        CollectedMetric("llm_calls_in_flight", "Distinct upstream calls in flight (after coalescing).", "gauge",
+                        [({}, flights["in_flight"])]),
+        CollectedMetric("llm_calls_coalesced_total", "Calls that waited for an identical in-flight call.", "counter",
+                        [({}, flights["coalesced"])]),
+        CollectedMetric("recommendations_prefetch_requests_total", "Prefetch requests, by outcome.", "counter",
+                        [({"outcome": outcome}, prefetches[outcome])
+                         for outcome in ("scheduled", "in_flight", "cached", "rejected")]),
+        CollectedMetric("recommendations_prefetch_finished_total", "Prefetches that finished, by result.", "counter",
+                        [({"result": result}, prefetches[result]) for result in ("completed", "failed", "cancelled")]),
+        CollectedMetric("recommendations_prefetch_used_total", "Requests answered by a prefetch, finished or still in flight.", "counter",
+                        [({"state": "ready"}, prefetches["used_ready"]), ({"state": "in_flight"}, prefetches["used_in_flight"])]),
+        CollectedMetric("recommendations_prefetch_pending", "Prefetches scheduled or running.", "gauge",
+                        [({}, prefetches["pending"])]),
+        CollectedMetric("llm_retries_total", "Upstream calls retried.", "counter", [({}, resilience["retries"])]),
+        CollectedMetric("llm_hedges_total", "Hedged upstream requests, by whether the hedge won.", "counter",
+                        [({"won": "true"}, resilience["hedge_wins"]),
+                         ({"won": "false"}, resilience["hedges"] - resilience["hedge_wins"])]),
+        CollectedMetric("llm_rejected_total", "Calls rejected while the circuit breaker was open.", "counter",
+                        [({}, resilience["rejected"])]),
+        CollectedMetric("llm_circuit_breaker_open", "1 while the circuit breaker is open or half-open.", "gauge",
+                        [({}, 0 if resilience["breaker_state"] == "closed" else 1)]),
+        CollectedMetric("llm_tier_escalations_total", "Answers escalated to a larger model, by model and reason.", "counter",
+                        [({"model": model, "reason": reason}, count)
+                         for model, stats in tiers.items() for reason, count in stats["escalations"].items()]),
+        CollectedMetric("input_products_total", "Products received in recommendation and categorization requests.", "counter",
+                        [({}, dedupe_stats["products"])]),
+        CollectedMetric("input_duplicates_removed_total", "Duplicate or blank products removed before building prompts.", "counter",
+                        [({}, dedupe_stats["removed"])]),
+        CollectedMetric("fallback_responses_total", "Answers served locally while the upstream was unavailable.", "counter",
+                        [({"endpoint": name}, count) for name, count in fallback_stats.items()]),
+        CollectedMetric("categorization_context_tokens_total", "Estimated categorization context tokens, before and after compaction.", "counter",
+                        [({"stage": "before"}, context_token_stats["tokens_before"]),
+                         ({"stage": "after"}, context_token_stats["tokens_after"])]),
+    ]
+    # The transport (and httpx) is only loaded once an upstream client exists
+    transport = sys.modules.get("upstream_transport")
+    if transport is not None:
+        pool = transport.pool_metrics.snapshot()
+        collected += [
+            CollectedMetric("upstream_pool_in_flight", "Upstream requests holding a pooled connection.", "gauge",
+                            [({}, pool["in_flight"])]),
+            CollectedMetric("upstream_pool_utilization", "Share of the connection pool in use.", "gauge",
+                            [({}, pool["utilization"])]),
+            CollectedMetric("upstream_pool_connections_opened_total", "New connections opened to the upstream.", "counter",
+                            [({}, pool["connections_opened"])]),
+            CollectedMetric("upstream_pool_wait_seconds_total", "Time spent waiting for a free pooled connection.", "counter",
+                            [({}, pool["pool_wait_seconds_total"])]),
+            CollectedMetric("upstream_pool_wait_seconds_max", "Longest wait for a free pooled connection.", "gauge",
+                            [({}, pool["pool_wait_seconds_max"])]),
+        ]
+    return collected
+
+registry.register_collector(collect_metrics)
+
+# Sync wrappers, kept for callers without an event loop (scripts, Lambda)
+
+def get_recommendations(products: List[str]) -> List[str]:
+    """Get shopping recommendations based on a list of products."""
+    products = list(_deduplicate_products(products))
+    cache_key, cached = _cached_recommendations(products)
+    if cached is not None:
+        prefetcher.claim(("recommendations", cache_key))
+        return cached
+    if LOCAL_RECOMMENDER_FIRST_TIER:
+        local = _confident_local_recommendations(products)
+        if local is not None:
+            return local
+    if get_client() is None:
+        logger.debug('No client, answering recommendations locally')
+        return _local_recommendations(products)
+
+    prompt = build_recommendations_prompt(products)
+    log_prompt(logger, "recommendations", prompt.text)
+    recommended_items = _create(RecommendationResponse, prompt).recommended_items
+    recommendations_cache.set(cache_key, tuple(recommended_items))
+    _learn_recommendations(products, recommended_items)
+    return filter_recommendations(recommended_items, products)
+
+def get_dish_ingredients(dish_name: str) -> List[str]:
+    """Get ingredients needed for a specific dish."""
+    cache_key = normalize_key(dish_name)
+    cached = dish_ingredients_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    precomputed = _catalog_dish_ingredients(dish_name)
+    if precomputed is not None:
+        return precomputed
+
+    prompt = build_dish_ingredients_prompt(dish_name)
+    log_prompt(logger, "dish_ingredients", prompt.text)
+    ingredients = _create(DishIngredientsResponse, prompt).ingredients
+    dish_ingredients_cache.set(cache_key, tuple(ingredients))
+    return ingredients
+
+def categorize_products(categorized_products: Dict[str, List[str]], uncategorized_products: List[str]) -> Dict[str, List[str]]:
+    """Categorize products into appropriate categories."""
+    groups = _deduplicate_products(uncategorized_products)
+    resolved, unknown = _resolve_known_products(categorized_products, list(groups))
+    if not unknown:
+        return restore_spellings(resolved, groups)
+
+    prompt = build_categorization_prompt(categorized_products, unknown)
+    log_prompt(logger, "categorization", prompt.text)
+    return restore_spellings(_learn_categorization(_create(CategorizationResponse, prompt).categories, resolved, unknown), groups)
+
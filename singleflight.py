@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class SingleFlight:
+    """Coalesce concurrent async calls that share a key.
+
+    The first caller for a key (the leader) starts the call; callers that
+    arrive while it is in flight await the same result instead of starting
+    their own. The call runs as its own task, so a cancelled caller doesn't
+    cancel it for the others.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fn` unless a call for `key` is already in flight, and return its result."""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._start(key, fn)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Start `fn` in the background unless a call for `key` is already in flight, and return the call."""
+        task = self._in_flight.get(key)
+        if task is None:
+            self.calls += 1
+            task = self._start(key, fn)
+        return task
+
+    def running(self, key: Hashable) -> Optional[asyncio.Task]:
+        """The call in flight for `key`, if any."""
+        return self._in_flight.get(key)
+
+    def _start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = asyncio.ensure_future(fn())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return task
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently in flight."""
+        return len(self._in_flight)
+
+    def reset(self) -> None:
+        """Reset the counters."""
+        self.calls = 0
+        self.coalesced = 0
+
+    def stats(self) -> dict:
+        """Return how many calls were made and how many were saved by coalescing."""
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.calls - self.coalesced,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
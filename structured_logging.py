@@ -0,0 +1,186 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+# Log settings
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+SENTRY_LOG_LEVEL = os.getenv("SENTRY_LOG_LEVEL", "INFO").upper()
+# Share of prompts whose full body is logged at DEBUG level
+PROMPT_LOG_SAMPLE_RATE = float(os.getenv("PROMPT_LOG_SAMPLE_RATE", "0"))
+
+ROOT_LOGGER_NAME = "tote"
+
+_listener: Optional[QueueListener] = None
+
+class StructuredLogger:
+    """Logger taking a message template and keyword fields, like sentry_sdk.logger.
+
+    Templates use str.format placeholders ("Found {count} ingredients") and
+    are only rendered by the handlers, so disabled levels cost a single
+    level check and enabled ones leave the formatting to the log thread.
+    """
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level: int, template: str, fields: dict) -> None:
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, template, extra={"fields": fields})
+
+    def debug(self, template: str, **fields: Any) -> None:
+        self._log(logging.DEBUG, template, fields)
+
+    def info(self, template: str, **fields: Any) -> None:
+        self._log(logging.INFO, template, fields)
+
+    def warning(self, template: str, **fields: Any) -> None:
+        self._log(logging.WARNING, template, fields)
+
+    def error(self, template: str, **fields: Any) -> None:
+        self._log(logging.ERROR, template, fields)
+
+def get_logger(name: str) -> StructuredLogger:
+    """Return a structured logger under the application's logger namespace."""
+    return StructuredLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+def render_message(record: logging.LogRecord) -> str:
+    """Render a record's template with its fields."""
+    fields = getattr(record, "fields", None)
+    if not fields:
+        return record.getMessage()
+    try:
+        return str(record.msg).format(**fields)
+    except (KeyError, IndexError, ValueError):
+        return str(record.msg)
+
+class JSONFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including their fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": render_message(record),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SentryLogHandler(logging.Handler):
+    """Forward records to Sentry structured logs, keeping template and fields."""
+
+    _METHODS = {
+        logging.DEBUG: "debug",
+        logging.INFO: "info",
+        logging.WARNING: "warning",
+        logging.ERROR: "error",
+        logging.CRITICAL: "fatal",
+    }
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            from sentry_sdk import logger as sentry_logger
+            method = getattr(sentry_logger, self._METHODS.get(record.levelno, "info"))
+            fields = getattr(record, "fields", None) or {}
+            method(str(record.msg) if fields else record.getMessage(), **fields)
+        except Exception:
+            self.handleError(record)
+
+def sentry_logging_integration():
+    """Sentry's logging integration with only breadcrumbs enabled.
+
+    By default it also sends every record as a Sentry log and errors as
+    events, synchronously and with unrendered templates, on top of the
+    records SentryLogHandler already forwards from the log thread.
+    """
+    from sentry_sdk.integrations.logging import LoggingIntegration
+    return LoggingIntegration(sentry_logs_level=None, event_level=None)
+
+class _InProcessQueueHandler(QueueHandler):
+    """Queue handler that hands records over as they are.
+
+    The queue never leaves the process, so the records don't need to be
+    formatted or made picklable on the request path.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def configure_logging(use_queue: Optional[bool] = None) -> None:
+    """Set up the application loggers. Safe to call more than once.
+
+    Records go to stdout as JSON lines and to Sentry. By default handlers
+    run on a background thread fed by a queue, so logging never blocks a
+    request on I/O. On AWS Lambda the process is frozen between invocations,
+    which would strand queued records, so handlers run inline there.
+    """
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    if getattr(root, "_configured", False):
+        return
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
+    sentry_handler = SentryLogHandler(level=SENTRY_LOG_LEVEL)
+    handlers = [stream_handler, sentry_handler]
+
+    if use_queue is None:
+        use_queue = not os.getenv("AWS_LAMBDA_FUNCTION_NAME")
+    if use_queue:
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        root.addHandler(_InProcessQueueHandler(log_queue))
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        os.register_at_fork(after_in_child=_restart_listener)
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+    root._configured = True
+
+def _restart_listener() -> None:
+    """Restart the log thread in a forked worker.
+
+    Threads don't survive fork, so workers forked from a preloaded app
+    would otherwise queue records that are never written.
+    """
+    global _listener
+    if _listener is None:
+        return
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    for handler in logging.getLogger(ROOT_LOGGER_NAME).handlers:
+        if isinstance(handler, _InProcessQueueHandler):
+            handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the background log thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def log_prompt(logger: StructuredLogger, endpoint: str, prompt: str) -> None:
+    """Log a prompt body at DEBUG level for a sample of calls.
+
+    Prompts are several kilobytes, so they are only logged for
+    PROMPT_LOG_SAMPLE_RATE of the calls, and only when DEBUG is enabled.
+    """
+    if PROMPT_LOG_SAMPLE_RATE <= 0 or random.random() >= PROMPT_LOG_SAMPLE_RATE:
+        return
+    logger.debug("Prompt for {endpoint}: {prompt}", endpoint=endpoint, prompt=prompt)
@@ -5,4 +5,19 @@ import sys
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
 # Add the project root directory to the Python path
-sys.path.insert(0, project_root) 
\ No newline at end of file
+sys.path.insert(0, project_root) 
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_service_caches():
+    """Start every test with empty service-level caches"""
+    # Imported lazily so test modules can set GROQ_API_KEY before services loads
+    import admission
+    import metrics
+    import services
+    services.reset_caches()
+    admission.rate_limiter.reset()
+    metrics.registry.clear()
+    yield
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+os.environ["GROQ_API_KEY"] = "mock-api-key-for-testing"
+
+import admission
+import metrics
+from admission import AdmissionController, AdmissionMiddleware, ClientRateLimiter, QueueFullError, QueueTimeoutError
+
+class FakeClock:
+    """Manually advanced clock for token bucket tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestClientRateLimiter(unittest.TestCase):
+    """Test class for per-client token buckets"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_burst_then_refill(self):
+        """Clients should get their burst, then one request per refill interval"""
+        limiter = ClientRateLimiter(per_minute=60, burst=3, clock=self.clock)
+        self.assertEqual([limiter.check("a") for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(limiter.check("a"), 1.0)
+        self.clock.now = 1.0
+        self.assertEqual(limiter.check("a"), 0.0)
+
+    def test_clients_are_independent(self):
+        """One client's requests should not use another client's tokens"""
+        limiter = ClientRateLimiter(per_minute=60, burst=1, clock=self.clock)
+        self.assertEqual(limiter.check("a"), 0.0)
+        self.assertGreater(limiter.check("a"), 0)
+        self.assertEqual(limiter.check("b"), 0.0)
+
+    def test_bounded_number_of_clients(self):
+        """The least recently seen clients should be dropped past the limit"""
+        limiter = ClientRateLimiter(per_minute=60, burst=1, max_clients=2, clock=self.clock)
+        limiter.check("a")
+        limiter.check("b")
+        limiter.check("c")
+        self.assertEqual(list(limiter._buckets), ["b", "c"])
+        # A dropped client starts again with a full bucket
+        self.assertEqual(limiter.check("a"), 0.0)
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+    """Test class for the concurrency limit and its wait queue"""
+
+    async def test_admits_up_to_the_limit_then_queues_in_order(self):
+        """Requests past the limit should wait and be admitted first come, first served"""
+        controller = AdmissionController(max_concurrency=1, max_queue=5, queue_timeout=1)
+        self.assertEqual(await controller.acquire(), 0.0)
+
+        admitted = []
+
+        async def wait(name):
+            await controller.acquire()
+            admitted.append(name)
+
+        tasks = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        self.assertEqual(controller.queue_depth, 2)
+        self.assertEqual(metrics.ADMISSION_QUEUE_DEPTH.value(), 2)
+
+        controller.release()
+        await asyncio.sleep(0.01)
+        self.assertEqual(admitted, ["first"])
+        controller.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(admitted, ["first", "second"])
+        self.assertEqual(controller.in_flight, 1)
+        controller.release()
+        self.assertEqual(controller.in_flight, 0)
+
+    async def test_full_queue_is_rejected(self):
+        """Requests arriving to a full queue should be rejected right away"""
+        controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        with self.assertRaises(QueueFullError) as ctx:
+            await controller.acquire()
+        self.assertGreater(ctx.exception.retry_after, 0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(controller.queue_depth, 0)
+
+    async def test_queue_deadline(self):
+        """Waiting past the queue timeout should fail and leave the queue"""
+        controller = AdmissionController(max_concurrency=1, max_queue=5, queue_timeout=0.05)
+        await controller.acquire()
+        with self.assertRaises(QueueTimeoutError):
+            await controller.acquire()
+        self.assertEqual(controller.queue_depth, 0)
+        controller.release()
+        self.assertEqual(controller.in_flight, 0)
+
+class TestAdmissionMiddleware(unittest.IsolatedAsyncioTestCase):
+    """Test class for rejecting requests before they reach the LLM endpoints"""
+
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+
+        async def endpoint(scope, receive, send):
+            if scope["path"] == "/slow":
+                await self.release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        self.controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+        self.limiter = ClientRateLimiter(per_minute=60, burst=2)
+        app = AdmissionMiddleware(endpoint, paths=["/slow", "/llm"], admission=self.controller, limiter=self.limiter)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_rate_limited_client_gets_429(self):
+        """Clients past their burst should get a 429 with Retry-After"""
+        statuses = [(await self.client.post("/llm")).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = await self.client.post("/llm")
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(response.json(), {"detail": "Too many requests"})
+        self.assertEqual(metrics.ADMISSION_REJECTED.value(reason="rate_limited"), 2)
+        # Other paths are not limited
+        self.assertEqual((await self.client.get("/health")).status_code, 200)
+
+    async def test_full_queue_gets_503(self):
+        """Requests past the slots and the queue should get a 503 with Retry-After"""
+        self.limiter.per_minute = 0
+        running = asyncio.create_task(self.client.post("/slow"))
+        queued = asyncio.create_task(self.client.post("/slow"))
+        await asyncio.sleep(0.05)
+
+        response = await self.client.post("/llm")
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        self.assertEqual(metrics.ADMISSION_REJECTED.value(reason="queue_full"), 1)
+
+        self.release.set()
+        self.assertEqual([r.status_code for r in await asyncio.gather(running, queued)], [200, 200])
+        self.assertEqual(self.controller.in_flight, 0)
+        self.assertEqual(metrics.ADMISSION_QUEUE_WAIT.count(), 2)
+
+class TestAppAdmission(unittest.TestCase):
+    """Test class for admission control on the app's LLM endpoints"""
+
+    def test_llm_endpoints_are_rate_limited(self):
+        """The app should answer 429 once a client exceeds its burst, readable by browsers"""
+        from main import app
+
+        client = TestClient(app, headers={"Origin": "https://tote.example"})
+        with patch.object(admission.rate_limiter, "per_minute", 60), \
+                patch.object(admission.rate_limiter, "burst", 1), \
+                patch('services.async_client.chat.completions.create') as mock_create:
+            mock_create.return_value.ingredients = ["maíz", "zapallo"]
+            first = client.get("/dishes/ingredients", params={"dish_name": "locro"})
+            second = client.get("/dishes/ingredients", params={"dish_name": "locro"})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertIn("Retry-After", second.headers)
+        self.assertEqual(second.headers["Access-Control-Allow-Origin"], "*")
+        self.assertIn("retry-after", second.headers["Access-Control-Expose-Headers"].lower())
+        self.assertEqual(client.get("/health").status_code, 200)
+
+    def test_rate_limit_disabled_by_default(self):
+        """Clients sharing a proxy address should not be limited together unless configured"""
+        with patch.dict(os.environ):
+            os.environ.pop("RATE_LIMIT_PER_MINUTE", None)
+            self.assertFalse(admission.ClientRateLimiter.from_env().enabled)
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
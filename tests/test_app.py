@@ -10,6 +10,13 @@ from main import app
 
 client = TestClient(app)
 
+def partial_recommendations(*snapshots):
+    """Build a fake create_partial that yields the given item snapshots"""
+    async def create_partial(*args, **kwargs):
+        for items in snapshots:
+            yield MagicMock(recommended_items=items)
+    return create_partial
+
 class TestBackendAPI(unittest.TestCase):
     """Test class for the Backend API endpoints"""
 
@@ -18,7 +25,7 @@ class TestBackendAPI(unittest.TestCase):
         # Setup test client
         self.client = client
 
-    @patch('services.client.chat.completions.create')
+    @patch('services.async_client.chat.completions.create')
     def test_recommendations_endpoint_success(self, mock_create):
         """Test successful recommendations endpoint response"""
         # Mock the LLM response with explicit response structure
@@ -39,7 +46,7 @@ class TestBackendAPI(unittest.TestCase):
         # Verify mock was called correctly
         mock_create.assert_called_once()
 
-    @patch('services.client.chat.completions.create')
+    @patch('services.async_client.chat.completions.create')
     def test_recommendations_endpoint_error(self, mock_create):
         """Test recommendations endpoint with error response"""
         # Mock LLM service raising an exception
@@ -54,7 +61,41 @@ class TestBackendAPI(unittest.TestCase):
         self.assertIn("detail", data)
         self.assertEqual(data["detail"], "Failed to get recommendations")
 
-    @patch('services.client.chat.completions.create')
+    def test_recommendations_stream_endpoint_success(self):
+        """Test streamed recommendations are sent as server-sent events"""
+        fake_partial = partial_recommendations(["sal"], ["salsa"], ["salsa", "qu"], ["salsa", "queso"])
+        with patch('services.async_client.chat.completions.create_partial', side_effect=fake_partial):
+            response = self.client.post("/recommendations/stream", json={"products": ["fideos"]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        self.assertEqual(response.text, (
+            'event: item\ndata: {"item": "salsa"}\n\n'
+            'event: item\ndata: {"item": "queso"}\n\n'
+            'event: done\ndata: {"count": 2}\n\n'
+        ))
+
+    def test_recommendations_stream_skips_listed_and_repeated_items(self):
+        """Test streamed items already in the list or already sent are skipped"""
+        fake_partial = partial_recommendations(["Fideos", "salsa"], ["Fideos", "salsa", "Salsas", "queso"])
+        with patch('services.async_client.chat.completions.create_partial', side_effect=fake_partial):
+            response = self.client.post("/recommendations/stream", json={"products": ["fideos", "ajo"]})
+
+        self.assertEqual(response.text, (
+            'event: item\ndata: {"item": "salsa"}\n\n'
+            'event: item\ndata: {"item": "queso"}\n\n'
+            'event: done\ndata: {"count": 2}\n\n'
+        ))
+
+    def test_recommendations_stream_endpoint_error(self):
+        """Test streamed recommendations report errors as an event"""
+        with patch('services.async_client.chat.completions.create_partial', side_effect=Exception("API Error")):
+            response = self.client.post("/recommendations/stream", json={"products": ["fideos"]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('event: error\ndata: {"detail": "Failed to get recommendations"}', response.text)
+
+    @patch('services.async_client.chat.completions.create')
     def test_dish_ingredients_endpoint_success(self, mock_create):
         """Test successful dish ingredients endpoint response"""
         # Mock the LLM response
@@ -74,7 +115,7 @@ class TestBackendAPI(unittest.TestCase):
         # Verify mock was called correctly
         mock_create.assert_called_once()
 
-    @patch('services.client.chat.completions.create')
+    @patch('services.async_client.chat.completions.create')
     def test_dish_ingredients_endpoint_error(self, mock_create):
         """Test dish ingredients endpoint with error response"""
         # Mock LLM service raising an exception
@@ -88,7 +129,52 @@ class TestBackendAPI(unittest.TestCase):
         self.assertIn("detail", data)
         self.assertEqual(data["detail"], "Failed to get dish ingredients")
 
-    @patch('services.client.chat.completions.create')
+    @patch('services.async_client.chat.completions.create')
+    def test_dish_ingredients_endpoint_circuit_open(self, mock_create):
+        """Test dish ingredients endpoint fails fast with a 503 while the upstream is down"""
+        import services
+        for _ in range(services.upstream_policy.breaker.failure_threshold):
+            services.upstream_policy.breaker.record_failure()
+
+        response = self.client.get("/dishes/ingredients", params={"dish_name": "hummus"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        self.assertEqual(response.json()["detail"], "Failed to get dish ingredients")
+        mock_create.assert_not_called()
+
+    @patch('services.async_client.chat.completions.create')
+    def test_dish_ingredients_batch_endpoint_success(self, mock_create):
+        """Test batch dish ingredients endpoint with a merged shopping list"""
+        from schemas import DishIngredients, MultiDishIngredientsResponse
+        mock_create.return_value = MultiDishIngredientsResponse(dishes=[
+            DishIngredients(dish_name="hummus", ingredients=["chickpeas", "garlic"]),
+            DishIngredients(dish_name="falafel", ingredients=["chickpeas", "parsley"]),
+        ])
+
+        response = self.client.post(
+            "/dishes/ingredients/batch",
+            json={"dish_names": ["hummus", "falafel"], "include_shopping_list": True}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["dishes"]["hummus"]["ingredients"], ["chickpeas", "garlic"])
+        self.assertEqual(data["dishes"]["falafel"]["ingredients"], ["chickpeas", "parsley"])
+        self.assertEqual(data["shopping_list"], ["chickpeas", "garlic", "parsley"])
+        mock_create.assert_called_once()
+
+    @patch('services.async_client.chat.completions.create')
+    def test_dish_ingredients_batch_endpoint_error(self, mock_create):
+        """Test batch dish ingredients endpoint with error response"""
+        mock_create.side_effect = Exception("API Error")
+
+        response = self.client.post("/dishes/ingredients/batch", json={"dish_names": ["hummus", "falafel"]})
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()["detail"], "Failed to get dish ingredients")
+
+    @patch('services.async_client.chat.completions.create')
     def test_categorize_products_endpoint_success(self, mock_create):
         """Test successful product categorization endpoint response"""
         # Mock the LLM response
@@ -115,7 +201,7 @@ class TestBackendAPI(unittest.TestCase):
         # Verify mock was called correctly
         mock_create.assert_called_once()
 
-    @patch('services.client.chat.completions.create')
+    @patch('services.async_client.chat.completions.create')
     def test_categorize_products_endpoint_error(self, mock_create):
         """Test product categorization endpoint with error response"""
         # Mock LLM service raising an exception
@@ -133,6 +219,34 @@ class TestBackendAPI(unittest.TestCase):
         self.assertIn("detail", data)
         self.assertEqual(data["detail"], "Failed to categorize products")
 
+    @patch('services.async_client.chat.completions.create')
+    def test_categorize_products_bulk_endpoint_success(self, mock_create):
+        """Test successful bulk categorization endpoint response"""
+        mock_create.return_value = MagicMock(categories={"Almacen": ["arroz", "fideos"]})
+
+        payload = {
+            "uncategorized_products": ["arroz", "fideos"],
+            "categorized_products": {"Lacteos": ["leche"]}
+        }
+        response = self.client.post("/categorize-products/bulk", json=payload)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["categories"], {"Almacen": ["arroz", "fideos"]})
+        self.assertEqual(len(data["chunks"]), 1)
+        self.assertEqual(data["chunks"][0]["size"], 2)
+
+    @patch('services.async_client.chat.completions.create')
+    def test_categorize_products_bulk_endpoint_error(self, mock_create):
+        """Test bulk categorization endpoint with error response"""
+        mock_create.side_effect = Exception("API Error")
+
+        payload = {"uncategorized_products": ["arroz"], "categorized_products": {}}
+        response = self.client.post("/categorize-products/bulk", json=payload)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()["detail"], "Failed to categorize products")
+
     def test_invalid_request_body(self):
         """Test endpoint with invalid request body"""
         # Empty payload (missing required fields)
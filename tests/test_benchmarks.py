@@ -0,0 +1,85 @@
+import importlib.util
+import os
+import unittest
+
+import httpx
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+spec = importlib.util.spec_from_file_location(
+    "bench_endpoints", os.path.join(project_root, "benchmarks", "bench_endpoints.py")
+)
+bench_endpoints = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench_endpoints)
+spec = importlib.util.spec_from_file_location(
+    "bench_normalization", os.path.join(project_root, "benchmarks", "bench_normalization.py")
+)
+bench_normalization = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench_normalization)
+
+class TestBenchmarkHarness(unittest.IsolatedAsyncioTestCase):
+    """Smoke tests keeping the endpoint benchmark harness working"""
+
+    def test_percentile(self):
+        """Percentiles should use the nearest rank"""
+        values = [float(v) for v in range(1, 101)]
+        self.assertEqual(bench_endpoints.percentile(values, 50), 50.0)
+        self.assertEqual(bench_endpoints.percentile(values, 99), 99.0)
+        self.assertEqual(bench_endpoints.percentile([], 50), 0.0)
+
+    def test_scaling(self):
+        """Throughput should be reported relative to the smallest worker count"""
+        results = [
+            {"mode": "gunicorn", "endpoint": "health", "concurrency": 8, "workers": 1, "rps": 100.0},
+            {"mode": "gunicorn", "endpoint": "health", "concurrency": 8, "workers": 4, "rps": 300.0},
+            {"mode": "inprocess", "endpoint": "health", "concurrency": 8, "rps": 50.0},
+        ]
+        rows = bench_endpoints.scaling(results)
+        self.assertEqual([(row["workers"], row["speedup"], row["efficiency"]) for row in rows],
+                         [(1, 1.0, 1.0), (4, 3.0, 0.75)])
+
+    def test_server_command(self):
+        """Gunicorn runs should use the production config with the requested workers"""
+        command = bench_endpoints.server_command("gunicorn", 8001, 4)
+        self.assertIn("gunicorn.conf.py", command)
+        self.assertEqual(command[command.index("--workers") + 1], "4")
+
+    async def test_run_in_process(self):
+        """Every endpoint should run without errors and report latency stats"""
+        results = await bench_endpoints.run_in_process(
+            list(bench_endpoints.ENDPOINTS), levels=[1, 2], requests=4, upstream_delay=0
+        )
+        self.assertEqual(len(results), len(bench_endpoints.ENDPOINTS) * 2)
+        for result in results:
+            self.assertEqual(result["errors"], 0, result)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertGreater(result["rps"], 0)
+            self.assertIn("mem_kib_per_request", result)
+
+    async def test_run_load_times_first_item(self):
+        """Streamed responses should report the time to their first item"""
+        def handler(request):
+            return httpx.Response(200, text="event: item\ndata: chimichurri\n\nevent: done\ndata: \n\n")
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://test") as client:
+            result = await bench_endpoints.run_load(client, "recommendations_stream", 2, 4, False, time_first_item=True)
+            plain = await bench_endpoints.run_load(client, "recommendations_stream", 2, 4, False)
+        self.assertEqual(result["errors"], 0)
+        self.assertLessEqual(result["first_item_p50_ms"], result["first_item_p95_ms"])
+        self.assertNotIn("first_item_p50_ms", plain)
+
+class TestNormalizationBenchmark(unittest.TestCase):
+    """Smoke tests keeping the deduplication benchmark working"""
+
+    def test_run(self):
+        """Lists with duplicates should shrink and save tokens, clean lists should be unchanged"""
+        results = bench_normalization.run()
+        self.assertEqual(set(results), set(bench_normalization.LISTS))
+        self.assertLess(results["weekly"]["unique"], results["weekly"]["products"])
+        before, after = results["weekly"]["categorization_prompt_tokens"]
+        self.assertLess(after, before)
+        self.assertGreater(results["weekly"]["answer_tokens_saved"], 0)
+        self.assertEqual(results["clean"]["unique"], results["clean"]["products"])
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from cache import SQLiteCache, TTLCache
+from normalization import deduplicate, normalize_key, is_typo, restore_spellings
+
+class FakeClock:
+    """Manually advanced clock for TTL tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestNormalizeKey(unittest.TestCase):
+    """Test class for cache key normalization"""
+
+    def test_case_and_whitespace(self):
+        """Case and extra whitespace should not change the key"""
+        self.assertEqual(normalize_key("  Milanesa   Napolitana "), normalize_key("milanesa napolitana"))
+
+    def test_accents(self):
+        """Accented and unaccented spellings should share a key"""
+        self.assertEqual(normalize_key("Salteñas"), normalize_key("saltenas"))
+        self.assertEqual(normalize_key("limón"), normalize_key("limon"))
+
+    def test_plurals(self):
+        """Plural forms should map to the singular key"""
+        self.assertEqual(normalize_key("empanadas"), normalize_key("empanada"))
+        self.assertEqual(normalize_key("alfajores"), normalize_key("alfajor"))
+        self.assertEqual(normalize_key("panes"), normalize_key("pan"))
+        self.assertEqual(normalize_key("lápices"), normalize_key("lápiz"))
+
+    def test_short_words_untouched(self):
+        """Short words should not be singularized"""
+        self.assertEqual(normalize_key("mas"), "mas")
+
+class TestDeduplicate(unittest.TestCase):
+    """Test class for deduplicating products before building prompts"""
+
+    def test_exact_duplicates(self):
+        """Spellings with the same key should be grouped under the first one"""
+        groups = deduplicate(["Leche", "pan", "leche ", "leches", "  ", "Pan"])
+        self.assertEqual(groups, {"Leche": ["Leche", "leche ", "leches"], "pan": ["pan", "Pan"]})
+
+    def test_fuzzy_duplicates(self):
+        """Swapped and doubled letters should be merged, but not short names or numbers"""
+        self.assertTrue(is_typo("leche", "lehce"))
+        self.assertTrue(is_typo("leche", "leeche"))
+        self.assertFalse(is_typo("leche", "leche x"))
+        groups = deduplicate(["leche", "lehce", "mayonesa", "mayonessa", "prea", "pera",
+                              "harina 000", "harina 0000"], fuzzy=True)
+        self.assertEqual(list(groups), ["leche", "mayonesa", "prea", "pera", "harina 000", "harina 0000"])
+        self.assertEqual(deduplicate(["leche", "lehce"]), {"leche": ["leche"], "lehce": ["lehce"]})
+
+    def test_different_products_one_letter_apart(self):
+        """Products one deletion or substitution apart should never be merged"""
+        for a, b in [("cerveza", "cereza"), ("pimienta", "pimiento"), ("menta", "manta")]:
+            self.assertFalse(is_typo(a, b))
+            self.assertEqual(list(deduplicate([a, b], fuzzy=True)), [a, b])
+
+    def test_restore_spellings(self):
+        """Answers should list the original spellings, matched regardless of the model's case or accents"""
+        groups = deduplicate(["Azúcar", "azucar", "Leche", "leche "])
+        categories = {"Almacen": ["azucar", "fideos"], "Lacteos": ["leche"], "Otros": ["Leche"]}
+        self.assertEqual(restore_spellings(categories, groups),
+                         {"Almacen": ["Azúcar", "azucar", "fideos"], "Lacteos": ["Leche", "leche "]})
+
+class TestTTLCache(unittest.TestCase):
+    """Test class for the TTL/LRU cache"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_hit_and_miss_counters(self):
+        """Lookups should update hit and miss counters"""
+        cache = TTLCache(ttl_seconds=60, clock=self.clock)
+        self.assertIsNone(cache.get("asado"))
+        cache.set("asado", ("carne", "sal gruesa"))
+        self.assertEqual(cache.get("asado"), ("carne", "sal gruesa"))
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_ttl_expiry(self):
+        """Entries should expire after the TTL"""
+        cache = TTLCache(ttl_seconds=10, clock=self.clock)
+        cache.set("asado", ("carne",))
+        self.clock.now = 9
+        self.assertIsNotNone(cache.get("asado"))
+        self.clock.now = 10
+        self.assertIsNone(cache.get("asado"))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction_by_entries(self):
+        """The least recently used entry should be evicted first"""
+        cache = TTLCache(ttl_seconds=60, max_entries=2, clock=self.clock)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_lru_eviction_by_bytes(self):
+        """Entries should be evicted to stay under the memory limit"""
+        cache = TTLCache(ttl_seconds=60, max_bytes=1000, clock=self.clock)
+        for i in range(50):
+            cache.set(f"dish {i}", ("ingredient",) * 5)
+        self.assertLessEqual(cache.stats()["bytes"], 1000)
+        self.assertGreater(cache.stats()["evictions"], 0)
+        self.assertIsNotNone(cache.get("dish 49"))
+
+    def test_clear(self):
+        """Clearing should drop entries and counters"""
+        cache = TTLCache(ttl_seconds=60, clock=self.clock)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.clear()
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 0, "evictions": 0, "hit_ratio": 0.0, "entries": 0, "bytes": 0})
+
+class TestSQLiteCache(unittest.TestCase):
+    """Test class for the SQLite cache shared between worker processes"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_shared_between_instances(self):
+        """An entry written by one instance should be a hit for another using the same file"""
+        writer = SQLiteCache(self.path, "dishes", ttl_seconds=60, clock=self.clock)
+        reader = SQLiteCache(self.path, "dishes", ttl_seconds=60, clock=self.clock)
+        writer.set("locro", ("maíz", "zapallo"))
+        writer.set(("ajo", "fideos"), ["queso rallado"])
+        self.assertEqual(reader.get("locro"), ["maíz", "zapallo"])
+        self.assertEqual(reader.get(("ajo", "fideos")), ["queso rallado"])
+        self.assertEqual(reader.stats()["hits"], 2)
+        self.assertEqual(writer.stats()["hits"], 0)
+
+    def test_namespaces_are_separate(self):
+        """Caches sharing a file under different namespaces should not see each other's entries"""
+        dishes = SQLiteCache(self.path, "dishes", ttl_seconds=60, clock=self.clock)
+        recommendations = SQLiteCache(self.path, "recommendations", ttl_seconds=60, clock=self.clock)
+        dishes.set("locro", ["maíz"])
+        self.assertIsNone(recommendations.get("locro"))
+        recommendations.clear()
+        self.assertEqual(len(dishes), 1)
+
+    def test_expiry(self):
+        """Entries should expire after their TTL"""
+        cache = SQLiteCache(self.path, "dishes", ttl_seconds=10, clock=self.clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl_seconds=30)
+        self.clock.now = 15
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_prune_by_entries(self):
+        """The oldest entries should be evicted once the entry limit is exceeded"""
+        cache = SQLiteCache(self.path, "dishes", ttl_seconds=60, max_entries=5, prune_interval=10, clock=self.clock)
+        for i in range(10):
+            self.clock.now = i
+            cache.set(f"dish {i}", [i])
+        cache._prune_thread.join()
+        self.assertEqual(len(cache), 5)
+        self.assertIsNone(cache.get("dish 0"))
+        self.assertEqual(cache.get("dish 9"), [9])
+        self.assertEqual(cache.stats()["evictions"], 5)
+
+    def test_errors_are_misses(self):
+        """Database errors should be counted and treated as misses"""
+        cache = SQLiteCache(self.path, "dishes", ttl_seconds=60, clock=self.clock)
+        cache._connect().execute("DROP TABLE cache")
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["errors"], 2)
+
+class TestSQLiteCacheLocking(unittest.IsolatedAsyncioTestCase):
+    """Test class for the SQLite cache under another process's write lock"""
+
+    async def test_held_write_lock_does_not_stall_the_loop(self):
+        """Writes should give up quickly while another connection holds the lock, keeping the loop responsive"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "cache.db")
+            cache = SQLiteCache(path, "dishes", ttl_seconds=60, prune_interval=1)
+            cache.set("locro", ["maíz"])
+            cache._prune_thread.join()
+            other = sqlite3.connect(path, isolation_level=None)
+            other.execute("BEGIN IMMEDIATE")
+            ticks = []
+
+            async def tick():
+                while True:
+                    ticks.append(time.perf_counter())
+                    await asyncio.sleep(0.005)
+
+            ticker = asyncio.ensure_future(tick())
+            try:
+                await asyncio.sleep(0.02)
+                start = time.perf_counter()
+                for i in range(5):
+                    cache.set(f"dish {i}", [i])
+                    self.assertEqual(cache.get("locro"), ["maíz"])
+                    await asyncio.sleep(0)
+                elapsed = time.perf_counter() - start
+                await asyncio.sleep(0.02)
+            finally:
+                ticker.cancel()
+                other.execute("ROLLBACK")
+                other.close()
+                cache._prune_thread.join()
+
+            self.assertLess(elapsed, 1.0)
+            self.assertLess(max(b - a for a, b in zip(ticks, ticks[1:])), 0.5)
+            self.assertGreaterEqual(cache.stats()["errors"], 5)
+            self.assertIsNone(cache.get("dish 0"))
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
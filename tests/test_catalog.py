@@ -0,0 +1,154 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import services
+from catalog import CatalogFormatError, CatalogSnapshot, open_snapshot, write_snapshot
+
+DISHES = {
+    "Milanesa": ["carne", "huevos", "pan rallado"],
+    "Empanadas Salteñas": ["tapas", "carne cortada a cuchillo", "papa"],
+    "locro": ["maíz blanco", "zapallo"],
+}
+PRODUCTS = {"Leche": "Lacteos", "pan lactal": "Panaderia", "Atún": "Almacen"}
+
+class TestCatalogSnapshot(unittest.TestCase):
+    """Test class for writing and reading catalog snapshots"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "catalog.bin")
+        write_snapshot(self.path, DISHES, PRODUCTS, "v1", metadata={"model": "test-model"})
+        self.snapshot = CatalogSnapshot(self.path)
+
+    def tearDown(self):
+        self.snapshot.close()
+        self.tmpdir.cleanup()
+
+    def test_metadata(self):
+        """The snapshot should keep its version, metadata and entry counts"""
+        self.assertEqual(self.snapshot.version, "v1")
+        self.assertEqual(self.snapshot.metadata["model"], "test-model")
+        self.assertEqual(self.snapshot.metadata["dishes"], 3)
+        self.assertEqual(self.snapshot.metadata["products"], 3)
+
+    def test_dish_lookup_by_normalized_name(self):
+        """Dishes should be found regardless of case, accents and plurals"""
+        self.assertEqual(self.snapshot.dish_ingredients("empanada salteña"), ["tapas", "carne cortada a cuchillo", "papa"])
+        self.assertEqual(self.snapshot.dish_ingredients(" MILANESAS "), ["carne", "huevos", "pan rallado"])
+        self.assertEqual(self.snapshot.dish_ingredients("Locro"), ["maíz blanco", "zapallo"])
+        self.assertIsNone(self.snapshot.dish_ingredients("sushi"))
+
+    def test_split_products(self):
+        """Known products should be grouped by category and the rest returned as unknown"""
+        resolved, unknown = self.snapshot.split_products(["leche", "atun", "detergente", "Pan Lactal"])
+        self.assertEqual(resolved, {"Lacteos": ["leche"], "Almacen": ["atun"], "Panaderia": ["Pan Lactal"]})
+        self.assertEqual(unknown, ["detergente"])
+        stats = self.snapshot.stats()
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 6)
+
+    def test_every_key_is_found(self):
+        """Binary search should find every entry of a larger snapshot"""
+        dishes = {f"plato {i}": [f"ingrediente {i}"] for i in range(500)}
+        path = os.path.join(self.tmpdir.name, "large.bin")
+        write_snapshot(path, dishes, {}, "v2")
+        snapshot = CatalogSnapshot(path)
+        try:
+            for i in range(500):
+                self.assertEqual(snapshot.dish_ingredients(f"plato {i}"), [f"ingrediente {i}"])
+            self.assertIsNone(snapshot.dish_ingredients("plato 500"))
+        finally:
+            snapshot.close()
+
+    def test_rejects_other_files(self):
+        """Files that aren't snapshots should be rejected"""
+        path = os.path.join(self.tmpdir.name, "other.bin")
+        with open(path, "wb") as f:
+            f.write(b"{\"products\": {}}" * 4)
+        with self.assertRaises(CatalogFormatError):
+            CatalogSnapshot(path)
+
+    def test_open_snapshot_without_file(self):
+        """A missing or unset path should disable the catalog"""
+        self.assertIsNone(open_snapshot(None))
+        self.assertIsNone(open_snapshot(os.path.join(self.tmpdir.name, "missing.bin")))
+
+class TestServicesWithCatalog(unittest.IsolatedAsyncioTestCase):
+    """Test class for answering from the catalog before calling the model"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "catalog.bin")
+        write_snapshot(path, DISHES, PRODUCTS, "v1")
+        self.snapshot = CatalogSnapshot(path)
+        patcher = patch.object(services, "catalog", self.snapshot)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.snapshot.close()
+        self.tmpdir.cleanup()
+
+    async def test_dish_from_catalog(self):
+        """Dishes in the catalog should be answered without calling the model"""
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            ingredients = await services.get_dish_ingredients_async("Milanesas")
+        self.assertEqual(ingredients, ["carne", "huevos", "pan rallado"])
+        mock_create.assert_not_called()
+
+    async def test_batch_dishes_from_catalog(self):
+        """Batches made only of catalog dishes should not call the model"""
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            result = await services.get_dishes_ingredients_async(["locro", "milanesa"])
+        self.assertEqual(result, {"locro": ["maíz blanco", "zapallo"], "milanesa": ["carne", "huevos", "pan rallado"]})
+        mock_create.assert_not_called()
+
+    async def test_categorization_from_catalog(self):
+        """Products in the catalog should be resolved locally, after the client's own categories"""
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            categories = await services.categorize_products_async({"Almacen": ["leche"]}, ["leche", "atún", "pan lactal"])
+        self.assertEqual(categories, {"Almacen": ["leche", "atún"], "Panaderia": ["pan lactal"]})
+        mock_create.assert_not_called()
+
+class TestBuildCatalog(unittest.TestCase):
+    """Test class for the offline catalog build script"""
+
+    def test_build_from_seed_files(self):
+        """The build script should write a snapshot from the seed lists"""
+        import build_catalog
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dishes_path = os.path.join(tmpdir, "dishes.txt")
+            with open(dishes_path, "w", encoding="utf-8") as f:
+                f.write("# popular dishes\nmilanesa\nlocro\n")
+            output = os.path.join(tmpdir, "catalog.bin")
+            argv = ["build_catalog.py", "--output", output, "--dishes", dishes_path, "--version", "test", "--allow-mock"]
+            with patch.object(sys, "argv", argv), \
+                    patch.object(services, "LLM_BACKEND", "mock"), \
+                    patch.object(services, "async_client", None, create=True), \
+                    patch.object(services, "catalog", None):
+                self.assertEqual(build_catalog.main(), 0)
+
+            snapshot = CatalogSnapshot(output)
+            try:
+                self.assertEqual(snapshot.version, "test")
+                self.assertEqual(snapshot.metadata["dishes"], 2)
+                self.assertEqual(snapshot.dish_ingredients("milanesa"), services.MOCK_RESPONSES[services.DishIngredientsResponse].ingredients)
+                self.assertEqual(snapshot.product_category("queso"), "Lacteos")
+            finally:
+                snapshot.close()
+
+    def test_refuses_mock_data(self):
+        """Without an upstream the build should fail unless mock data is allowed"""
+        import build_catalog
+
+        with patch.object(sys, "argv", ["build_catalog.py", "--output", os.devnull]), \
+                patch.object(services, "LLM_BACKEND", "mock"):
+            self.assertEqual(build_catalog.main(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
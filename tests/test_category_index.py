@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import unittest
+
+from category_index import CategoryIndex, canonical_category, category_map, merge_categories
+
+class TestCategoryIndex(unittest.TestCase):
+    """Test class for the local product -> category index"""
+
+    def test_canonical_category(self):
+        """Category names should match the fixed categories regardless of accents and case"""
+        self.assertEqual(canonical_category("Lácteos"), "Lacteos")
+        self.assertEqual(canonical_category("frutas y verduras"), "Frutas y verduras")
+        self.assertIsNone(canonical_category("dairy"))
+
+    def test_learn_and_lookup(self):
+        """Learned products should be found by normalized name"""
+        index = CategoryIndex()
+        added = index.learn({"Lácteos": ["Leche", "yogur"], "Panaderia": ["pan"]})
+        self.assertEqual(added, 3)
+        self.assertEqual(index.lookup("leches"), "Lacteos")
+        self.assertEqual(index.lookup(" PAN "), "Panaderia")
+        self.assertIsNone(index.lookup("detergente"))
+        self.assertEqual(index.stats()["hits"], 2)
+        self.assertEqual(index.stats()["misses"], 1)
+
+    def test_ignores_unknown_and_other_categories(self):
+        """Products in non-fixed categories or in "Otros" should not be learned"""
+        index = CategoryIndex()
+        self.assertEqual(index.learn({"dairy": ["milk"], "Otros": ["cosa rara"]}), 0)
+        self.assertEqual(len(index), 0)
+
+    def test_learn_without_overwrite(self):
+        """Existing entries should be kept when overwrite is disabled"""
+        index = CategoryIndex()
+        index.learn({"Almacen": ["atun"]})
+        index.learn({"Carniceria": ["atun"]}, overwrite=False)
+        self.assertEqual(index.lookup("atun"), "Almacen")
+
+    def test_split(self):
+        """Known products should be resolved and the rest returned as unknown"""
+        index = CategoryIndex()
+        index.learn({"Lacteos": ["leche"], "Panaderia": ["pan"]})
+        resolved, unknown = index.split(["leche", "detergente", "pan", "fernet"])
+        self.assertEqual(resolved, {"Lacteos": ["leche"], "Panaderia": ["pan"]})
+        self.assertEqual(unknown, ["detergente", "fernet"])
+
+    def test_split_with_overlay(self):
+        """A client's categories should win for its request without being learned"""
+        index = CategoryIndex()
+        index.learn({"Lacteos": ["leche"]})
+        overlay = category_map({"Limpieza": ["Leche", "lavandina"], "Otros": ["pan"], "dairy": ["yogur"]})
+        self.assertEqual(overlay, {"leche": "Limpieza", "lavandina": "Limpieza"})
+        resolved, unknown = index.split(["leche", "lavandina", "pan"], overlay)
+        self.assertEqual(resolved, {"Limpieza": ["leche", "lavandina"]})
+        self.assertEqual(unknown, ["pan"])
+        self.assertEqual(index.lookup("leche"), "Lacteos")
+        self.assertIsNone(index.lookup("lavandina"))
+
+    def test_persistence(self):
+        """The index should round-trip through its JSON file"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index.json")
+            index = CategoryIndex(path=path, save_interval=0)
+            index.learn({"Bebidas": ["fernet"]})
+            index.maybe_save()
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["products"], {"fernet": "Bebidas"})
+            self.assertEqual(CategoryIndex(path=path).lookup("Fernet"), "Bebidas")
+
+    def test_merge_categories(self):
+        """Merging should combine categories and drop duplicate products"""
+        merged = merge_categories({"Lacteos": ["leche"]}, {"Lacteos": ["leche", "queso"], "Bebidas": ["agua"]})
+        self.assertEqual(merged, {"Lacteos": ["leche", "queso"], "Bebidas": ["agua"]})
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
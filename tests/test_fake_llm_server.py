@@ -0,0 +1,106 @@
+import random
+import time
+import unittest
+
+import httpx
+import instructor
+from openai import AsyncOpenAI
+
+from fake_llm_server import FakeLLMConfig, LatencyDistribution, create_app, generate_value
+from schemas import RecommendationResponse, CategorizationResponse, PRODUCT_CATEGORIES
+
+def instructor_client(app):
+    """Build an async instructor client talking to the fake server in-process"""
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+    return instructor.from_openai(AsyncOpenAI(base_url="http://fake/v1", api_key="test", http_client=http_client, max_retries=0))
+
+MESSAGES = [{"role": "user", "content": "Recomendá productos para fideos"}]
+
+class TestLatencyDistribution(unittest.TestCase):
+    """Test class for latency distribution specs"""
+
+    def test_fixed(self):
+        self.assertEqual(LatencyDistribution("fixed:0.25").sample(random.Random(0)), 0.25)
+
+    def test_uniform_bounds(self):
+        rng = random.Random(0)
+        samples = [LatencyDistribution("uniform:0.1:0.2").sample(rng) for _ in range(100)]
+        self.assertTrue(all(0.1 <= sample <= 0.2 for sample in samples))
+
+    def test_lognormal_median(self):
+        rng = random.Random(0)
+        samples = sorted(LatencyDistribution("lognormal:0.5:0.3").sample(rng) for _ in range(1001))
+        self.assertAlmostEqual(samples[500], 0.5, delta=0.05)
+
+    def test_invalid_spec(self):
+        with self.assertRaises(ValueError):
+            LatencyDistribution("gaussian:1")
+
+class TestGenerateValue(unittest.TestCase):
+    """Test class for schema-driven output generation"""
+
+    def test_categorization_schema(self):
+        """Dict fields should use the fixed categories"""
+        schema = instructor.openai_schema(CategorizationResponse).openai_schema["parameters"]
+        value = generate_value(schema, random.Random(0))
+        self.assertTrue(set(value["categories"]).issubset(PRODUCT_CATEGORIES))
+        CategorizationResponse(**value)
+
+class TestFakeLLMServer(unittest.IsolatedAsyncioTestCase):
+    """Test class for the fake OpenAI-compatible server"""
+
+    async def test_structured_completion(self):
+        """instructor should parse the fake tool call into the response model"""
+        app = create_app(FakeLLMConfig(latency="fixed:0", tokens_per_second=0))
+        client = instructor_client(app)
+        response = await client.chat.completions.create(
+            model="fake", response_model=RecommendationResponse, messages=MESSAGES, max_retries=0
+        )
+        self.assertGreaterEqual(len(response.recommended_items), 4)
+        self.assertEqual(app.state.stats.requests, 1)
+        self.assertGreater(app.state.stats.completion_tokens, 0)
+
+    async def test_deterministic_output(self):
+        """The same request should get the same answer"""
+        client = instructor_client(create_app(FakeLLMConfig(latency="fixed:0", tokens_per_second=0)))
+        first = await client.chat.completions.create(model="fake", response_model=RecommendationResponse, messages=MESSAGES)
+        second = await client.chat.completions.create(model="fake", response_model=RecommendationResponse, messages=MESSAGES)
+        self.assertEqual(first.recommended_items, second.recommended_items)
+
+    async def test_streamed_completion(self):
+        """Streaming should yield growing partial responses"""
+        client = instructor_client(create_app(FakeLLMConfig(latency="fixed:0", tokens_per_second=0)))
+        partials = [
+            partial async for partial in client.chat.completions.create_partial(
+                model="fake", response_model=RecommendationResponse, messages=MESSAGES
+            )
+        ]
+        self.assertGreater(len(partials), 1)
+        self.assertGreaterEqual(len(partials[-1].recommended_items), 4)
+
+    async def test_latency_and_throughput(self):
+        """Responses should take the time to first token plus the generation time"""
+        client = instructor_client(create_app(FakeLLMConfig(latency="fixed:0.05", tokens_per_second=200)))
+        start = time.perf_counter()
+        await client.chat.completions.create(model="fake", response_model=RecommendationResponse, messages=MESSAGES)
+        self.assertGreater(time.perf_counter() - start, 0.07)
+
+    async def test_error_rate(self):
+        """Requests should fail with a 500 at the configured error rate"""
+        app = create_app(FakeLLMConfig(latency="fixed:0", error_rate=1.0))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake") as http:
+            response = await http.post("/v1/chat/completions", json={"model": "fake", "messages": MESSAGES})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(app.state.stats.errors, 1)
+
+    async def test_rate_limit_rate(self):
+        """Requests should be rate limited at the configured rate"""
+        app = create_app(FakeLLMConfig(latency="fixed:0", rate_limit_rate=1.0))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake") as http:
+            response = await http.post("/openai/v1/chat/completions", json={"model": "fake", "messages": MESSAGES})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["retry-after"], "1")
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 
 from main import app
@@ -23,13 +23,13 @@ class TestIntegration(unittest.TestCase):
         """Setup method that runs before each test"""
         self.client = TestClient(app)
 
-    @patch('services.client')
+    @patch('services.async_client')
     def test_recommendations_integration(self, mock_client):
         """Integration test for recommendations endpoint"""
         # Setup mock client response
-        mock_client.chat.completions.create.return_value = MagicMock(
+        mock_client.chat.completions.create = AsyncMock(return_value=MagicMock(
             recommended_items=["queso rallado", "salsa de tomate", "aceite de oliva", "albahaca"]
-        )
+        ))
         
         # Make request to API
         payload = {"products": ["fideos", "ajo", "cebolla"]}
@@ -42,13 +42,13 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(len(data["recommended_items"]), 4)
         self.assertIn("queso rallado", data["recommended_items"])
 
-    @patch('services.client')
+    @patch('services.async_client')
     def test_dish_ingredients_integration(self, mock_client):
         """Integration test for dish ingredients endpoint"""
         # Setup mock client response
-        mock_client.chat.completions.create.return_value = MagicMock(
+        mock_client.chat.completions.create = AsyncMock(return_value=MagicMock(
             ingredients=["carne picada", "cebolla", "ajo", "tomate", "morrones", "aceite", "sal", "pimienta"]
-        )
+        ))
         
         # Make request to API
         response = self.client.get("/dishes/ingredients", params={"dish_name": "bolognesa"})
@@ -61,7 +61,7 @@ class TestIntegration(unittest.TestCase):
         self.assertIn("carne picada", data["ingredients"])
         self.assertIn("tomate", data["ingredients"])
 
-    @patch('services.client')
+    @patch('services.async_client')
     def test_categorize_products_integration(self, mock_client):
         """Integration test for product categorization endpoint"""
         # Setup mock client response
@@ -69,9 +69,9 @@ class TestIntegration(unittest.TestCase):
             "Lacteos": ["queso", "leche", "yogurt"],
             "Panaderia": ["pan", "facturas"]
         }
-        mock_client.chat.completions.create.return_value = MagicMock(
+        mock_client.chat.completions.create = AsyncMock(return_value=MagicMock(
             categories=expected_categories
-        )
+        ))
         
         # Make request to API
         payload = {
@@ -89,11 +89,11 @@ class TestIntegration(unittest.TestCase):
         self.assertIn("leche", data["categories"]["Lacteos"])
         self.assertIn("facturas", data["categories"]["Panaderia"])
 
-    @patch('services.client')
+    @patch('services.async_client')
     def test_error_handling_integration(self, mock_client):
         """Integration test for error handling"""
         # Setup mock client to raise exception
-        mock_client.chat.completions.create.side_effect = Exception("API Error")
+        mock_client.chat.completions.create = AsyncMock(side_effect=Exception("API Error"))
         
         # Make request to API
         payload = {"products": ["fideos", "ajo", "cebolla"]}
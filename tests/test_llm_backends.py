@@ -0,0 +1,42 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from llm_backends import build_clients, default_backend_name
+
+class TestLLMBackends(unittest.TestCase):
+    """Test class for LLM backend selection"""
+
+    def test_mock_backend(self):
+        """The mock backend should not build any client"""
+        self.assertEqual(build_clients("mock"), (None, None))
+
+    def test_openai_compatible_backend(self):
+        """The OpenAI-compatible backend should build instructor clients for LLM_BASE_URL"""
+        with patch.dict(os.environ, {"LLM_BASE_URL": "http://127.0.0.1:9999/v1"}):
+            client, async_client = build_clients("openai")
+        self.assertEqual(type(client).__name__, "Instructor")
+        self.assertEqual(type(async_client).__name__, "AsyncInstructor")
+        self.assertEqual(str(async_client.client.base_url), "http://127.0.0.1:9999/v1/")
+        # Retries are handled by the service layer
+        self.assertEqual(async_client.client.max_retries, 0)
+
+    def test_unknown_backend(self):
+        """Unknown backends should be rejected"""
+        with self.assertRaises(ValueError):
+            build_clients("bedrock")
+
+    def test_default_backend_name(self):
+        """The backend should default to Groq only with a real API key"""
+        with patch.dict(os.environ, {"GROQ_API_KEY": "real-key"}, clear=False):
+            os.environ.pop("LLM_BACKEND", None)
+            self.assertEqual(default_backend_name(), "groq")
+        with patch.dict(os.environ, {"GROQ_API_KEY": "test_api_key"}):
+            os.environ.pop("LLM_BACKEND", None)
+            self.assertEqual(default_backend_name(), "mock")
+        with patch.dict(os.environ, {"LLM_BACKEND": "OpenAI"}):
+            self.assertEqual(default_backend_name(), "openai")
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
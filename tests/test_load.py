@@ -0,0 +1,68 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+import httpx
+
+from main import app
+
+UPSTREAM_DELAY = 0.3
+CONCURRENT_REQUESTS = 8
+
+async def slow_completion(*args, **kwargs):
+    """Simulate a slow upstream completion without blocking the event loop"""
+    await asyncio.sleep(UPSTREAM_DELAY)
+    return MagicMock(
+        recommended_items=["salsa de tomate", "queso rallado"],
+        ingredients=["carne picada", "cebolla"],
+        categories={"Lacteos": ["leche"]},
+    )
+
+class TestConcurrentLoad(unittest.IsolatedAsyncioTestCase):
+    """Load tests checking that concurrent requests overlap on a single worker"""
+
+    async def asyncSetUp(self):
+        """Setup an in-process client bound to the ASGI app"""
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    @patch('services.async_client.chat.completions.create', side_effect=slow_completion)
+    async def test_llm_requests_overlap(self, mock_create):
+        """Concurrent LLM requests should take about one upstream delay, not the sum"""
+        requests = [
+            self.client.post("/recommendations", json={"products": ["fideos", f"item {i}"]})
+            for i in range(CONCURRENT_REQUESTS)
+        ]
+        start = time.perf_counter()
+        responses = await asyncio.gather(*requests)
+        elapsed = time.perf_counter() - start
+
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertEqual(mock_create.call_count, CONCURRENT_REQUESTS)
+        # Serialized execution would take CONCURRENT_REQUESTS * UPSTREAM_DELAY
+        self.assertLess(elapsed, UPSTREAM_DELAY * 3)
+
+    @patch('services.async_client.chat.completions.create', side_effect=slow_completion)
+    async def test_health_not_blocked_by_llm_requests(self, mock_create):
+        """Health checks should answer while LLM requests are in flight"""
+        pending = [
+            asyncio.create_task(self.client.get("/dishes/ingredients", params={"dish_name": f"plato {i}"}))
+            for i in range(CONCURRENT_REQUESTS)
+        ]
+        await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        response = await self.client.get("/health")
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, UPSTREAM_DELAY)
+        results = await asyncio.gather(*pending)
+        self.assertTrue(all(r.status_code == 200 for r in results))
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+os.environ["GROQ_API_KEY"] = "mock-api-key-for-testing"
+
+import services
+from local_recommender import LocalRecommender
+
+EXAMPLES = [
+    (["carne", "carbón", "sal gruesa"], ["chimichurri", "chorizo", "pan"]),
+    (["fideos", "ajo"], ["salsa de tomate", "queso rallado"]),
+    (["carne", "papas"], ["huevos", "pan rallado"]),
+]
+
+class TestLocalRecommender(unittest.TestCase):
+    """Test class for the local co-occurrence recommender"""
+
+    def setUp(self):
+        self.recommender = LocalRecommender()
+        self.recommender.seed(EXAMPLES)
+
+    def test_items_going_with_several_products_rank_first(self):
+        """Items recommended after more of the recent products should score higher"""
+        ranked, matched = self.recommender.rank(["carne", "carbón", "leche"])
+        self.assertEqual(matched, 2)
+        self.assertEqual(ranked[:3], [("chimichurri", 2.0), ("chorizo", 2.0), ("pan", 2.0)])
+        self.assertIn(("huevos", 1.0), ranked)
+
+    def test_excludes_products_in_the_list(self):
+        """Products already in the list should never be recommended"""
+        recommended = self.recommender.recommend(["carne", "Chimichurri", "pan", "leche"])
+        self.assertNotIn("chimichurri", recommended)
+        self.assertNotIn("pan", recommended)
+        self.assertIn("chorizo", recommended)
+
+    def test_fuzzy_match_and_determinism(self):
+        """Unknown products should use the known product sharing the most words, always the same way"""
+        ranked, matched = self.recommender.rank(["fideos tirabuzón"])
+        self.assertEqual(matched, 1)
+        self.assertEqual([name for name, _ in ranked], ["queso rallado", "salsa de tomate"])
+        self.assertEqual(self.recommender.recommend(["fideos tirabuzón"]), self.recommender.recommend(["fideos tirabuzón"]))
+        self.assertEqual(self.recommender.rank(["detergente"]), ([], 0))
+
+    def test_fills_in_with_popular_items(self):
+        """Lists with few matches should be completed with the most recommended items"""
+        self.recommender.learn(["yerba"], ["pan"])
+        recommended = self.recommender.recommend(["detergente"], limit=2)
+        self.assertEqual(recommended, ["pan", "chimichurri"])
+
+    def test_learn_persist_and_clear(self):
+        """Learned answers should be saved and loaded, and cleared without losing the seed"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "recommender.json")
+            recommender = LocalRecommender(path=path)
+            recommender.learn(["yerba"], ["bizcochos", "azúcar"])
+            recommender.save()
+
+            loaded = LocalRecommender(path=path)
+            self.assertEqual(loaded.recommend(["yerba"]), ["azúcar", "bizcochos"])
+
+        self.recommender.learn(["yerba"], ["bizcochos"])
+        self.assertEqual(self.recommender.stats()["learned_answers"], 1)
+        self.recommender.clear()
+        self.assertEqual(self.recommender.rank(["yerba"]), ([], 0))
+        self.assertEqual(len(self.recommender), 6)
+
+    def test_answers_under_a_millisecond(self):
+        """Ranking a list should take well under a millisecond with thousands of known products"""
+        recommender = LocalRecommender()
+        recommender.seed(([f"producto {i}", f"otro {i % 50}"], [f"item {i % 300}", f"item {i % 7}"]) for i in range(5000))
+        products = ["producto 12", "otro 3", "producto nuevo", "leche", "pan"]
+        start = time.perf_counter()
+        for _ in range(100):
+            recommender.recommend(products)
+        self.assertLess((time.perf_counter() - start) / 100, 0.001)
+
+class TestServicesLocalRecommendations(unittest.IsolatedAsyncioTestCase):
+    """Test class for answering recommendations locally"""
+
+    async def test_mock_path_depends_on_the_list(self):
+        """Without a client, recommendations should come from the local recommender"""
+        with patch.object(services, "async_client", None, create=True), \
+                patch.object(services, "client", None, create=True):
+            asado = await services.get_recommendations_async(["carne", "carbón", "sal gruesa"])
+            cake = services.get_recommendations(["harina", "azúcar", "huevos"])
+            streamed = [item async for item in services.stream_recommendations_async(["carne", "carbón", "chorizo"])]
+        self.assertEqual(asado[:3], ["chimichurri", "chorizo", "ensalada"])
+        self.assertIn("polvo para hornear", cake)
+        self.assertNotIn("chorizo", streamed)
+        self.assertIn("chimichurri", streamed)
+
+    async def test_learns_from_model_answers(self):
+        """Model answers should be learned and then answered locally as a first tier"""
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            mock_create.return_value.recommended_items = ["bizcochos", "azúcar", "termo"]
+            await services.get_recommendations_async(["yerba", "leche"])
+            await services.get_recommendations_async(["yerba", "galletitas"])
+            self.assertEqual(mock_create.call_count, 2)
+
+            with patch.object(services, "LOCAL_RECOMMENDER_FIRST_TIER", True):
+                # "mate" was never seen, so the model is asked
+                await services.get_recommendations_async(["yerba", "mate", "bizcochos"])
+                self.assertEqual(mock_create.call_count, 3)
+                recommended = await services.get_recommendations_async(["yerba"])
+            self.assertEqual(mock_create.call_count, 3)
+        self.assertEqual(recommended, ["azúcar", "bizcochos", "termo"])
+        escalations = services.model_router.stats()["local"]["escalations"]
+        self.assertEqual(escalations, {"low_confidence": 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+os.environ["GROQ_API_KEY"] = "mock-api-key-for-testing"
+
+import metrics
+from main import app
+
+class TestRegistry(unittest.TestCase):
+    """Test class for the Prometheus metrics registry"""
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_render_counter_and_gauge(self):
+        """Counters and gauges should render with their labels"""
+        counter = self.registry.counter("jobs_total", "Jobs run.", ("kind",))
+        gauge = self.registry.gauge("workers", "Busy workers.")
+        counter.inc(kind="a")
+        counter.inc(2, kind="b")
+        gauge.inc()
+
+        text = self.registry.render()
+
+        self.assertIn("# TYPE jobs_total counter", text)
+        self.assertIn('jobs_total{kind="a"} 1', text)
+        self.assertIn('jobs_total{kind="b"} 2', text)
+        self.assertIn("workers 1", text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Histogram buckets should count every observation at or below their bound"""
+        histogram = self.registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+
+        text = self.registry.render()
+
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("latency_seconds_sum 3.65", text)
+        self.assertIn("latency_seconds_count 4", text)
+
+    def test_collectors_run_at_scrape_time(self):
+        """Collectors should be called on every render"""
+        calls = []
+        self.registry.register_collector(
+            lambda: calls.append(1) or [metrics.CollectedMetric("items", "Items.", "gauge", [({"shelf": "a"}, 3)])]
+        )
+        self.assertEqual(calls, [])
+        self.assertIn('items{shelf="a"} 3', self.registry.render())
+        self.assertEqual(calls, [1])
+
+    def test_label_values_are_escaped(self):
+        """Quotes and backslashes in label values should be escaped"""
+        counter = self.registry.counter("dishes_total", "Dishes.", ("name",))
+        counter.inc(name='pizza "napo"')
+        self.assertIn('dishes_total{name="pizza \\"napo\\""} 1', self.registry.render())
+
+    def test_observe_llm_call_records_tokens(self):
+        """Token usage should be read from the raw upstream response"""
+        response = MagicMock()
+        response._raw_response.usage.prompt_tokens = 120
+        response._raw_response.usage.completion_tokens = 30
+
+        metrics.observe_llm_call("small", 0.2, ok=True, response=response)
+
+        self.assertEqual(metrics.LLM_TOKENS.value(model="small", kind="prompt"), 120)
+        self.assertEqual(metrics.LLM_TOKENS.value(model="small", kind="completion"), 30)
+        self.assertEqual(metrics.LLM_REQUEST_DURATION.count(model="small", outcome="success"), 1)
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test class for the /metrics endpoint"""
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    def test_route_latency_and_service_metrics(self):
+        """/metrics should report per-route latency and the service caches"""
+        self.client.get("/health")
+        self.client.get("/does-not-exist")
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            mock_create.return_value = MagicMock(ingredients=["harina", "agua"])
+            self.client.get("/dishes/ingredients", params={"dish_name": "pan"})
+            self.client.get("/dishes/ingredients", params={"dish_name": "pan"})
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        text = response.text
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/health",status="200"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/dishes/ingredients",status="200"} 2', text)
+        self.assertIn('route="unmatched",status="404"', text)
+        self.assertNotIn('route="/metrics"', text)
+        self.assertIn('llm_request_duration_seconds_count{model="llama-3.3-70b-versatile",outcome="success"} 1', text)
+        self.assertIn('cache_hits_total{cache="dish_ingredients"} 1', text)
+        self.assertIn('cache_hit_ratio{cache="dish_ingredients"} 0.5', text)
+        self.assertIn("http_requests_in_flight 0", text)
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from model_router import ModelRouter
+
+class TestModelRouter(unittest.TestCase):
+    """Test class for model tier routing"""
+
+    def setUp(self):
+        self.router = ModelRouter(
+            large_model="large",
+            small_model="small",
+            small_endpoints=["categorization"],
+            small_max_input_chars=20,
+        )
+
+    def test_small_model_first_for_cheap_requests(self):
+        """Small inputs on small-model endpoints should try the small model first"""
+        self.assertEqual(self.router.models_for("categorization", 10), ["small", "large"])
+
+    def test_large_model_for_big_or_other_requests(self):
+        """Big inputs and other endpoints should go straight to the large model"""
+        self.assertEqual(self.router.models_for("categorization", 21), ["large"])
+        self.assertEqual(self.router.models_for("recommendations", 5), ["large"])
+
+    def test_tier_metrics(self):
+        """Each tier should track its own latency and escalation rate"""
+        self.router.record("small", 0.1)
+        self.router.record("small", 0.3, ok=False)
+        self.router.record_escalation("small", "validation")
+        self.router.record("large", 1.0)
+
+        stats = self.router.stats()
+        self.assertEqual(stats["small"]["calls"], 2)
+        self.assertEqual(stats["small"]["failures"], 1)
+        self.assertEqual(stats["small"]["escalation_rate"], 0.5)
+        self.assertEqual(stats["small"]["latency_p95"], 0.1)
+        self.assertEqual(stats["large"]["escalations"], {})
+
+    def test_from_env(self):
+        """The small model can be disabled with an empty LLM_SMALL_MODEL"""
+        with patch.dict(os.environ, {"LLM_SMALL_MODEL": "", "LLM_SMALL_MODEL_ENDPOINTS": "categorization,dish_ingredients"}):
+            router = ModelRouter.from_env(large_model="large")
+        self.assertEqual(router.small_endpoints, {"categorization", "dish_ingredients"})
+        self.assertEqual(router.models_for("categorization", 1), ["large"])
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httpx
+
+os.environ["GROQ_API_KEY"] = "mock-api-key-for-testing"
+
+import services
+from prefetch import Prefetcher
+from singleflight import SingleFlight
+
+class TestPrefetcher(unittest.IsolatedAsyncioTestCase):
+    """Test class for bounded, cancellable background prefetches"""
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.prefetcher = Prefetcher(self.flights, max_concurrency=2, max_pending=3)
+        self.release = asyncio.Event()
+        self.started = []
+        self.cancelled = []
+
+    def fetch(self, key):
+        async def run():
+            self.started.append(key)
+            try:
+                await self.release.wait()
+            except asyncio.CancelledError:
+                self.cancelled.append(key)
+                raise
+            return key
+        return run
+
+    async def test_bounded_concurrency_and_pending(self):
+        """At most max_concurrency prefetches should run and max_pending be scheduled"""
+        outcomes = [self.prefetcher.schedule(f"list {i}", f"key {i}", self.fetch(f"key {i}")) for i in range(4)]
+        self.assertEqual(outcomes, ["scheduled", "scheduled", "scheduled", "rejected"])
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.started, ["key 0", "key 1"])
+
+        self.release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.started, ["key 0", "key 1", "key 2"])
+        self.assertEqual(self.prefetcher.stats()["completed"], 3)
+        self.assertEqual(self.prefetcher.stats()["pending"], 0)
+
+    async def test_stale_prefetch_is_cancelled(self):
+        """A list changing again should cancel its previous prefetch and its upstream call"""
+        self.prefetcher.schedule("list", "old", self.fetch("old"))
+        await asyncio.sleep(0.01)
+        self.prefetcher.schedule("list", "new", self.fetch("new"))
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.cancelled, ["old"])
+        self.assertIsNone(self.flights.running("old"))
+        self.assertEqual(self.prefetcher.stats()["cancelled"], 1)
+
+        # The same recent products again keep the running prefetch
+        self.assertEqual(self.prefetcher.schedule("list", "new", self.fetch("new")), "in_flight")
+        self.release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.started, ["old", "new"])
+
+    async def test_prefetches_without_owner_are_not_cancelled(self):
+        """Prefetches without a list id shouldn't cancel each other"""
+        self.assertEqual(self.prefetcher.schedule(None, "first", self.fetch("first")), "scheduled")
+        self.assertEqual(self.prefetcher.schedule(None, "second", self.fetch("second")), "scheduled")
+        await asyncio.sleep(0.01)
+        self.release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.cancelled, [])
+        self.assertEqual(self.prefetcher.stats()["completed"], 2)
+
+    async def test_claimed_prefetch_is_kept(self):
+        """A prefetch a request is waiting for should not be cancelled"""
+        self.prefetcher.schedule("list", "old", self.fetch("old"))
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.prefetcher.claim("old"), "in_flight")
+        waiting = asyncio.ensure_future(self.flights.do("old", self.fetch("unused")))
+        self.prefetcher.schedule("list", "new", self.fetch("new"))
+        self.release.set()
+        self.assertEqual(await waiting, "old")
+        self.assertEqual(self.cancelled, [])
+        # It was used while in flight, so it isn't counted again once cached
+        await asyncio.sleep(0.01)
+        self.assertIsNone(self.prefetcher.claim("old"))
+        self.assertEqual(self.prefetcher.stats()["used_in_flight"], 1)
+
+    async def test_finished_prefetch_is_used_once(self):
+        """A finished prefetch should count as used by the first request for it"""
+        self.release.set()
+        self.prefetcher.schedule("list", "key", self.fetch("key"))
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.prefetcher.claim("key"), "ready")
+        self.assertIsNone(self.prefetcher.claim("key"))
+        self.assertEqual(self.prefetcher.stats()["used_ready"], 1)
+
+LIST_ID = "5f0c7a1e-8d2b-4c3f-9a6e-2b7d1e4f8c90"
+
+class TestRecommendationsPrefetch(unittest.IsolatedAsyncioTestCase):
+    """Test class for prefetching recommendations through the app"""
+
+    async def test_prefetch_makes_the_next_request_a_cache_hit(self):
+        """A reported list change should be answered from the cache afterwards"""
+        from main import app
+
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            mock_create.return_value = MagicMock(recommended_items=["queso rallado", "albahaca", "aceite de oliva"])
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                response = await client.post("/recommendations/prefetch", json={"products": ["fideos", "ajo"], "list_id": LIST_ID})
+                self.assertEqual(response.status_code, 202)
+                self.assertEqual(response.json(), {"status": "scheduled"})
+                await asyncio.sleep(0.05)
+
+                response = await client.post("/recommendations", json={"products": ["fideos", "ajo"]})
+                again = await client.post("/recommendations/prefetch", json={"products": ["ajo", "fideos"], "list_id": LIST_ID})
+
+        self.assertEqual(response.json(), {"recommended_items": ["queso rallado", "albahaca", "aceite de oliva"]})
+        self.assertEqual(again.json(), {"status": "cached"})
+        mock_create.assert_awaited_once()
+        stats = services.prefetcher.stats()
+        self.assertEqual((stats["completed"], stats["used_ready"]), (1, 1))
+
+    async def test_prefetches_without_list_id_from_one_address(self):
+        """Lists without an id from the same address shouldn't cancel each other's prefetch"""
+        from main import app
+
+        release = asyncio.Event()
+
+        async def fake_create(*args, **kwargs):
+            await release.wait()
+            return MagicMock(recommended_items=["queso rallado", "albahaca", "aceite de oliva"])
+
+        with patch('services.async_client.chat.completions.create', side_effect=fake_create) as mock_create:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                first = await client.post("/recommendations/prefetch", json={"products": ["fideos", "ajo"]})
+                second = await client.post("/recommendations/prefetch", json={"products": ["yerba", "leche"]})
+                await asyncio.sleep(0.01)
+                release.set()
+                await asyncio.sleep(0.05)
+
+        self.assertEqual((first.json(), second.json()), ({"status": "scheduled"}, {"status": "scheduled"}))
+        self.assertEqual(mock_create.await_count, 2)
+        stats = services.prefetcher.stats()
+        self.assertEqual((stats["cancelled"], stats["completed"]), (0, 2))
+
+    async def test_list_ids_must_be_unique_ids(self):
+        """Readable list ids should be rejected, and a list's new change should replace its prefetch"""
+        from main import app
+
+        release = asyncio.Event()
+
+        async def fake_create(*args, **kwargs):
+            await release.wait()
+            return MagicMock(recommended_items=["queso rallado", "albahaca", "aceite de oliva"])
+
+        with patch('services.async_client.chat.completions.create', side_effect=fake_create):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                readable = await client.post("/recommendations/prefetch", json={"products": ["fideos"], "list_id": "casa"})
+                await client.post("/recommendations/prefetch", json={"products": ["fideos", "ajo"], "list_id": LIST_ID})
+                await asyncio.sleep(0.01)
+                await client.post("/recommendations/prefetch", json={"products": ["yerba", "leche"], "list_id": LIST_ID})
+                release.set()
+                await asyncio.sleep(0.05)
+
+        self.assertEqual(readable.status_code, 422)
+        stats = services.prefetcher.stats()
+        self.assertEqual((stats["cancelled"], stats["completed"]), (1, 1))
+
+    async def test_disabled(self):
+        """Prefetching should do nothing when its concurrency is 0"""
+        with patch.object(services.prefetcher, "max_concurrency", 0):
+            self.assertEqual(services.prefetch_recommendations("list", ["fideos"]), "disabled")
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import unittest
+
+import metrics
+from prompts import PromptTemplate, estimate_tokens, rank_examples, compact_categorized_products, compact_categorization_context
+
+class TestPrompts(unittest.TestCase):
+    """Test class for prompt building helpers"""
+
+    def test_estimate_tokens(self):
+        """Words, punctuation and indented line breaks should each count"""
+        self.assertEqual(estimate_tokens("leche, pan"), 3)
+        self.assertEqual(estimate_tokens("{\n  \"a\": 1\n}"), 9)
+
+    def test_rank_examples(self):
+        """Examples similar to the targets should come first"""
+        examples = ["detergente", "queso", "leche descremada", "lavandina"]
+        ranked = rank_examples(examples, ["leche entera"])
+        self.assertEqual(ranked[0], "leche descremada")
+
+    def test_compact_caps_examples(self):
+        """Each category should keep at most the configured number of examples"""
+        categorized = {
+            "Lacteos": ["queso", "yogur", "manteca", "crema", "leche descremada", "queso"],
+            "Limpieza": [],
+        }
+        compacted = compact_categorized_products(categorized, ["leche"], max_examples_per_category=2)
+        self.assertEqual(list(compacted), ["Lacteos"])
+        self.assertEqual(len(compacted["Lacteos"]), 2)
+        self.assertEqual(compacted["Lacteos"][0], "leche descremada")
+
+    def test_compact_context_reduces_tokens(self):
+        """The compact context should be smaller than the indented one"""
+        categorized = {"Almacen": [f"producto {i}" for i in range(50)], "Bebidas": ["agua", "gaseosa"]}
+        context, tokens_before, tokens_after = compact_categorization_context(categorized, ["arroz"], 5)
+        self.assertEqual(len(json.loads(context)["Almacen"]), 5)
+        self.assertNotIn("\n", context)
+        self.assertLess(tokens_after, tokens_before)
+
+class TestPromptTemplate(unittest.TestCase):
+    """Test class for prompts split into a static prefix and a dynamic part"""
+
+    def setUp(self):
+        self.template = PromptTemplate(
+            "test",
+            system="""
+            You recommend products.
+            Answer in spanish.
+            """,
+            user="Products: {products}",
+        )
+
+    def test_render(self):
+        """Only the user part should change between requests"""
+        first = self.template.render(products="leche, pan")
+        second = self.template.render(products="yerba")
+        self.assertEqual(first.system, "You recommend products.\nAnswer in spanish.")
+        self.assertIs(first.system, second.system)
+        self.assertEqual(second.user, "Products: yerba")
+        self.assertEqual(first.messages(), [
+            {"role": "system", "content": first.system},
+            {"role": "user", "content": "Products: leche, pan"},
+        ])
+        self.assertEqual(first.text, "You recommend products.\nAnswer in spanish.\n\nProducts: leche, pan")
+
+    def test_token_counts(self):
+        """Static and dynamic token counts should be recorded per endpoint"""
+        self.template.render(products="leche, pan")
+        self.assertEqual(self.template.static_tokens, 9)
+        self.assertEqual(metrics.PROMPT_TOKENS.count(endpoint="test", part="static"), 1)
+        self.assertEqual(metrics.PROMPT_TOKENS.count(endpoint="test", part="dynamic"), 1)
+        self.assertIn('llm_prompt_tokens_sum{endpoint="test",part="dynamic"} 5', metrics.registry.render())
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import asyncio
+import unittest
+
+from resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, ResiliencePolicy, RetryBudget, is_retryable
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def no_backoff_policy(**kwargs) -> ResiliencePolicy:
+    return ResiliencePolicy(base_delay=0, **kwargs)
+
+class TestRetryBudget(unittest.TestCase):
+    """Test class for the retry budget"""
+
+    def test_budget_is_bounded_by_calls(self):
+        """Retries should stop once the tokens are spent and come back with calls"""
+        clock = FakeClock()
+        budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=2, clock=clock)
+        self.assertTrue(budget.try_spend())
+        self.assertTrue(budget.try_spend())
+        self.assertFalse(budget.try_spend())
+
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.try_spend())
+
+    def test_budget_refills_over_time(self):
+        """A minimum number of retries per second should always be available"""
+        clock = FakeClock()
+        budget = RetryBudget(ratio=0, min_per_second=1, max_tokens=1, clock=clock)
+        self.assertTrue(budget.try_spend())
+        self.assertFalse(budget.try_spend())
+        clock.now += 1
+        self.assertTrue(budget.try_spend())
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test class for the circuit breaker"""
+
+    def test_opens_and_recovers(self):
+        """The breaker should open on failures and close after a successful probe"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.retry_after(), 10)
+
+        clock.now += 10
+        self.assertTrue(breaker.allow())
+        # Only one probe at a time
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        """A failed probe should open the breaker again"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+        breaker.record_failure()
+        clock.now += 5
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.times_opened, 2)
+
+    def test_is_retryable(self):
+        """Client errors other than rate limits should not be retried"""
+        self.assertTrue(is_retryable(Exception("boom")))
+        self.assertTrue(is_retryable(StatusError(503)))
+        self.assertTrue(is_retryable(StatusError(429)))
+        self.assertFalse(is_retryable(StatusError(400)))
+        self.assertFalse(is_retryable(CircuitOpenError(1)))
+
+class TestResiliencePolicy(unittest.IsolatedAsyncioTestCase):
+    """Test class for retries, hedging and the breaker around async calls"""
+
+    async def test_retries_until_success(self):
+        """Transient failures should be retried"""
+        outcomes = [StatusError(500), StatusError(502), "ok"]
+
+        async def call():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        policy = no_backoff_policy(max_attempts=3)
+        self.assertEqual(await policy.call(call), "ok")
+        self.assertEqual(policy.stats()["retries"], 2)
+
+    async def test_client_errors_are_not_retried(self):
+        """Non-retryable errors should be raised on the first attempt"""
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            raise StatusError(400)
+
+        policy = no_backoff_policy()
+        with self.assertRaises(StatusError):
+            await policy.call(call)
+        self.assertEqual(calls, 1)
+        self.assertEqual(policy.breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_retry_budget_limits_retries(self):
+        """Retries should stop when the budget is exhausted"""
+        async def call():
+            raise StatusError(500)
+
+        policy = no_backoff_policy(
+            max_attempts=5,
+            budget=RetryBudget(ratio=0, min_per_second=0, max_tokens=1),
+            breaker=CircuitBreaker(failure_threshold=100),
+        )
+        with self.assertRaises(StatusError):
+            await policy.call(call)
+        stats = policy.stats()
+        self.assertEqual(stats["retries"], 1)
+        self.assertEqual(stats["retry_budget_exhausted"], 1)
+
+    async def test_open_breaker_fails_fast(self):
+        """Calls should be rejected without reaching the upstream while the breaker is open"""
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            raise StatusError(503)
+
+        policy = no_backoff_policy(max_attempts=1, breaker=CircuitBreaker(failure_threshold=2))
+        for _ in range(2):
+            with self.assertRaises(StatusError):
+                await policy.call(call)
+        with self.assertRaises(CircuitOpenError) as raised:
+            await policy.call(call)
+        self.assertEqual(calls, 2)
+        self.assertGreater(raised.exception.retry_after, 0)
+        self.assertEqual(policy.stats()["rejected"], 1)
+
+    async def test_hedged_request_wins_over_slow_attempt(self):
+        """A slow attempt should be hedged after the p95 delay and the faster answer used"""
+        latency = LatencyTracker()
+        for _ in range(20):
+            latency.record(0.01)
+        delays = [1.0, 0.0]
+        cancelled = []
+
+        async def call():
+            delay = delays.pop(0)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(delay)
+                raise
+            return delay
+
+        policy = ResiliencePolicy(hedge=True, hedge_min_delay=0.01, latency=latency)
+        self.assertEqual(await asyncio.wait_for(policy.call(call), timeout=0.5), 0.0)
+        await asyncio.sleep(0)
+        stats = policy.stats()
+        self.assertEqual(stats["hedges"], 1)
+        self.assertEqual(stats["hedge_wins"], 1)
+        self.assertEqual(cancelled, [1.0])
+
+    async def test_no_hedging_without_latency_data(self):
+        """Hedging should wait until there are enough latency samples"""
+        policy = ResiliencePolicy(hedge=True)
+        self.assertIsNone(policy.hedge_delay())
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,8 @@ from schemas import (
     RecommendationResponse, 
     DishIngredientsResponse, 
     CategorizationRequest, 
-    CategorizationResponse
+    CategorizationResponse,
+    BulkCategorizationResponse
 )
 
 class TestSchemas(unittest.TestCase):
@@ -93,6 +94,21 @@ class TestSchemas(unittest.TestCase):
         with self.assertRaises(ValidationError):
             CategorizationResponse(**data)
 
+    def test_bulk_categorization_response_valid(self):
+        """Test valid BulkCategorizationResponse data"""
+        data = {
+            "categories": {"Almacen": ["arroz"]},
+            "chunks": [{"index": 0, "size": 1, "duration_ms": 12.5}]
+        }
+        response = BulkCategorizationResponse(**data)
+        self.assertEqual(response.chunks[0].size, 1)
+
+    def test_bulk_categorization_response_invalid(self):
+        """Test invalid BulkCategorizationResponse data"""
+        data = {"categories": {"Almacen": ["arroz"]}, "chunks": [{"index": 0}]}  # Missing chunk fields
+        with self.assertRaises(ValidationError):
+            BulkCategorizationResponse(**data)
+
 # Allow running tests directly
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -1,8 +1,12 @@
+import asyncio
 import unittest
 from unittest.mock import patch, MagicMock
 
 import services
-from schemas import RecommendationResponse, DishIngredientsResponse, CategorizationResponse
+from schemas import (
+    RecommendationResponse, DishIngredientsResponse, CategorizationResponse,
+    DishIngredients, MultiDishIngredientsResponse
+)
 
 class TestServices(unittest.TestCase):
     """Test class for service module functions"""
@@ -49,6 +53,20 @@ class TestServices(unittest.TestCase):
         self.assertEqual(call_args["model"], "llama-3.3-70b-versatile")
         self.assertEqual(call_args["response_model"], DishIngredientsResponse)
 
+    @patch('services.client.chat.completions.create')
+    def test_get_dish_ingredients_cached(self, mock_create):
+        """Test get_dish_ingredients reuses cached results for equivalent dish names"""
+        expected_ingredients = ["tapas de empanada", "carne picada", "cebolla", "huevo"]
+        mock_create.return_value = MagicMock(ingredients=expected_ingredients)
+
+        first = services.get_dish_ingredients("Empanadas")
+        second = services.get_dish_ingredients("  empanada ")
+
+        self.assertEqual(first, expected_ingredients)
+        self.assertEqual(second, expected_ingredients)
+        mock_create.assert_called_once()
+        self.assertEqual(services.dish_ingredients_cache.stats()["hits"], 1)
+
     @patch('services.client.chat.completions.create')
     def test_categorize_products(self, mock_create):
         """Test categorize_products service function"""
@@ -74,6 +92,445 @@ class TestServices(unittest.TestCase):
         self.assertEqual(call_args["model"], "llama-3.3-70b-versatile")
         self.assertEqual(call_args["response_model"], CategorizationResponse)
 
+    def test_build_categorization_prompt_compacts_context(self):
+        """Test the categorization prompt uses a compact, capped context"""
+        categorized = {"Lacteos": ["queso", "yogur", "manteca", "crema", "ricota", "leche descremada"]}
+        with patch('services.CATEGORIZATION_MAX_EXAMPLES_PER_CATEGORY', 2):
+            prompt = services.build_categorization_prompt(categorized, ["leche"]).user
+
+        self.assertIn('{"Lacteos":["leche descremada",', prompt)
+        self.assertNotIn("ricota", prompt)
+        self.assertGreater(services.context_token_stats["tokens_before"], services.context_token_stats["tokens_after"])
+
+class TestAsyncServices(unittest.IsolatedAsyncioTestCase):
+    """Test class for the async service functions"""
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_get_recommendations_async(self, mock_create):
+        """Test get_recommendations_async uses the async client"""
+        expected_items = ["queso rallado", "salsa de tomate", "aceite de oliva", "albahaca"]
+        mock_create.return_value = MagicMock(recommended_items=expected_items)
+
+        result = await services.get_recommendations_async(["fideos", "ajo", "cebolla"])
+
+        self.assertEqual(result, expected_items)
+        mock_create.assert_awaited_once()
+        call_args = mock_create.call_args[1]
+        self.assertEqual(call_args["model"], "llama-3.3-70b-versatile")
+        self.assertEqual(call_args["response_model"], RecommendationResponse)
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_get_dish_ingredients_async(self, mock_create):
+        """Test get_dish_ingredients_async uses the async client"""
+        expected_ingredients = ["carne picada", "cebolla", "ajo", "tomate"]
+        mock_create.return_value = MagicMock(ingredients=expected_ingredients)
+
+        result = await services.get_dish_ingredients_async("bolognesa")
+
+        self.assertEqual(result, expected_ingredients)
+        mock_create.assert_awaited_once()
+        self.assertEqual(mock_create.call_args[1]["response_model"], DishIngredientsResponse)
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_categorize_products_async(self, mock_create):
+        """Test categorize_products_async uses the async client"""
+        expected_categories = {"Lacteos": ["queso", "leche"]}
+        mock_create.return_value = MagicMock(categories=expected_categories)
+
+        result = await services.categorize_products_async({"Lacteos": ["queso"]}, ["leche"])
+
+        self.assertEqual(result, expected_categories)
+        mock_create.assert_awaited_once()
+        self.assertEqual(mock_create.call_args[1]["response_model"], CategorizationResponse)
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_categorization_deduplicates_products(self, mock_create):
+        """Test repeated products are sent once and answered with every original spelling"""
+        mock_create.return_value = MagicMock(categories={"Lacteos": ["leche"], "Almacen": ["fideos"]})
+
+        result = await services.categorize_products_async({}, ["Leche", "fideos", "leche ", "leches", "Fideos"])
+
+        prompt = mock_create.call_args[1]["messages"][-1]["content"]
+        self.assertTrue(prompt.endswith("categories:\nLeche, fideos"))
+        self.assertEqual(result, {"Lacteos": ["Leche", "leche ", "leches"], "Almacen": ["fideos", "Fideos"]})
+        self.assertEqual(services.dedupe_stats, {"products": 5, "removed": 3})
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_categorization_keeps_products_one_letter_apart(self, mock_create):
+        """Test different products one letter apart are all sent to the model"""
+        mock_create.return_value = MagicMock(categories={"Bebidas": ["cerveza"], "Frutas": ["cereza"]})
+
+        with patch.object(services, "INPUT_FUZZY_DEDUPE", True):
+            result = await services.categorize_products_async({}, ["cerveza", "cereza"])
+
+        prompt = mock_create.call_args[1]["messages"][-1]["content"]
+        self.assertTrue(prompt.endswith("categories:\ncerveza, cereza"))
+        self.assertEqual(result, {"Bebidas": ["cerveza"], "Frutas": ["cereza"]})
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_recommendations_deduplicate_recent_products(self, mock_create):
+        """Test repeated products don't take up the recent window or the prompt"""
+        mock_create.return_value = MagicMock(recommended_items=["queso rallado", "albahaca", "aceite de oliva"])
+
+        await services.get_recommendations_async(["Fideos", "fideos ", "ajo", "Ajo", "cebolla"])
+
+        prompt = mock_create.call_args[1]["messages"][-1]["content"]
+        self.assertIn("Recently added products: Fideos, ajo, cebolla", prompt)
+        # Same recent products once duplicates are removed
+        await services.get_recommendations_async(["ajo", "cebolla", "fideos"])
+        mock_create.assert_awaited_once()
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_prompts_share_a_static_system_prefix(self, mock_create):
+        """Test every request sends the same system message and only its input as the user message"""
+        mock_create.return_value = MagicMock(recommended_items=["queso rallado", "albahaca", "aceite de oliva"])
+
+        await services.get_recommendations_async(["fideos", "ajo"])
+        await services.get_recommendations_async(["yerba", "leche"])
+
+        first, second = [call[1]["messages"] for call in mock_create.call_args_list]
+        self.assertEqual([message["role"] for message in first], ["system", "user"])
+        self.assertEqual(first[0], second[0])
+        self.assertNotIn("yerba", second[0]["content"])
+        self.assertEqual(second[1]["content"], "### Context\nCurrent shopping list: yerba, leche\nRecently added products: yerba, leche")
+
+    async def test_concurrent_dish_ingredients_are_coalesced(self):
+        """Test concurrent requests for the same dish share one upstream call"""
+        async def slow_create(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return MagicMock(ingredients=["carne", "sal gruesa"])
+
+        with patch('services.async_client.chat.completions.create', side_effect=slow_create) as mock_create:
+            results = await asyncio.gather(
+                *(services.get_dish_ingredients_async(name) for name in ["Asado", "asado", " ASADO "] * 3)
+            )
+
+        mock_create.assert_called_once()
+        self.assertTrue(all(result == ["carne", "sal gruesa"] for result in results))
+        self.assertEqual(services.single_flight.stats()["coalesced"], 8)
+
+    async def test_upstream_total_timeout(self):
+        """Test slow upstream calls are abandoned after UPSTREAM_TOTAL_TIMEOUT"""
+        async def hanging_create(*args, **kwargs):
+            await asyncio.sleep(1)
+
+        with patch('services.async_client.chat.completions.create', side_effect=hanging_create), \
+                patch('services.UPSTREAM_TOTAL_TIMEOUT', 0.01):
+            with self.assertRaises(asyncio.TimeoutError):
+                await services.get_dish_ingredients_async("locro")
+
+    async def test_transient_errors_are_retried(self):
+        """Test a failed upstream call is retried before giving up"""
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            mock_create.side_effect = [Exception("Service unavailable"), MagicMock(ingredients=["harina", "agua"])]
+            result = await services.get_dish_ingredients_async("pan casero")
+
+        self.assertEqual(result, ["harina", "agua"])
+        self.assertEqual(mock_create.await_count, 2)
+        self.assertEqual(services.upstream_policy.stats()["retries"], 1)
+
+    async def test_client_categories_are_not_shared(self):
+        """Test a client's own categories apply to its request but not to other clients"""
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            mock_create.return_value = MagicMock(categories={"Lacteos": ["leche"]})
+            own = await services.categorize_products_async({"Limpieza": ["leche"]}, ["leche"])
+            mock_create.assert_not_called()
+            other = await services.categorize_products_async({}, ["leche"])
+
+        self.assertEqual(own, {"Limpieza": ["leche"]})
+        self.assertEqual(other, {"Lacteos": ["leche"]})
+        mock_create.assert_awaited_once()
+
+    async def test_context_repeated_by_the_model_is_not_learned(self):
+        """Test client categories the model repeats back don't reach the shared index"""
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            mock_create.return_value = MagicMock(categories={"Limpieza": ["leche"], "Panaderia": ["pan"]})
+            await services.categorize_products_async({"Limpieza": ["leche"]}, ["pan"])
+            self.assertIsNone(services.category_index.lookup("leche"))
+            self.assertEqual(services.category_index.lookup("pan"), "Panaderia")
+            mock_create.return_value = MagicMock(categories={"Lacteos": ["leche"]})
+            other = await services.categorize_products_async({}, ["leche"])
+
+        self.assertEqual(other, {"Lacteos": ["leche"]})
+        self.assertEqual(mock_create.await_count, 2)
+
+    async def test_model_answer_cannot_move_resolved_products(self):
+        """Test products the client placed keep their category when the model places them elsewhere"""
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            mock_create.return_value = MagicMock(categories={"Lacteos": ["leche"], "Panaderia": ["pan"]})
+            result = await services.categorize_products_async({"Limpieza": ["leche"]}, ["leche", "pan"])
+
+        self.assertEqual(result, {"Limpieza": ["leche"], "Panaderia": ["pan"]})
+
+    async def test_categorization_falls_back_to_index_when_circuit_open(self):
+        """Test categorization answers from the index while the breaker is open"""
+        for _ in range(services.upstream_policy.breaker.failure_threshold):
+            services.upstream_policy.breaker.record_failure()
+
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            result = await services.categorize_products_async({"Lacteos": ["queso"]}, ["queso", "detergente"])
+
+        mock_create.assert_not_called()
+        self.assertEqual(result, {"Lacteos": ["queso"], "Otros": ["detergente"]})
+        self.assertEqual(services.fallback_stats["categorization"], 1)
+
+    async def test_categorization_starts_on_small_model(self):
+        """Test confident small model answers are not escalated"""
+        with patch('services.async_client.chat.completions.create') as mock_create:
+            mock_create.return_value = MagicMock(categories={"Lacteos": ["leche"]})
+            result = await services.categorize_products_async({}, ["leche"])
+
+        self.assertEqual(result, {"Lacteos": ["leche"]})
+        self.assertEqual(mock_create.call_args[1]["model"], services.model_router.small_model)
+        stats = services.model_router.stats()[services.model_router.small_model]
+        self.assertEqual(stats["calls"], 1)
+        self.assertEqual(stats["escalation_rate"], 0.0)
+
+    async def test_categorization_escalates_otros_to_large_model(self):
+        """Test products the small model puts in Otros are sent to the large model"""
+        async def fake_create(*args, **kwargs):
+            if kwargs["model"] == services.model_router.small_model:
+                return MagicMock(categories={"Lacteos": ["leche"], "Otros": ["fernet"]})
+            return MagicMock(categories={"Bebidas": ["fernet"]})
+
+        with patch('services.async_client.chat.completions.create', side_effect=fake_create), \
+                patch('services.build_categorization_prompt', wraps=services.build_categorization_prompt) as build:
+            result = await services.categorize_products_async({}, ["leche", "fernet"])
+
+        self.assertEqual(result, {"Lacteos": ["leche"], "Bebidas": ["fernet"]})
+        self.assertEqual(build.call_args_list[1][0][1], ["fernet"])
+        stats = services.model_router.stats()
+        self.assertEqual(stats[services.model_router.small_model]["escalations"], {"otros": 1})
+        self.assertEqual(stats[services.GROQ_MODEL]["calls"], 1)
+
+    async def test_categorization_escalates_invalid_answers_without_retrying(self):
+        """Test a small model answer that fails validation goes straight to the large model"""
+        from instructor.exceptions import InstructorRetryException
+
+        async def fake_create(*args, **kwargs):
+            if kwargs["model"] == services.model_router.small_model:
+                raise InstructorRetryException("invalid", n_attempts=1, total_usage=0)
+            return MagicMock(categories={"Bebidas": ["fernet"]})
+
+        with patch('services.async_client.chat.completions.create', side_effect=fake_create) as mock_create:
+            result = await services.categorize_products_async({}, ["fernet"])
+
+        self.assertEqual(result, {"Bebidas": ["fernet"]})
+        self.assertEqual(mock_create.call_count, 2)
+        self.assertEqual(services.upstream_policy.stats()["retries"], 0)
+        small_stats = services.model_router.stats()[services.model_router.small_model]
+        self.assertEqual(small_stats["failures"], 1)
+        self.assertEqual(small_stats["escalations"], {"validation": 1})
+
+    async def test_invalid_small_model_answers_keep_breaker_closed(self):
+        """Test concurrent escalations after invalid answers don't open the circuit breaker"""
+        from instructor.exceptions import InstructorRetryException
+
+        async def fake_create(*args, **kwargs):
+            if kwargs["model"] == services.model_router.small_model:
+                raise InstructorRetryException("invalid", n_attempts=1, total_usage=0)
+            if kwargs["response_model"] is services.CategorizationResponse:
+                return MagicMock(categories={"Bebidas": ["fernet"]})
+            return MagicMock(ingredients=["fideos"])
+
+        failures = services.upstream_policy.breaker.failure_threshold + 1
+        with patch('services.async_client.chat.completions.create', side_effect=fake_create):
+            results = await asyncio.gather(*(
+                services.categorize_products_async({}, [f"fernet {i}"]) for i in range(failures)
+            ))
+            ingredients = await services.get_dish_ingredients_async("fideos con tuco")
+
+        self.assertEqual(results, [{"Bebidas": ["fernet"]}] * failures)
+        self.assertEqual(services.upstream_policy.breaker.state, "closed")
+        self.assertEqual(ingredients, ["fideos"])
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_recommendations_cached_by_recent_products(self, mock_create):
+        """Test lists with the same recent products reuse one answer, filtered against each list"""
+        mock_create.return_value = MagicMock(recommended_items=["queso rallado", "albahaca", "aceite de oliva", "pan"])
+
+        first = await services.get_recommendations_async(["fideos", "ajo", "salsa de tomate", "leche"])
+        second = await services.get_recommendations_async(["Salsa de Tomate", "fideos", "ajo", "pan", "yerba"])
+
+        mock_create.assert_awaited_once()
+        self.assertEqual(first, ["queso rallado", "albahaca", "aceite de oliva", "pan"])
+        self.assertEqual(second, ["queso rallado", "albahaca", "aceite de oliva"])
+        self.assertEqual(services.recommendations_cache.stats()["hits"], 1)
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_recommendations_cache_miss_when_too_few_left(self, mock_create):
+        """Test a cached answer mostly made of items already in the list is not used"""
+        mock_create.return_value = MagicMock(recommended_items=["queso rallado", "albahaca", "aceite de oliva"])
+
+        await services.get_recommendations_async(["fideos", "ajo", "cebolla"])
+        await services.get_recommendations_async(["fideos", "ajo", "cebolla", "queso rallado"])
+
+        self.assertEqual(mock_create.await_count, 2)
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_recommendations_fall_back_to_cache_when_circuit_open(self, mock_create):
+        """Test recommendations are answered from the cache while the breaker is open"""
+        mock_create.return_value = MagicMock(recommended_items=["queso rallado", "albahaca", "aceite de oliva"])
+        await services.get_recommendations_async(["fideos", "ajo", "cebolla"])
+        for _ in range(services.upstream_policy.breaker.failure_threshold):
+            services.upstream_policy.breaker.record_failure()
+
+        result = await services.get_recommendations_async(["fideos", "ajo", "cebolla", "albahaca"])
+
+        self.assertEqual(result, ["queso rallado", "aceite de oliva"])
+        self.assertEqual(mock_create.await_count, 1)
+        self.assertEqual(services.fallback_stats["recommendations"], 1)
+
+    @patch('services.async_client.chat.completions.create')
+    async def test_recommendations_fall_back_to_local_recommender_when_circuit_open(self, mock_create):
+        """Test a filtered-out or missing cached answer falls back to the local recommender, never an empty list"""
+        mock_create.return_value = MagicMock(recommended_items=["queso rallado", "albahaca"])
+        await services.get_recommendations_async(["fideos", "ajo", "cebolla"])
+        for _ in range(services.upstream_policy.breaker.failure_threshold):
+            services.upstream_policy.breaker.record_failure()
+
+        products = ["fideos", "ajo", "cebolla", "queso rallado", "albahaca"]
+        result = await services.get_recommendations_async(products)
+        uncached = await services.get_recommendations_async(["carne", "carbón"])
+
+        self.assertTrue(result)
+        self.assertFalse({"queso rallado", "albahaca"} & set(result))
+        self.assertEqual(uncached, services._local_recommendations(["carne", "carbón"]))
+        self.assertEqual(mock_create.await_count, 1)
+        self.assertEqual(services.fallback_stats["recommendations"], 2)
+
+    async def test_stream_recommendations_async(self):
+        """Test streamed recommendations yield each item as soon as it is complete"""
+        received = []
+
+        async def fake_create_partial(*args, **kwargs):
+            yield MagicMock(recommended_items=["chimi"])
+            yield MagicMock(recommended_items=["chimichurri", "cho"])
+            # The first item must be out before the model finishes
+            self.assertEqual(received, ["chimichurri"])
+            yield MagicMock(recommended_items=["chimichurri", "chorizo"])
+
+        with patch('services.async_client.chat.completions.create_partial', side_effect=fake_create_partial):
+            async for item in services.stream_recommendations_async(["carne", "carbón"]):
+                received.append(item)
+
+        self.assertEqual(received, ["chimichurri", "chorizo"])
+        self.assertEqual(services.STREAM_FIRST_ITEM_DURATION.count(source=services.GROQ_MODEL), 1)
+        self.assertEqual(services.model_router.stats()[services.GROQ_MODEL]["calls"], 1)
+
+        # Repeated streams are answered from the cache, without calling the model
+        with patch('services.RECOMMENDATIONS_CACHE_MIN_ITEMS', 2):
+            async for item in services.stream_recommendations_async(["carne", "carbón"]):
+                pass
+        self.assertEqual(services.STREAM_FIRST_ITEM_DURATION.count(source="cache"), 1)
+        self.assertEqual(services.model_router.stats()[services.GROQ_MODEL]["calls"], 1)
+
+class TestBatchDishIngredients(unittest.IsolatedAsyncioTestCase):
+    """Test class for fetching the ingredients of several dishes at once"""
+
+    async def test_uncached_dishes_share_one_prompt(self):
+        """Test cached dishes are answered locally and the rest are asked for in one prompt"""
+        services.dish_ingredients_cache.set(services.normalize_key("milanesa"), ("carne", "pan rallado"))
+
+        async def fake_create(*args, **kwargs):
+            self.assertIs(kwargs["response_model"], MultiDishIngredientsResponse)
+            return MultiDishIngredientsResponse(dishes=[
+                DishIngredients(dish_name="Locro", ingredients=["maíz blanco", "zapallo"]),
+                DishIngredients(dish_name="empanadas", ingredients=["tapas", "carne picada"]),
+            ])
+
+        with patch('services.async_client.chat.completions.create', side_effect=fake_create) as mock_create:
+            result = await services.get_dishes_ingredients_async(["Milanesa", "locro", "empanadas", "Locro"])
+
+        mock_create.assert_awaited_once()
+        self.assertEqual(result, {
+            "Milanesa": ["carne", "pan rallado"],
+            "locro": ["maíz blanco", "zapallo"],
+            "empanadas": ["tapas", "carne picada"],
+            "Locro": ["maíz blanco", "zapallo"],
+        })
+        # The answers are cached for the single dish endpoint too
+        self.assertEqual(await services.get_dish_ingredients_async("locro"), ["maíz blanco", "zapallo"])
+
+    async def test_dishes_missing_from_the_answer_are_fetched_alone(self):
+        """Test dishes the multi-dish answer left out fall back to single dish prompts"""
+        async def fake_create(*args, **kwargs):
+            if kwargs["response_model"] is MultiDishIngredientsResponse:
+                return MultiDishIngredientsResponse(dishes=[DishIngredients(dish_name="locro", ingredients=["maíz"])])
+            return DishIngredientsResponse(ingredients=["arroz", "pollo"])
+
+        with patch('services.async_client.chat.completions.create', side_effect=fake_create) as mock_create:
+            result = await services.get_dishes_ingredients_async(["locro", "arroz con pollo"])
+
+        self.assertEqual(result, {"locro": ["maíz"], "arroz con pollo": ["arroz", "pollo"]})
+        self.assertEqual(mock_create.await_count, 2)
+
+    async def test_large_batches_are_split_into_groups(self):
+        """Test uncached dishes are split into prompts of limited size"""
+        async def fake_create(*args, **kwargs):
+            if kwargs["response_model"] is DishIngredientsResponse:
+                return DishIngredientsResponse(ingredients=["sal"])
+            prompt = kwargs["messages"][-1]["content"]
+            names = [line.strip()[2:] for line in prompt.splitlines() if line.strip().startswith("- ")]
+            return MultiDishIngredientsResponse(dishes=[DishIngredients(dish_name=name, ingredients=["sal"]) for name in names])
+
+        dishes = [f"plato {i}" for i in range(5)]
+        with patch('services.async_client.chat.completions.create', side_effect=fake_create) as mock_create, \
+                patch('services.DISH_BATCH_MAX_PER_PROMPT', 2):
+            result = await services.get_dishes_ingredients_async(dishes)
+
+        # Two prompts of two dishes, the last dish alone
+        self.assertEqual(mock_create.await_count, 3)
+        self.assertEqual(result, {dish: ["sal"] for dish in dishes})
+
+    def test_merge_shopping_list(self):
+        """Test the shopping list keeps the first spelling of each ingredient"""
+        merged = services.merge_shopping_list(["Cebolla", "ajo"], ["cebolla ", "tomate", "Ajo"])
+        self.assertEqual(merged, ["Cebolla", "ajo", "tomate"])
+
+class TestBulkCategorization(unittest.IsolatedAsyncioTestCase):
+    """Test class for chunked bulk categorization"""
+
+    def test_chunk_products_by_count(self):
+        """Test chunks are bounded by item count"""
+        chunks = services.chunk_products([f"p{i}" for i in range(7)], max_items=3, max_chars=1000)
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+
+    def test_chunk_products_by_chars(self):
+        """Test chunks are bounded by total characters"""
+        chunks = services.chunk_products(["a" * 6, "b" * 6, "c" * 6], max_items=10, max_chars=12)
+        self.assertEqual(chunks, [["a" * 6, "b" * 6], ["c" * 6]])
+
+    async def test_categorize_products_bulk_async(self):
+        """Test chunks run concurrently within the limit and results are merged without duplicates"""
+        in_flight = 0
+        max_in_flight = 0
+
+        async def fake_create(*args, **kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return MagicMock(categories={"Almacen": ["arroz"], "Otros": [kwargs["messages"][-1]["content"][-10:]]})
+
+        products = [f"producto {i}" for i in range(10)] + ["producto 0"]
+        with patch('services.async_client.chat.completions.create', side_effect=fake_create) as mock_create:
+            categories, chunks = await services.categorize_products_bulk_async(
+                {}, products, chunk_size=2, max_concurrency=2
+            )
+
+        # Each chunk goes to the small model first, and its "Otros" is escalated
+        self.assertEqual(mock_create.call_count, 10)
+        models = [call[1]["model"] for call in mock_create.call_args_list]
+        self.assertEqual(models.count(services.model_router.small_model), 5)
+        self.assertEqual(models.count(services.GROQ_MODEL), 5)
+        self.assertEqual(max_in_flight, 2)
+        self.assertEqual(categories["Almacen"], ["arroz"])
+        self.assertEqual([chunk["index"] for chunk in chunks], [0, 1, 2, 3, 4])
+        self.assertEqual(sum(chunk["size"] for chunk in chunks), 10)
+        self.assertTrue(all(chunk["duration_ms"] >= 0 for chunk in chunks))
+
 # Allow running tests directly
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
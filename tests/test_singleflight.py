@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+
+from singleflight import SingleFlight
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Test class for request coalescing"""
+
+    async def test_concurrent_calls_are_coalesced(self):
+        """Concurrent calls with the same key should share one call"""
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return ["carne", "sal gruesa"]
+
+        results = await asyncio.gather(*(flight.do("asado", fetch) for _ in range(5)))
+
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(result == ["carne", "sal gruesa"] for result in results))
+        self.assertEqual(flight.stats(), {"calls": 5, "upstream_calls": 1, "coalesced": 4, "in_flight": 0})
+
+    async def test_different_keys_are_not_coalesced(self):
+        """Calls with different keys should run separately"""
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return 1
+
+        await asyncio.gather(flight.do("asado", fetch), flight.do("milanesa", fetch))
+        self.assertEqual(flight.stats()["coalesced"], 0)
+
+    async def test_sequential_calls_are_not_coalesced(self):
+        """A call after the previous one finished should run again"""
+        flight = SingleFlight()
+
+        async def fetch():
+            return 1
+
+        await flight.do("asado", fetch)
+        await flight.do("asado", fetch)
+        self.assertEqual(flight.stats()["upstream_calls"], 2)
+
+    async def test_errors_are_shared(self):
+        """Every waiting caller should get the upstream error"""
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        results = await asyncio.gather(*(flight.do("asado", fetch) for _ in range(3)), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        """Cancelling the first caller should not cancel the shared call"""
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        leader = asyncio.create_task(flight.do("asado", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("asado", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await follower, "ok")
+
+    async def test_started_call_is_joined(self):
+        """A call started in the background should be joined by later callers and counted once"""
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        task = flight.start("asado", fetch)
+        self.assertIs(flight.start("asado", fetch), task)
+        self.assertIs(flight.running("asado"), task)
+        self.assertEqual(await flight.do("asado", fetch), "ok")
+        self.assertEqual(calls, 1)
+        self.assertEqual(flight.stats()["upstream_calls"], 1)
+        self.assertIsNone(flight.running("asado"))
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+import unittest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def run_python(code, **env):
+    """Run code in a fresh interpreter from the project root and return its stdout"""
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=project_root,
+        env=dict(os.environ, GROQ_API_KEY="startup-test-key", **env),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip()
+
+class TestStartup(unittest.TestCase):
+    """Tests for cold start behavior"""
+
+    def test_heavy_modules_are_imported_lazily(self):
+        """Importing the app should not import groq, instructor or openai"""
+        output = run_python(
+            "import sys, main; "
+            "print(','.join(sorted(m for m in ('groq', 'instructor', 'openai') if m in sys.modules)))"
+        )
+        self.assertEqual(output, "")
+
+    def test_clients_built_on_first_use(self):
+        """The Groq clients should be built the first time they are needed"""
+        output = run_python(
+            "import sys, services; "
+            "print('groq' in sys.modules, type(services.get_async_client()).__name__, 'groq' in sys.modules)"
+        )
+        self.assertEqual(output, "False AsyncInstructor True")
+
+    def test_prewarm_on_init(self):
+        """PREWARM_ON_INIT should build the clients while importing the app"""
+        output = run_python(
+            "import sys, main; print('client' in vars(sys.modules['services']), 'instructor' in sys.modules)",
+            PREWARM_ON_INIT="1",
+        )
+        self.assertEqual(output, "True True")
+
+    def test_forked_workers_rebuild_clients(self):
+        """Workers forked from a preloaded app should not reuse the parent's clients"""
+        output = run_python(
+            "import os, sys, main\n"
+            "services = sys.modules['services']\n"
+            "pid = os.fork()\n"
+            "if pid == 0:\n"
+            "    os._exit(0 if 'async_client' not in vars(services) and services.get_async_client() is not None else 1)\n"
+            "print('async_client' in vars(services), os.waitpid(pid, 0)[1])",
+            PREWARM_ON_INIT="1",
+        )
+        self.assertEqual(output, "True 0")
+
+    def test_shared_cache(self):
+        """SHARED_CACHE_PATH should back the response caches with a file shared across processes"""
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "cache.db")
+            run_python("import services; services.dish_ingredients_cache.set('locro', ('maiz',))", SHARED_CACHE_PATH=path)
+            output = run_python(
+                "import services; print(type(services.dish_ingredients_cache).__name__, services.dish_ingredients_cache.get('locro'))",
+                SHARED_CACHE_PATH=path,
+            )
+        self.assertEqual(output, "SQLiteCache ['maiz']")
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
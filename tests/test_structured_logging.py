@@ -0,0 +1,143 @@
+import io
+import json
+import logging
+import os
+import unittest
+from unittest.mock import patch
+
+import sentry_sdk
+
+os.environ["GROQ_API_KEY"] = "mock-api-key-for-testing"
+
+import structured_logging
+from structured_logging import JSONFormatter, SentryLogHandler, StructuredLogger, log_prompt
+
+class RecordingHandler(logging.Handler):
+    """Handler keeping the records it receives"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+class TestStructuredLogging(unittest.TestCase):
+    """Test class for the structured logging pipeline"""
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.stdlib_logger = logging.getLogger("tote.tests")
+        self.stdlib_logger.addHandler(self.handler)
+        self.stdlib_logger.setLevel(logging.INFO)
+        self.logger = StructuredLogger("tote.tests")
+
+    def tearDown(self):
+        self.stdlib_logger.removeHandler(self.handler)
+
+    def test_fields_are_attached(self):
+        """Templates and fields should be kept on the record"""
+        self.logger.info('Found {count} ingredients for {dish}', count=3, dish="asado")
+        record = self.handler.records[0]
+        self.assertEqual(record.msg, 'Found {count} ingredients for {dish}')
+        self.assertEqual(record.fields, {"count": 3, "dish": "asado"})
+
+    def test_disabled_level_is_skipped(self):
+        """Records below the configured level should not be created"""
+        self.logger.debug('Health check endpoint called')
+        self.assertEqual(self.handler.records, [])
+
+    def test_json_formatter(self):
+        """Records should be rendered as JSON with their fields"""
+        self.logger.info('Found {count} ingredients for {dish}', count=3, dish="empanada {salteña}")
+        entry = json.loads(JSONFormatter().format(self.handler.records[0]))
+        self.assertEqual(entry["message"], "Found 3 ingredients for empanada {salteña}")
+        self.assertEqual(entry["count"], 3)
+        self.assertEqual(entry["level"], "info")
+        self.assertEqual(entry["logger"], "tote.tests")
+
+    def test_sentry_handler_forwards_template_and_fields(self):
+        """Records should reach Sentry logs with their template and fields"""
+        self.logger.error('Failed to get recommendations: {error}', error="API Error")
+        with patch('sentry_sdk.logger.error') as mock_error:
+            SentryLogHandler().emit(self.handler.records[0])
+        mock_error.assert_called_once_with('Failed to get recommendations: {error}', error="API Error")
+
+    def test_app_sends_logs_to_sentry_once(self):
+        """The app's Sentry client should leave logs and error events to SentryLogHandler"""
+        import main  # noqa: F401 (initializes Sentry)
+
+        integration = sentry_sdk.get_client().integrations["logging"]
+        self.assertIsNone(integration._sentry_logs_handler)
+        self.assertIsNone(integration._handler)
+
+    def test_prompt_sampling_disabled(self):
+        """Prompts should not be logged when the sample rate is zero"""
+        self.stdlib_logger.setLevel(logging.DEBUG)
+        with patch.object(structured_logging, "PROMPT_LOG_SAMPLE_RATE", 0.0):
+            for _ in range(20):
+                log_prompt(self.logger, "recommendations", "prompt body")
+        self.assertEqual(self.handler.records, [])
+
+    def test_prompt_sampling_enabled(self):
+        """Prompts should be logged at DEBUG level when sampled"""
+        self.stdlib_logger.setLevel(logging.DEBUG)
+        with patch.object(structured_logging, "PROMPT_LOG_SAMPLE_RATE", 1.0):
+            log_prompt(self.logger, "recommendations", "prompt body")
+        self.assertEqual(self.handler.records[0].levelno, logging.DEBUG)
+        self.assertEqual(self.handler.records[0].fields, {"endpoint": "recommendations", "prompt": "prompt body"})
+
+    def test_configured_logger_writes_through_queue(self):
+        """Configured loggers should write JSON lines from the background thread"""
+        root = logging.getLogger(structured_logging.ROOT_LOGGER_NAME)
+        handlers, configured = list(root.handlers), getattr(root, "_configured", False)
+        listener = structured_logging._listener
+        stream = io.StringIO()
+        try:
+            for handler in handlers:
+                root.removeHandler(handler)
+            root._configured = False
+            with patch('sys.stdout', stream), patch.object(SentryLogHandler, "emit"):
+                structured_logging.configure_logging(use_queue=True)
+                structured_logging.get_logger("queue_test").warning('Queue depth {depth}', depth=7)
+                structured_logging.shutdown_logging()
+        finally:
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            for handler in handlers:
+                root.addHandler(handler)
+            root._configured = configured
+            structured_logging._listener = listener
+        self.assertEqual(json.loads(stream.getvalue())["message"], "Queue depth 7")
+
+    def test_listener_restarts_after_fork(self):
+        """A forked worker should get a new log thread writing the records it queues"""
+        root = logging.getLogger(structured_logging.ROOT_LOGGER_NAME)
+        handlers, configured = list(root.handlers), getattr(root, "_configured", False)
+        listener = structured_logging._listener
+        stream = io.StringIO()
+        try:
+            for handler in handlers:
+                root.removeHandler(handler)
+            root._configured = False
+            with patch('sys.stdout', stream), patch.object(SentryLogHandler, "emit"):
+                structured_logging.configure_logging(use_queue=True)
+                parent_listener = structured_logging._listener
+                # What the at-fork hook runs in the child
+                structured_logging._restart_listener()
+                self.assertIsNot(structured_logging._listener, parent_listener)
+                parent_listener.stop()
+                structured_logging.get_logger("fork_test").warning('Worker {pid} ready', pid=1)
+                structured_logging.shutdown_logging()
+        finally:
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            for handler in handlers:
+                root.addHandler(handler)
+            root._configured = configured
+            structured_logging._listener = listener
+        self.assertEqual(json.loads(stream.getvalue())["message"], "Worker 1 ready")
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
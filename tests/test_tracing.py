@@ -0,0 +1,118 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+import sentry_sdk
+from sentry_sdk.tracing import Transaction
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+os.environ["GROQ_API_KEY"] = "mock-api-key-for-testing"
+
+import services
+from tracing import ErrorSamplingMiddleware, TraceSampler, parse_route_rates
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTraceSampler(unittest.TestCase):
+    """Test class for per-route and error-driven trace sampling"""
+
+    def test_parse_route_rates(self):
+        """Route rates should be parsed from "path=rate" pairs"""
+        self.assertEqual(parse_route_rates("/health=0, /recommendations=0.25,"), {"/health": 0.0, "/recommendations": 0.25})
+
+    def test_route_rates(self):
+        """Routes should use their own rate and fall back to the default"""
+        sampler = TraceSampler(default_rate=0.1, route_rates={"/health": 0.0})
+        self.assertEqual(sampler({"asgi_scope": {"path": "/health"}}), 0.0)
+        self.assertEqual(sampler({"asgi_scope": {"path": "/recommendations"}}), 0.1)
+
+    def test_parent_decision_is_kept(self):
+        """Traces started by a caller should keep the caller's decision"""
+        sampler = TraceSampler(default_rate=0.0)
+        self.assertEqual(sampler({"parent_sampled": True, "asgi_scope": {"path": "/health"}}), 1.0)
+        self.assertEqual(TraceSampler(default_rate=1.0)({"parent_sampled": False}), 0.0)
+
+    def test_errors_boost_sampling_for_a_while(self):
+        """A route should be sampled at the error rate for a window after a server error"""
+        clock = FakeClock()
+        sampler = TraceSampler(default_rate=0.01, error_rate=1.0, error_window=60, clock=clock)
+        sampler.record_error("/dishes/ingredients")
+
+        self.assertEqual(sampler.rate_for("/dishes/ingredients"), 1.0)
+        self.assertEqual(sampler.rate_for("/recommendations"), 0.01)
+        clock.now += 60
+        self.assertEqual(sampler.rate_for("/dishes/ingredients"), 0.01)
+
+    def test_middleware_records_server_errors(self):
+        """Server errors, handled or not, should be reported to the sampler"""
+        async def ok(request):
+            return PlainTextResponse("ok")
+
+        async def unavailable(request):
+            return PlainTextResponse("down", status_code=503)
+
+        async def crash(request):
+            raise RuntimeError("boom")
+
+        sampler = TraceSampler(default_rate=0.0)
+        app = Starlette(routes=[Route("/ok", ok), Route("/unavailable", unavailable), Route("/crash", crash)])
+        app.add_middleware(ErrorSamplingMiddleware, trace_sampler=sampler)
+        client = TestClient(app, raise_server_exceptions=False)
+        for path in ("/ok", "/unavailable", "/crash"):
+            client.get(path)
+
+        self.assertEqual(sampler.rate_for("/ok"), 0.0)
+        self.assertEqual(sampler.rate_for("/unavailable"), 1.0)
+        self.assertEqual(sampler.rate_for("/crash"), 1.0)
+
+class TestServiceSpans(unittest.IsolatedAsyncioTestCase):
+    """Test class for spans around prompt building, the upstream call and validation"""
+
+    def setUp(self):
+        # A sampled transaction that is never finished, so nothing is sent
+        self.transaction = Transaction(name="test", sampled=True)
+        self.transaction.init_span_recorder(maxlen=100)
+        self.scope = sentry_sdk.get_current_scope()
+        self.previous_span = self.scope.span
+        self.scope.span = self.transaction
+
+    def tearDown(self):
+        self.scope.span = self.previous_span
+
+    async def test_spans_for_traced_requests(self):
+        """A traced request should get prompt, call and validation spans"""
+        async def fake_create_async(response_model, prompt, model=None, retry_invalid=True):
+            await asyncio.sleep(0)
+            # What instructor's completion:response hook does when the raw answer arrives
+            services._mark_response_received()
+            return MagicMock(ingredients=["harina", "agua"])
+
+        with patch('services._create_async', side_effect=fake_create_async):
+            await services.get_dish_ingredients_async("pan")
+
+        spans = {(span.op, span.description) for span in self.transaction._span_recorder.spans}
+        self.assertIn(("llm.prompt", "dish_ingredients"), spans)
+        self.assertIn(("llm.call", services.GROQ_MODEL), spans)
+        self.assertIn(("llm.validate", "DishIngredientsResponse"), spans)
+
+    async def test_no_spans_for_untraced_requests(self):
+        """Unsampled requests should not build spans"""
+        untraced = Transaction(name="untraced", sampled=False)
+        self.scope.span = untraced
+        with patch.object(Transaction, "start_child") as start_child, \
+                patch('services._create_async', return_value=MagicMock(ingredients=["harina"])):
+            await services.get_dish_ingredients_async("pan")
+        start_child.assert_not_called()
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+from upstream_transport import InstrumentedAsyncTransport, PoolMetrics, UpstreamSettings
+
+class TestUpstreamSettings(unittest.TestCase):
+    """Test class for upstream pool and timeout settings"""
+
+    def test_from_env(self):
+        """Settings should be read from the UPSTREAM_* variables"""
+        env = {
+            "UPSTREAM_MAX_CONNECTIONS": "8",
+            "UPSTREAM_MAX_KEEPALIVE": "4",
+            "UPSTREAM_CONNECT_TIMEOUT": "1.5",
+            "UPSTREAM_READ_TIMEOUT": "20",
+            "UPSTREAM_HTTP2": "false",
+        }
+        with patch.dict(os.environ, env):
+            settings = UpstreamSettings.from_env()
+
+        self.assertEqual(settings.limits.max_connections, 8)
+        self.assertEqual(settings.limits.max_keepalive_connections, 4)
+        self.assertEqual(settings.timeout.connect, 1.5)
+        self.assertEqual(settings.timeout.read, 20.0)
+        self.assertFalse(settings.http2)
+
+    def test_defaults(self):
+        """Unset variables should keep the defaults"""
+        with patch.dict(os.environ, {"UPSTREAM_HTTP2": "0"}):
+            settings = UpstreamSettings.from_env()
+        self.assertEqual(settings, UpstreamSettings())
+
+class TestInstrumentedAsyncTransport(unittest.IsolatedAsyncioTestCase):
+    """Test class for pool usage tracking"""
+
+    async def test_in_flight_until_response_closed(self):
+        """A request should hold its slot until the response body is closed"""
+        metrics = PoolMetrics(max_connections=4)
+
+        async def body():
+            yield b'{"ok": true}'
+
+        transport = InstrumentedAsyncTransport(
+            httpx.MockTransport(lambda request: httpx.Response(200, content=body())), metrics
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("GET", "http://upstream/v1/models") as response:
+                self.assertEqual(metrics.snapshot()["in_flight"], 1)
+                self.assertEqual(metrics.snapshot()["utilization"], 0.25)
+                await response.aread()
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["in_flight"], 0)
+        self.assertEqual(snapshot["max_in_flight"], 1)
+        self.assertEqual(snapshot["requests"], 1)
+
+    async def test_concurrent_requests(self):
+        """Concurrent requests should be counted and released on errors"""
+        metrics = PoolMetrics(max_connections=10)
+
+        async def handler(request):
+            await asyncio.sleep(0.01)
+            if request.url.path == "/fail":
+                raise httpx.ConnectError("refused")
+            return httpx.Response(200)
+
+        transport = InstrumentedAsyncTransport(httpx.MockTransport(handler), metrics)
+        async with httpx.AsyncClient(transport=transport) as client:
+            results = await asyncio.gather(
+                *(client.get(f"http://upstream/{path}") for path in ["ok"] * 5 + ["fail"]),
+                return_exceptions=True,
+            )
+
+        self.assertIsInstance(results[-1], httpx.ConnectError)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["requests"], 6)
+        self.assertEqual(snapshot["max_in_flight"], 6)
+        self.assertEqual(snapshot["in_flight"], 0)
+
+    async def test_pool_wait_is_recorded(self):
+        """Time before the first connect or send should count as pool wait"""
+        metrics = PoolMetrics(max_connections=1)
+
+        class PoolingTransport(httpx.AsyncBaseTransport):
+            async def handle_async_request(self, request):
+                await asyncio.sleep(0.02)
+                await request.extensions["trace"]("http11.send_request_headers.started", {})
+                return httpx.Response(200)
+
+        transport = InstrumentedAsyncTransport(PoolingTransport(), metrics)
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get("http://upstream/")
+
+        snapshot = metrics.snapshot()
+        self.assertGreaterEqual(snapshot["pool_wait_seconds_max"], 0.015)
+        self.assertEqual(snapshot["pool_wait_seconds_avg"], snapshot["pool_wait_seconds_total"])
+
+# Allow running tests directly
+if __name__ == "__main__":
+    unittest.main()
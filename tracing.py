@@ -0,0 +1,109 @@
+"""Sentry trace sampling and spans for the request hot path.
+
+Traces are sampled per route (`SENTRY_TRACES_SAMPLE_RATES`, e.g.
+"/health=0,/categorize-products/bulk=0.5", falling back to
+`SENTRY_TRACES_SAMPLE_RATE`). A route that just answered with a server error
+is sampled at `SENTRY_ERROR_TRACES_SAMPLE_RATE` for
+`SENTRY_ERROR_SAMPLING_WINDOW_SECONDS`, so failures come with traces without
+tracing every healthy request. Error events themselves are always sent.
+
+`span` only creates a span when the current request is being traced, so
+unsampled requests don't pay for building spans.
+"""
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+import sentry_sdk
+
+def parse_route_rates(spec: str) -> Dict[str, float]:
+    """Parse "path=rate,path=rate" into a dict."""
+    rates: Dict[str, float] = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        path, _, rate = entry.partition("=")
+        rates[path.strip()] = float(rate)
+    return rates
+
+class TraceSampler:
+    """Sentry `traces_sampler` with per-route rates and error boosting."""
+
+    def __init__(self, default_rate: float = 0.0, route_rates: Optional[Dict[str, float]] = None,
+                 error_rate: float = 1.0, error_window: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.default_rate = default_rate
+        self.route_rates = route_rates or {}
+        self.error_rate = error_rate
+        self.error_window = error_window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_errors: Dict[str, float] = {}
+
+    @classmethod
+    def from_env(cls) -> "TraceSampler":
+        return cls(
+            default_rate=float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", "0")),
+            route_rates=parse_route_rates(os.getenv("SENTRY_TRACES_SAMPLE_RATES", "/health=0,/metrics=0")),
+            error_rate=float(os.getenv("SENTRY_ERROR_TRACES_SAMPLE_RATE", "1")),
+            error_window=float(os.getenv("SENTRY_ERROR_SAMPLING_WINDOW_SECONDS", "60")),
+        )
+
+    def record_error(self, path: str) -> None:
+        """Boost sampling of `path` after it answered with a server error."""
+        with self._lock:
+            self._last_errors[path] = self._clock()
+
+    def rate_for(self, path: str) -> float:
+        """Sample rate for a new request to `path`."""
+        rate = self.route_rates.get(path, self.default_rate)
+        last_error = self._last_errors.get(path)
+        if last_error is not None:
+            if self._clock() - last_error < self.error_window:
+                return max(rate, self.error_rate)
+            with self._lock:
+                if self._last_errors.get(path) == last_error:
+                    del self._last_errors[path]
+        return rate
+
+    def __call__(self, sampling_context: dict) -> float:
+        # Keep the decision of an upstream service that already sampled the trace
+        parent_sampled = sampling_context.get("parent_sampled")
+        if parent_sampled is not None:
+            return 1.0 if parent_sampled else 0.0
+        scope = sampling_context.get("asgi_scope") or {}
+        return self.rate_for(scope.get("path", ""))
+
+sampler = TraceSampler.from_env()
+
+def span(op: str, name: str):
+    """Start a child span of the current traced request, or do nothing when it isn't traced."""
+    parent = sentry_sdk.get_current_span()
+    if parent is None or not parent.sampled:
+        return nullcontext()
+    return parent.start_child(op=op, name=name)
+
+class ErrorSamplingMiddleware:
+    """ASGI middleware telling the sampler about routes answering with server errors."""
+
+    def __init__(self, app, trace_sampler: TraceSampler = sampler):
+        self.app = app
+        self.sampler = trace_sampler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] >= 500:
+                self.sampler.record_error(scope["path"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            # Unhandled errors are turned into a 500 further out
+            self.sampler.record_error(scope["path"])
+            raise
@@ -0,0 +1,209 @@
+"""HTTP connection pooling and timeouts for the LLM clients.
+
+The Groq and OpenAI SDKs are given explicit httpx clients so keep-alive
+connections are reused across requests (and warm Lambda invocations), HTTP/2
+is used when the `h2` package is installed, and each phase of a call has its
+own timeout. The async client records pool usage in `pool_metrics`.
+"""
+import importlib.util
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import httpx
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+@dataclass
+class UpstreamSettings:
+    """Connection pool and timeout settings for the LLM HTTP clients."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0  # Seconds an idle connection is kept open
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0  # Longest gap between bytes from the upstream
+    write_timeout: float = 10.0
+    pool_timeout: float = 10.0  # Longest wait for a free connection
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls) -> "UpstreamSettings":
+        http2 = os.getenv("UPSTREAM_HTTP2", "auto").lower()
+        return cls(
+            max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", str(cls.max_connections))),
+            max_keepalive_connections=int(os.getenv("UPSTREAM_MAX_KEEPALIVE", str(cls.max_keepalive_connections))),
+            keepalive_expiry=_env_float("UPSTREAM_KEEPALIVE_EXPIRY", cls.keepalive_expiry),
+            connect_timeout=_env_float("UPSTREAM_CONNECT_TIMEOUT", cls.connect_timeout),
+            read_timeout=_env_float("UPSTREAM_READ_TIMEOUT", cls.read_timeout),
+            write_timeout=_env_float("UPSTREAM_WRITE_TIMEOUT", cls.write_timeout),
+            pool_timeout=_env_float("UPSTREAM_POOL_TIMEOUT", cls.pool_timeout),
+            # HTTP/2 needs the optional h2 package; "auto" uses it when installed
+            http2=http2_available() if http2 == "auto" else http2 in ("1", "true", "yes"),
+        )
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+class PoolMetrics:
+    """Connection pool usage of the async upstream client.
+
+    A request counts as in flight from the moment it enters the transport
+    until its response body is closed, which is as long as it holds a
+    connection. Pool wait is the time between entering the transport and
+    starting to connect or send headers, i.e. time spent waiting for a free
+    connection.
+    """
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.connections_opened = 0
+            self.pool_wait_seconds_total = 0.0
+            self.pool_wait_seconds_max = 0.0
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def request_finished(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def record_pool_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.pool_wait_seconds_total += seconds
+            self.pool_wait_seconds_max = max(self.pool_wait_seconds_max, seconds)
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.connections_opened += 1
+
+    def snapshot(self) -> dict:
+        """Return the current pool usage."""
+        with self._lock:
+            return {
+                "max_connections": self.max_connections,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "utilization": self.in_flight / self.max_connections if self.max_connections else 0.0,
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "pool_wait_seconds_total": self.pool_wait_seconds_total,
+                "pool_wait_seconds_max": self.pool_wait_seconds_max,
+                "pool_wait_seconds_avg": self.pool_wait_seconds_total / self.requests if self.requests else 0.0,
+            }
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body that reports when it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close: Optional[Callable[[], None]] = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+class InstrumentedAsyncTransport(httpx.AsyncBaseTransport):
+    """Async transport wrapper recording pool usage in a PoolMetrics."""
+
+    _IO_EVENTS = ("connection.connect_tcp.started", "http11.send_request_headers.started",
+                  "http2.send_request_headers.started")
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, metrics: PoolMetrics):
+        self._transport = transport
+        self._metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        first_io: Optional[float] = None
+        previous_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict) -> None:
+            nonlocal first_io
+            if first_io is None and event_name in self._IO_EVENTS:
+                first_io = time.perf_counter()
+            if event_name == "connection.connect_tcp.complete":
+                self._metrics.connection_opened()
+            if previous_trace is not None:
+                await previous_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self._metrics.request_started()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._metrics.request_finished()
+            raise
+        finally:
+            if first_io is not None:
+                self._metrics.record_pool_wait(first_io - start)
+        if response.is_closed:
+            # Body already read by the inner transport, nothing holds the connection
+            self._metrics.request_finished()
+        else:
+            response.stream = _TrackedStream(response.stream, self._metrics.request_finished)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+settings = UpstreamSettings.from_env()
+pool_metrics = PoolMetrics(settings.max_connections)
+
+def build_http_client() -> httpx.Client:
+    """Sync HTTP client for the LLM SDKs, with the configured pool and timeouts."""
+    return httpx.Client(
+        limits=settings.limits,
+        timeout=settings.timeout,
+        http2=settings.http2,
+    )
+
+def build_async_http_client() -> httpx.AsyncClient:
+    """Async HTTP client for the LLM SDKs, with the configured pool and timeouts.
+
+    Pool usage is recorded in `pool_metrics`.
+    """
+    transport = httpx.AsyncHTTPTransport(limits=settings.limits, http2=settings.http2)
+    return httpx.AsyncClient(
+        transport=InstrumentedAsyncTransport(transport, pool_metrics),
+        timeout=settings.timeout,
+    )